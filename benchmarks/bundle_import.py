@@ -0,0 +1,80 @@
+"""
+Import time of python packages shipped as N separated zip files versus a
+single merged bundle.
+
+Usage::
+
+    python -m benchmarks.bundle_import --archives 60 --modules 20
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+
+from sparpy.bundle import build_bundle
+
+IMPORT_SCRIPT = '''
+import sys, time
+sys.path[:0] = {paths!r}
+start = time.perf_counter()
+{imports}
+print(time.perf_counter() - start)
+'''
+
+
+def build_archives(path: Path, archives: int, modules: int):
+    result = []
+    for i in range(archives):
+        name = f'bench_pkg_{i}'
+        archive = path / f'{name}-1.0-py3-none-any.zip'
+        with ZipFile(str(archive), 'w') as zf:
+            zf.writestr(f'{name}/__init__.py',
+                        ''.join(f'from . import mod_{j}\n' for j in range(modules)))
+            for j in range(modules):
+                zf.writestr(f'{name}/mod_{j}.py', f'VALUE = {j}\n\ndef func():\n    return VALUE\n')
+            zf.writestr(f'{name}-1.0.dist-info/METADATA',
+                        f'Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n')
+        result.append(archive)
+    return result
+
+
+def measure(paths, archives: int, repeat: int) -> float:
+    script = IMPORT_SCRIPT.format(paths=[str(p) for p in paths],
+                                  imports='\n'.join(f'import bench_pkg_{i}' for i in range(archives)))
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-I', '-c', script])
+        results.append(float(output.strip()))
+    return min(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--archives', type=int, default=60)
+    parser.add_argument('--modules', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with TemporaryDirectory(prefix='sparpy_bench_') as tmp:
+        tmp = Path(tmp)
+        archives = build_archives(tmp, args.archives, args.modules)
+
+        start = time.perf_counter()
+        bundle = build_bundle(archives, tmp / 'bundle')
+        bundle_time = time.perf_counter() - start
+
+        result = {'archives': args.archives,
+                  'modules_per_archive': args.modules,
+                  'bundle_build_seconds': bundle_time,
+                  'separated_import_seconds': measure(archives, args.archives, args.repeat),
+                  'bundle_import_seconds': measure([bundle], args.archives, args.repeat)}
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
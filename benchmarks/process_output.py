@@ -0,0 +1,59 @@
+"""
+Throughput and memory usage of child process output capture.
+
+Usage::
+
+    python -m benchmarks.process_output --megabytes 50
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+CHILD_SCRIPT = '''
+import sys
+line = ("x" * {line_size}) + "\\n"
+for _ in range({lines}):
+    sys.stdout.write(line)
+sys.exit({exit_code})
+'''
+
+RUNNER_SCRIPT = '''
+import io, json, resource, sys, time
+from sparpy.processor import ProcessManager
+
+params = [sys.executable, "-c", {child!r}]
+sys.stdout = io.TextIOWrapper(open("/dev/null", "wb"))
+start = time.perf_counter()
+process = ProcessManager(params)
+process.start_process()
+process.wait()
+elapsed = time.perf_counter() - start
+sys.stderr.write(json.dumps({{"seconds": elapsed,
+                             "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+'''
+
+
+def run(megabytes: int, line_size: int, exit_code: int) -> dict:
+    lines = megabytes * 1024 * 1024 // (line_size + 1)
+    child = CHILD_SCRIPT.format(line_size=line_size, lines=lines, exit_code=exit_code)
+    result = subprocess.run([sys.executable, '-c', RUNNER_SCRIPT.format(child=child)],
+                            stderr=subprocess.PIPE, check=True)
+    data = json.loads(result.stderr.decode().splitlines()[-1])
+    data['megabytes_per_second'] = megabytes / data['seconds']
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--megabytes', type=int, default=50)
+    parser.add_argument('--line-size', type=int, default=120)
+    args = parser.parse_args(argv)
+
+    print(json.dumps({'megabytes': args.megabytes,
+                      'success': run(args.megabytes, args.line_size, 0),
+                      'failure_replayed': run(args.megabytes, args.line_size, 1)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Start up time regression check of sparpy console scripts.
+
+Every console script defined on `setup.py` is started with `--help` using
+`-X importtime`. It fails when any heavy module, which must be imported
+lazily, is imported at start up, or when import time exceeds `--max-ms`.
+
+Usage::
+
+    python -m benchmarks.startup_time --max-ms 150
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+CONSOLE_SCRIPT_REGEX = re.compile(r"'([\w-]+)=([\w.]+):(\w+)'")
+IMPORT_TIME_REGEX = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$')
+
+LAZY_MODULES = ('pkg_resources',
+                'pkginfo',
+                'packaging',
+                'concurrent.futures',
+                'tempfile',
+                'asyncio',
+                'sparpy.spark',
+                'sparpy.fetcher',
+                'sparpy.cache',
+                'sparpy.maintenance',
+                'sparpy.mirror',
+                'sparpy.wheels')
+
+# Plugin runner needs entry points index, which uses importlib.metadata
+ALLOWED_MODULES = {'sparpy-runner': ('tempfile', 'sparpy.cache')}
+
+SCRIPT = 'import sys; sys.argv = [{name!r}, "--help"]; from {module} import {func}; {func}()'
+
+
+def iter_console_scripts():
+    setup = (ROOT_DIR / 'setup.py').read_text()
+    section = setup[setup.index("'console_scripts'"):]
+    section = section[:section.index(']')]
+    yield from CONSOLE_SCRIPT_REGEX.findall(section)
+
+
+def measure(name: str, module: str, func: str) -> dict:
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join([str(ROOT_DIR), *filter(None, [env.get('PYTHONPATH')])])
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             SCRIPT.format(name=name, module=module, func=func)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+
+    modules = {}
+    for line in result.stderr.decode().splitlines():
+        match = IMPORT_TIME_REGEX.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+
+    return {'script': name,
+            'returncode': result.returncode,
+            'import_ms': modules.get(module, 0) / 1000,
+            'lazy_modules_imported': sorted(m for m in modules
+                                            if any(m == lm or m.startswith(f'{lm}.') for lm in LAZY_MODULES)
+                                            and m not in ALLOWED_MODULES.get(name, ()))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--max-ms', type=float, default=None, help='Maximum import time allowed')
+    args = parser.parse_args(argv)
+
+    results = [measure(*script) for script in iter_console_scripts()]
+    failed = [r for r in results
+              if r['returncode'] != 0
+              or r['lazy_modules_imported']
+              or (args.max_ms is not None and r['import_ms'] > args.max_ms)]
+
+    print(json.dumps({'results': results, 'failed': [r['script'] for r in failed]}, indent=2))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+End to end submit latency of sparpy console scripts.
+
+Scripts are run against stub `spark-submit`/`pyspark` executables, which
+record the moment they are executed, and a local wheelhouse (or a local
+simple index served over HTTP). Time from CLI start to spark-submit exec
+is measured, broken down by phase, for cold and warm caches and several
+synthetic scales. Results are written as JSON lines.
+
+Usage::
+
+    python -m benchmarks.submit_latency --plugins 1 --plugins 50 --conf 0 --conf 200 \\
+        --output submit_latency.jsonl
+"""
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+COMMANDS = ('sparpy', 'sparpy-submit', 'sparpy-download', 'isparpy')
+
+STUB_EXECUTABLE = '''#!/bin/sh
+date +%s.%N > "$SPARPY_BENCH_EXEC_FILE"
+'''
+
+# Runs a console script recording phase timings. Methods are wrapped, not
+# replaced, so measured code is the real one.
+RUNNER_SCRIPT = '''
+import json, os, sys, time
+bootstrap = time.time()
+phases = {"bootstrap": bootstrap}
+durations = {}
+
+import sparpy.cli as cli
+phases["imported"] = time.time()
+
+def timed(owner, name, phase):
+    original = getattr(owner, name)
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            durations[phase] = durations.get(phase, 0) + time.time() - start
+            phases[phase + "_end"] = time.time()
+    setattr(owner, name, wrapper)
+
+import sparpy.config, sparpy.cli_options, sparpy.plugins, sparpy.spark
+timed(sparpy.cli_options, "load_user_config", "config")
+timed(sparpy.plugins.DownloadPlugins, "download", "download")
+timed(sparpy.spark.BaseSparkCommand, "build_command", "build_command")
+
+def dump():
+    with open(os.environ["SPARPY_BENCH_PHASES_FILE"], "w") as f:
+        json.dump({"phases": phases, "durations": durations}, f)
+
+import atexit
+atexit.register(dump)
+
+sys.argv = [sys.argv[1], *sys.argv[2:]]
+getattr(cli, sys.argv.pop(1))()
+'''
+
+ENTRY_FUNCTIONS = {'sparpy': 'run_sparpy',
+                   'sparpy-submit': 'run_sparpy_submit',
+                   'sparpy-download': 'run_sparpy_download',
+                   'isparpy': 'run_isparpy'}
+
+
+def _record_line(name: str, data: bytes) -> str:
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b'=').decode()
+    return f'{name},sha256={digest},{len(data)}'
+
+
+def build_wheel(path: Path, name: str, version: str = '1.0', requires=(), entry_points=None) -> Path:
+    dist_info = f'{name}-{version}.dist-info'
+    files = {f'{name}/__init__.py': b'def main(args):\n    return 0\n',
+             f'{dist_info}/METADATA': ''.join([f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n',
+                                               *[f'Requires-Dist: {r}\n' for r in requires]]).encode(),
+             f'{dist_info}/WHEEL': b'Wheel-Version: 1.0\nGenerator: sparpy-bench\n'
+                                   b'Root-Is-Purelib: true\nTag: py3-none-any\n'}
+    if entry_points:
+        files[f'{dist_info}/entry_points.txt'] = ''.join(
+            ['[sparpy.cli_plugins]\n', *[f'{k} = {v}\n' for k, v in entry_points.items()]]).encode()
+
+    wheel = path / f'{name}-{version}-py3-none-any.whl'
+    with ZipFile(str(wheel), 'w') as zf:
+        records = []
+        for arcname, data in files.items():
+            zf.writestr(arcname, data)
+            records.append(_record_line(arcname, data))
+        records.append(f'{dist_info}/RECORD,,')
+        zf.writestr(f'{dist_info}/RECORD', '\n'.join(records) + '\n')
+    return wheel
+
+
+def build_wheelhouse(path: Path, plugins: int) -> Path:
+    path.mkdir(parents=True, exist_ok=True)
+    for i in range(plugins):
+        build_wheel(path, f'bench_dep_{i}')
+        build_wheel(path, f'bench_plugin_{i}',
+                    requires=[f'bench_dep_{i}'],
+                    entry_points={f'bench_cmd_{i}': f'bench_plugin_{i}:main'})
+    return path
+
+
+def build_simple_index(wheelhouse: Path, path: Path) -> Path:
+    for wheel in wheelhouse.glob('*.whl'):
+        project = wheel.name.split('-')[0].replace('_', '-')
+        project_dir = path / 'simple' / project
+        project_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256(wheel.read_bytes()).hexdigest()
+        with (project_dir / 'index.html').open('a') as f:
+            f.write(f'<a href="/files/{wheel.name}#sha256={digest}">{wheel.name}</a>\n')
+    (path / 'files').mkdir(parents=True, exist_ok=True)
+    for wheel in wheelhouse.glob('*.whl'):
+        os.link(str(wheel), str(path / 'files' / wheel.name))
+    return path
+
+
+def build_reqs_tree(path: Path, files: int, width: int = 10) -> Path:
+    for i in range(files):
+        directory = path / f'level_{i % width}' / f'sub_{(i // width) % width}'
+        directory.mkdir(parents=True, exist_ok=True)
+        build_wheel(directory, f'bench_reqs_{i}').rename(directory / f'bench_reqs_{i}-1.0-py3-none-any.zip')
+    return path
+
+
+def serve(directory: Path) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def run_command(command: str, args, env, workdir: Path) -> dict:
+    exec_file = workdir / 'exec_time'
+    phases_file = workdir / 'phases.json'
+    for f in (exec_file, phases_file):
+        if f.exists():
+            f.unlink()
+
+    env = dict(env, SPARPY_BENCH_EXEC_FILE=str(exec_file), SPARPY_BENCH_PHASES_FILE=str(phases_file))
+
+    start = time.time()
+    result = subprocess.run([sys.executable, '-c', RUNNER_SCRIPT, command, ENTRY_FUNCTIONS[command], *args],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    end = time.time()
+
+    if result.returncode != 0:
+        raise RuntimeError(f'{command} failed: {result.stderr.decode()[-2000:]}')
+
+    data = json.loads(phases_file.read_text())
+    phases, durations = data['phases'], data['durations']
+    exec_time = float(exec_file.read_text()) if exec_file.exists() else end
+
+    breakdown = {'interpreter': phases['bootstrap'] - start,
+                 'import': phases['imported'] - phases['bootstrap'],
+                 **durations}
+    last = phases.get('build_command_end', phases.get('download_end'))
+    if last and exec_file.exists():
+        breakdown['spawn'] = exec_time - last
+
+    return {'total_seconds': exec_time - start,
+            'process_seconds': end - start,
+            'phases': breakdown}
+
+
+def build_args(command: str, plugins: int, conf: int, engine: str, find_links: Path = None, pinned=False):
+    args = ['--no-self', '--download-engine', engine]
+    if find_links:
+        args.extend(['--no-index', '--find-links', str(find_links)])
+    plugin_specs = [f'bench_plugin_{i}==1.0' if pinned else f'bench_plugin_{i}' for i in range(plugins)]
+    args.extend(itertools.chain.from_iterable(['--plugin', p] for p in plugin_specs))
+
+    if command == 'sparpy-download':
+        return args
+
+    args.extend(itertools.chain.from_iterable(['--conf', f'spark.bench.key{i}=value{i}'] for i in range(conf)))
+
+    if command == 'sparpy':
+        return [*args, 'bench_cmd_0', '--arg', 'value']
+    if command == 'sparpy-submit':
+        return [*args, 'job.py', '--arg', 'value']
+    return args
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--command', action='append', choices=COMMANDS, help='Commands to measure (all by default)')
+    parser.add_argument('--plugins', action='append', type=int, help='Number of plugins (1 and 10 by default)')
+    parser.add_argument('--conf', action='append', type=int, help='Number of --conf options (0 by default)')
+    parser.add_argument('--reqs-files', action='append', type=int,
+                        help='Number of files on reqs_paths tree (0 by default)')
+    parser.add_argument('--cache', action='append', choices=('cold', 'warm'), help='Cache states (both by default)')
+    parser.add_argument('--engine', action='append', choices=('pip', 'native'), help='Download engines (pip)')
+    parser.add_argument('--index', action='store_true', help='Use a local simple index instead of find-links')
+    parser.add_argument('--pinned', action='store_true', help='Pin plugin versions, so resolution cache is used')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', type=Path, help='JSON lines output file')
+    args = parser.parse_args(argv)
+
+    commands = args.command or list(COMMANDS)
+    scales = list(itertools.product(args.plugins or [1, 10],
+                                    args.conf or [0],
+                                    args.reqs_files or [0],
+                                    args.engine or ['pip'],
+                                    args.cache or ['cold', 'warm']))
+
+    output = args.output.open('a') if args.output else None
+    summary = []
+    server = None
+
+    with TemporaryDirectory(prefix='sparpy_bench_') as tmp:
+        tmp = Path(tmp)
+        wheelhouse = build_wheelhouse(tmp / 'wheelhouse', max(s[0] for s in scales))
+
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join([str(ROOT_DIR), *filter(None, [env.get('PYTHONPATH')])])
+        env.pop('SPARPY_CONFIG', None)
+
+        find_links = wheelhouse
+        if args.index:
+            server = serve(build_simple_index(wheelhouse, tmp / 'index'))
+            env['PIP_INDEX_URL'] = f'http://127.0.0.1:{server.server_address[1]}/simple/'
+            find_links = None
+
+        stub = tmp / 'stub-executable'
+        stub.write_text(STUB_EXECUTABLE)
+        stub.chmod(0o755)
+
+        for plugins, conf, reqs_files, engine, cache in scales:
+            reqs_dir = tmp / f'reqs_{reqs_files}'
+            if reqs_files and not reqs_dir.exists():
+                build_reqs_tree(reqs_dir, reqs_files)
+
+            config_file = tmp / f'sparpy_{reqs_files}.conf'
+            config_file.write_text('\n'.join(['[spark]',
+                                              f'spark-executable={stub}',
+                                              f'reqs_paths={reqs_dir}' if reqs_files else '',
+                                              '[interactive]',
+                                              f'pyspark-executable={stub}',
+                                              '']))
+
+            for command in commands:
+                times = []
+                for run in range(args.repeat):
+                    run_dir = tmp / 'run'
+                    run_dir.mkdir(exist_ok=True)
+                    cache_dir = tmp / (f'cache_{run}_{command}_{plugins}_{engine}' if cache == 'cold'
+                                       else f'cache_warm_{plugins}_{engine}')
+
+                    run_env = dict(env,
+                                   SPARPY_CONFIG=str(config_file),
+                                   XDG_CACHE_HOME=str(cache_dir),
+                                   PIP_CACHE_DIR=str(cache_dir / 'pip'))
+
+                    command_args = build_args(command, plugins, conf, engine, find_links, args.pinned)
+                    if cache == 'warm' and run == 0:
+                        run_command(command, command_args, run_env, run_dir)
+
+                    result = run_command(command, command_args, run_env, run_dir)
+                    record = {'command': command,
+                              'plugins': plugins,
+                              'conf': conf,
+                              'reqs_files': reqs_files,
+                              'engine': engine,
+                              'cache': cache,
+                              'index': 'simple' if args.index else 'find-links',
+                              'pinned': args.pinned,
+                              'run': run,
+                              'python': platform.python_version(),
+                              'timestamp': time.time(),
+                              **result}
+                    times.append(result['total_seconds'])
+                    if output:
+                        output.write(json.dumps(record) + '\n')
+
+                summary.append({'command': command, 'plugins': plugins, 'conf': conf, 'reqs_files': reqs_files,
+                                'engine': engine, 'cache': cache,
+                                'median_seconds': round(statistics.median(times), 4)})
+
+    if server:
+        server.shutdown()
+    if output:
+        output.close()
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
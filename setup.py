@@ -56,7 +56,7 @@ setup(
     ],
     packages=find_packages(exclude=['tests'], include=['sparpy*']),
     install_requires=requirements,
-    extras_require={'base': ['pkginfo']},
+    extras_require={'base': ['pkginfo', 'packaging'], 'yaml': ['PyYAML']},
     zip_safe=False,
     entry_points={
         'console_scripts': [
@@ -64,6 +64,12 @@ setup(
             'sparpy-runner=sparpy.cli:run_sparpy_runner',
             'sparpy-submit=sparpy.cli:run_sparpy_submit',
             'sparpy-download=sparpy.cli:run_sparpy_download',
+            'sparpy-lock=sparpy.cli:run_sparpy_lock',
+            'sparpy-mirror=sparpy.cli:run_sparpy_mirror',
+            'sparpy-janitor=sparpy.cli:run_sparpy_janitor',
+            'sparpy-daemon=sparpy.cli:run_sparpy_daemon',
+            'sparpy-batch=sparpy.cli:run_sparpy_batch',
+            'sparpy-cache=sparpy.cli:run_sparpy_cache',
             'isparpy=sparpy.cli:run_isparpy',
         ]
     }
@@ -1 +1 @@
-__version__ = "0.5.5"
+__version__ = "0.6.0"
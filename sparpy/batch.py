@@ -0,0 +1,245 @@
+import json
+import os
+import signal
+import time
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from .processor import ProcessManager
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+RUN_SCRIPT = str(Path(__file__).parent / 'run.py')
+
+
+class BatchJob(NamedTuple):
+    name: str
+    job_args: List[str]
+    plugins: List[str] = []
+    conf: List[str] = []
+    env: Dict[str, str] = {}
+    master: Optional[str] = None
+    deploy_mode: Optional[str] = None
+    queue: Optional[str] = None
+    command: Optional[str] = None
+
+
+class JobResult(NamedTuple):
+    name: str
+    returncode: int
+    started: float
+    finished: float
+    log_file: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0
+
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (str, int, float)):
+        return [str(value)]
+    return [str(v) for v in value]
+
+
+def _as_conf(value) -> List[str]:
+    if isinstance(value, dict):
+        return [f'{k}={v}' for k, v in value.items()]
+    return _as_list(value)
+
+
+def load_batch_manifest(path: Path) -> List[BatchJob]:
+    """
+    Reads job specs from a JSON or YAML manifest. YAML manifests require
+    `PyYAML` package. Values on `defaults` are applied to every job:
+
+    .. code-block:: yaml
+
+        defaults:
+          plugins: [my-package==1.0]
+          conf: {spark.executor.memory: 4g}
+        jobs:
+          - name: variant-1
+            command: my_plugin_command
+            args: [--param, 1]
+          - script: /path/to/job.py
+            conf: [spark.executor.cores=2]
+            env: {MY_VAR: value}
+    """
+    path = Path(path)
+    try:
+        text = path.read_text()
+    except OSError as ex:
+        raise RuntimeError(f'Unable to read batch manifest {path}: {ex}')
+
+    if path.suffix in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError('Package `PyYAML` is required in order to read YAML batch manifests')
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as ex:
+            raise RuntimeError(f'Invalid batch manifest {path}: {ex}')
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError as ex:
+            raise RuntimeError(f'Invalid batch manifest {path}: {ex}')
+
+    if isinstance(data, list):
+        data = {'jobs': data}
+    if not isinstance(data, dict) or not isinstance(data.get('jobs'), list):
+        raise RuntimeError(f'Invalid batch manifest {path}: a list of jobs is required')
+
+    defaults = data.get('defaults') or {}
+
+    jobs = []
+    for i, spec in enumerate(data['jobs']):
+        spec = {**defaults,
+                **spec,
+                'plugins': [*_as_list(defaults.get('plugins')), *_as_list(spec.get('plugins'))],
+                'conf': [*_as_conf(defaults.get('conf')), *_as_conf(spec.get('conf'))],
+                'env': {**(defaults.get('env') or {}), **(spec.get('env') or {})}}
+
+        if spec.get('command'):
+            job_args = [RUN_SCRIPT, str(spec['command'])]
+        elif spec.get('script'):
+            job_args = [str(spec['script'])]
+        else:
+            raise RuntimeError(f'Invalid batch manifest {path}: job {i} has neither command nor script')
+
+        jobs.append(BatchJob(name=str(spec.get('name') or f'job-{i}'),
+                             job_args=[*job_args, *_as_list(spec.get('args'))],
+                             plugins=spec['plugins'],
+                             conf=spec['conf'],
+                             env={k: str(v) for k, v in spec['env'].items()},
+                             master=spec.get('master'),
+                             deploy_mode=spec.get('deploy-mode', spec.get('deploy_mode')),
+                             queue=spec.get('queue'),
+                             command=str(spec['command']) if spec.get('command') else None))
+
+    names = [j.name for j in jobs]
+    duplicated = sorted({n for n in names if names.count(n) > 1})
+    if duplicated:
+        raise RuntimeError(f'Invalid batch manifest {path}: duplicated job names {", ".join(duplicated)}')
+
+    return jobs
+
+
+class BatchRunner:
+    """
+    Runs spark-submit commands of a batch concurrently, up to
+    `max_concurrency` at a time. Commands must be already built, so
+    packages are resolved, bundled or packed only once. Signals received
+    are forwarded to every running job.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 log_dir: Path = None,
+                 logger: Logger = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.log_dir = Path(log_dir) if log_dir else None
+        self.logger = logger or getLogger(__name__)
+
+        self._running: Dict[str, ProcessManager] = {}
+
+    def send_signal(self, sig, _=None):
+        for process in list(self._running.values()):
+            process.send_signal(sig)
+
+    def _run_job(self, name: str, spark_command: List[str], env: Dict[str, str]) -> JobResult:
+        log_file = None
+        log = None
+        if self.log_dir:
+            log_file = self.log_dir / f'{name}.log'
+            log = log_file.open('wb')
+
+        started = time.time()
+        try:
+            process = ProcessManager(spark_command,
+                                     pass_through=True,
+                                     env=env,
+                                     handle_signals=False,
+                                     stdout=log,
+                                     stderr=log)
+            self.logger.info(f'Job {name} started')
+            process.start_process()
+            self._running[name] = process
+            try:
+                process.wait()
+            finally:
+                del self._running[name]
+            returncode = process.returncode
+        except OSError as ex:
+            self.logger.error(f'Job {name} could not be started: {ex}')
+            returncode = -1
+        finally:
+            if log:
+                log.close()
+
+        result = JobResult(name=name,
+                           returncode=returncode,
+                           started=started,
+                           finished=time.time(),
+                           log_file=str(log_file) if log_file else None)
+        self.logger.info(f'Job {name} {"succeeded" if result.succeeded else "failed"} '
+                         f'with exit code {returncode} in {result.finished - started:.1f}s')
+        return result
+
+    def run(self,
+            commands: Iterable[tuple],
+            on_result: Callable[[JobResult], None] = None) -> List[JobResult]:
+        """
+        Runs `(name, spark_command, env)` commands and returns their results
+        in same order.
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        commands = list(commands)
+        if self.log_dir:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+
+        original_sigint_handler = signal.getsignal(signal.SIGINT)
+        original_sigterm_handler = signal.getsignal(signal.SIGTERM)
+        signal.signal(signal.SIGINT, self.send_signal)
+        signal.signal(signal.SIGTERM, self.send_signal)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                futures = [executor.submit(self._run_job, *command) for command in commands]
+                for future in as_completed(futures):
+                    if on_result:
+                        on_result(future.result())
+                results = [future.result() for future in futures]
+        finally:
+            signal.signal(signal.SIGINT, original_sigint_handler)
+            signal.signal(signal.SIGTERM, original_sigterm_handler)
+
+        return results
+
+
+def build_batch_status(results: Iterable[JobResult], total: int = None) -> Dict:
+    results = list(results)
+    return {'total': total if total is not None else len(results),
+            'finished': len(results),
+            'succeeded': len([r for r in results if r.succeeded]),
+            'failed': len([r for r in results if not r.succeeded]),
+            'jobs': [{'name': r.name,
+                      'returncode': r.returncode,
+                      'started': r.started,
+                      'finished': r.finished,
+                      'duration': r.finished - r.started,
+                      'log_file': r.log_file} for r in results]}
+
+
+def write_batch_status(status_file: Path, status: Dict):
+    status_file = Path(status_file)
+    tmp_file = status_file.with_name(f'.{status_file.name}.tmp')
+    with tmp_file.open('w') as f:
+        json.dump(status, f, indent=2)
+    os.replace(str(tmp_file), str(status_file))
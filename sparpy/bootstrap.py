@@ -0,0 +1,200 @@
+import os
+import sys
+from importlib import import_module
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+PLUGINS_ENTRY_POINT = 'sparpy.cli_plugins'
+
+MANIFEST_MODULE = 'sparpy_plugin_manifest'
+MANIFEST_VERSION = 1
+
+# Options of plugins runner, which precede plugin command
+RUNNER_OPTIONS = {'--profile': 'profile', '--profile-dir': 'profile_dir'}
+
+MANIFEST_TEMPLATE = '''# Generated by sparpy. Entry point of plugin command submitted.
+VERSION = {version!r}
+PLUGIN = {plugin!r}
+'''
+
+
+def _iter_entry_points_files(archive: Path) -> Iterable[str]:
+    from zipfile import BadZipFile, ZipFile
+
+    try:
+        with ZipFile(str(archive)) as zf:
+            names = sorted(n for n in zf.namelist()
+                           if n.count('/') == 1 and n.endswith('/entry_points.txt')
+                           and n.split('/', 1)[0].endswith(('.dist-info', '.egg-info', 'EGG-INFO')))
+            for name in names:
+                yield zf.read(name).decode('utf-8')
+    except (OSError, BadZipFile):
+        return
+
+
+def find_plugin_entry_point(archives: Iterable[Path], command: str) -> Optional[Dict[str, str]]:
+    """
+    Looks for the entry point of plugin `command` on metadata of python
+    archives, in same order plugins runner would find it.
+    """
+    from configparser import ConfigParser, Error
+
+    for archive in archives:
+        for text in _iter_entry_points_files(Path(archive)):
+            parser = ConfigParser(delimiters=('=',), interpolation=None)
+            parser.optionxform = str
+            try:
+                parser.read_string(text)
+            except Error:
+                continue
+
+            if parser.has_option(PLUGINS_ENTRY_POINT, command):
+                return {'command': command,
+                        'value': parser.get(PLUGINS_ENTRY_POINT, command).strip(),
+                        'archive': Path(archive).name}
+    return None
+
+
+def build_plugin_manifest(archives: Iterable[Path],
+                          command: str,
+                          output_dir: Path,
+                          logger: Logger = None) -> Optional[Path]:
+    """
+    Writes a zip file with a module recording entry point of plugin `command`,
+    so driver could invoke it without looking up every entry point. Zip file
+    is deterministic and named after its content. It returns None when
+    command is not found on archives.
+    """
+    import hashlib
+    from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+
+    from .bundle import ZIP_EPOCH
+
+    logger = logger or getLogger(__name__)
+
+    plugin = find_plugin_entry_point(archives, command)
+    if plugin is None:
+        logger.debug(f'Plugin command {command} not found on python packages, plugin manifest is not built')
+        return None
+
+    content = MANIFEST_TEMPLATE.format(version=MANIFEST_VERSION, plugin=plugin).encode('utf-8')
+
+    output_dir = Path(output_dir)
+    manifest = output_dir / f'{MANIFEST_MODULE}-{hashlib.sha256(content).hexdigest()[:16]}.zip'
+    if manifest.is_file():
+        from .cache import touch
+
+        touch(manifest)
+        return manifest
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tmp_manifest = manifest.with_name(f'.{manifest.name}.{os.getpid()}.tmp')
+    try:
+        with ZipFile(str(tmp_manifest), 'w') as zf:
+            zinfo = ZipInfo(f'{MANIFEST_MODULE}.py', date_time=ZIP_EPOCH)
+            zinfo.external_attr = 0o644 << 16
+            zinfo.compress_type = ZIP_DEFLATED
+            zf.writestr(zinfo, content)
+        os.replace(str(tmp_manifest), str(manifest))
+    finally:
+        if tmp_manifest.exists():
+            tmp_manifest.unlink()
+
+    logger.debug(f'Plugin manifest {manifest.name} built for {command} ({plugin["value"]})')
+    return manifest
+
+
+def load_entry_point(value: str) -> Callable:
+    module_name, _, attrs = value.split('[', 1)[0].strip().partition(':')
+    obj = import_module(module_name.strip())
+    for attr in attrs.strip().split('.') if attrs.strip() else []:
+        obj = getattr(obj, attr)
+    return obj
+
+
+def split_runner_options(argv: List[str]) -> Optional[Tuple[Dict[str, str], List[str]]]:
+    """
+    Splits plugins runner options from plugin command and its arguments. It
+    returns None when an option is not known by fast path.
+    """
+    options = {}
+    argv = list(argv)
+    while argv and argv[0].startswith('-'):
+        option, sep, value = argv.pop(0).partition('=')
+        if option not in RUNNER_OPTIONS:
+            return None
+        if not sep:
+            if not argv:
+                return None
+            value = argv.pop(0)
+        options[RUNNER_OPTIONS[option]] = value
+    return options, argv
+
+
+def run_plugin_from_manifest(argv: List[str] = None):
+    """
+    Driver fast path: invokes plugin command recorded on shipped plugin
+    manifest, importing neither sparpy command line nor every entry point.
+    Plugins runner options (profiling) are honoured. It returns, so plugins
+    runner is used, when there is no manifest, it is for other command,
+    there are unknown runner options or its entry point could not be loaded.
+    Otherwise it exits with command result.
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+
+    try:
+        from sparpy_plugin_manifest import PLUGIN, VERSION
+    except ImportError:
+        return
+
+    split = split_runner_options(argv)
+    if VERSION != MANIFEST_VERSION or split is None:
+        return
+
+    options, argv = split
+    if not argv or argv[0] != PLUGIN['command']:
+        return
+
+    if options.get('profile'):
+        from .profiling import PROFILERS
+
+        if options['profile'] not in PROFILERS:
+            return
+
+    try:
+        command = load_entry_point(PLUGIN['value'])
+    except Exception as ex:
+        print(f'Plugin {PLUGIN["command"]} could not be loaded from manifest, using plugins runner: {ex}',
+              file=sys.stderr)
+        return
+
+    if 'pkg_resources' in sys.modules:
+        from .plugins import ensure_plugin_distribution
+
+        ensure_plugin_distribution()
+
+    click = sys.modules.get('click')
+    if click is not None and isinstance(command, click.BaseCommand):
+        if options.get('profile'):
+            from copy import copy
+
+            command = copy(command)
+            command.invoke = _profile(command.invoke, argv[0], options)
+        command.main(args=argv[1:], prog_name=argv[0], obj={})
+        sys.exit(0)
+
+    if options.get('profile'):
+        command = _profile(command, argv[0], options)
+    sys.exit(command(tuple(argv[1:])))
+
+
+def _profile(fn: Callable, name: str, options: Dict[str, str]) -> Callable:
+    from .logger import build_logger
+    from .profiling import profile_callable
+
+    return profile_callable(fn,
+                            profiler=options['profile'],
+                            name=name,
+                            output_dir=options.get('profile_dir'),
+                            logger=build_logger(None))
@@ -0,0 +1,96 @@
+import hashlib
+import os
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+from zipfile import ZIP_DEFLATED, ZipFile, ZipInfo
+
+from .cache import file_digest, touch
+from .packages import parse_package_filename
+
+BUNDLE_PREFIX = 'sparpy-bundle-'
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def _bundle_digest(archives: Iterable[Path]) -> str:
+    h = hashlib.sha256()
+    for archive in archives:
+        h.update(archive.name.encode('utf-8'))
+        h.update(file_digest(archive).encode('ascii'))
+    return h.hexdigest()
+
+
+def _egg_info_name(archive: Path) -> str:
+    try:
+        name, version = parse_package_filename(archive.name)
+    except ValueError:
+        name, version = archive.stem, '0'
+    return f'{name}-{version}.egg-info'
+
+
+def build_bundle(archives: Iterable[Path], output_dir: Path, logger: Logger = None) -> Path:
+    """
+    Merges python archives (wheels, eggs or zips) in a single zip file with a
+    unique top level layout. Result is deterministic: entries are sorted and
+    timestamps are fixed, so bundle name is derived from its contents. When
+    several archives contain same file, first one (by archive name) wins.
+    """
+    logger = logger or getLogger(__name__)
+
+    archives = sorted({Path(a).resolve() for a in archives}, key=lambda a: (a.name, str(a)))
+    output_dir = Path(output_dir)
+
+    bundle = output_dir / f'{BUNDLE_PREFIX}{_bundle_digest(archives)[:16]}.zip'
+    if bundle.is_file():
+        logger.debug(f'Using existing bundle {bundle}')
+        touch(bundle)
+        return bundle
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    entries: Dict[str, Tuple[Path, ZipInfo]] = {}
+    for archive in archives:
+        egg_info = _egg_info_name(archive) if archive.suffix == '.egg' else None
+
+        with ZipFile(str(archive)) as zf:
+            for info in zf.infolist():
+                if info.filename.endswith('/'):
+                    continue
+
+                arcname = info.filename
+                if egg_info and arcname.startswith('EGG-INFO/'):
+                    arcname = egg_info + arcname[len('EGG-INFO'):]
+
+                if arcname in entries:
+                    logger.debug(f'Duplicated entry {arcname} on {archive.name} ignored')
+                    continue
+
+                entries[arcname] = (archive, info)
+
+    tmp_bundle = bundle.with_name(f'.{bundle.name}.{os.getpid()}.tmp')
+    opened: Dict[Path, ZipFile] = {}
+    try:
+        with ZipFile(str(tmp_bundle), 'w') as bf:
+            for arcname in sorted(entries):
+                archive, info = entries[arcname]
+                try:
+                    src = opened[archive]
+                except KeyError:
+                    src = opened[archive] = ZipFile(str(archive))
+
+                zinfo = ZipInfo(arcname, date_time=ZIP_EPOCH)
+                zinfo.external_attr = info.external_attr
+                zinfo.compress_type = ZIP_DEFLATED
+                bf.writestr(zinfo, src.read(info.filename))
+    except BaseException:
+        if tmp_bundle.exists():
+            tmp_bundle.unlink()
+        raise
+    finally:
+        for zf in opened.values():
+            zf.close()
+
+    os.replace(str(tmp_bundle), str(bundle))
+    logger.debug(f'Bundle {bundle} built from {len(archives)} archives')
+
+    return bundle
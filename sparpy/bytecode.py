@@ -0,0 +1,107 @@
+import marshal
+import os
+import sys
+from logging import Logger, getLogger
+from pathlib import Path
+from zipfile import ZipFile, ZipInfo
+
+from .cache import file_digest, record_cache_lookup, touch
+from .locking import publish_file
+
+# PEP 552 flags: hash based pyc, source is not checked.
+UNCHECKED_HASH_FLAGS = 0b01
+
+
+def compile_source(source: bytes, filename: str, optimize: int = -1) -> bytes:
+    """
+    Compiles python source to an unchecked hash based pyc, so it is valid
+    regardless zip entries timestamps.
+    """
+    try:
+        from importlib.util import MAGIC_NUMBER, source_hash
+    except ImportError:  # pragma: no cover
+        raise RuntimeError('Bytecode compilation requires Python 3.7 or above')
+
+    code = compile(source, filename, 'exec', dont_inherit=True, optimize=optimize)
+
+    return b''.join([MAGIC_NUMBER,
+                     UNCHECKED_HASH_FLAGS.to_bytes(4, 'little'),
+                     source_hash(source),
+                     marshal.dumps(code)])
+
+
+def _bytecode_marker(drop_sources: bool, optimize: int) -> bytes:
+    return f'sparpy-bytecode:{sys.implementation.cache_tag}:{int(drop_sources)}:{optimize}'.encode('ascii')
+
+
+def compile_archive(archive: Path,
+                    drop_sources: bool = False,
+                    optimize: int = -1,
+                    cache_dir: Path = None,
+                    logger: Logger = None) -> Path:
+    """
+    Adds compiled modules to a zip archive, next to their sources, where
+    `zipimport` looks for them. Modules are compiled for running interpreter.
+    When `drop_sources` is set, sources of compiled modules are removed.
+    """
+    logger = logger or getLogger(__name__)
+    archive = Path(archive)
+    marker = _bytecode_marker(drop_sources, optimize)
+
+    with ZipFile(str(archive)) as zf:
+        if zf.comment == marker:
+            return archive
+
+    cached = None
+    if cache_dir is not None:
+        cached = Path(cache_dir) / f'{file_digest(archive)}-{marker.decode("ascii").replace(":", "-")}.zip'
+        if cached.is_file():
+            logger.debug(f'Using cached bytecode for {archive.name}')
+            publish_file(cached, archive)
+            touch(cached)
+            record_cache_lookup(Path(cache_dir).parent, 'bytecode', True)
+            return archive
+        record_cache_lookup(Path(cache_dir).parent, 'bytecode', False)
+
+    tmp_archive = archive.with_name(f'.{archive.name}.{os.getpid()}.tmp')
+    try:
+        with ZipFile(str(archive)) as src, ZipFile(str(tmp_archive), 'w') as dst:
+            names = set(src.namelist())
+            for info in src.infolist():
+                data = src.read(info.filename)
+
+                if not info.filename.endswith('.py') or info.filename + 'c' in names:
+                    dst.writestr(info, data)
+                    continue
+
+                try:
+                    pyc = compile_source(data, f'{archive.name}/{info.filename}', optimize=optimize)
+                except (SyntaxError, ValueError) as ex:
+                    logger.debug(f'Unable to compile {info.filename} on {archive.name}: {ex}')
+                    dst.writestr(info, data)
+                    continue
+
+                if not drop_sources:
+                    dst.writestr(info, data)
+
+                pyc_info = ZipInfo(info.filename + 'c', date_time=info.date_time)
+                pyc_info.external_attr = info.external_attr
+                pyc_info.compress_type = info.compress_type
+                dst.writestr(pyc_info, pyc)
+
+            dst.comment = marker
+    except BaseException:
+        if tmp_archive.exists():
+            tmp_archive.unlink()
+        raise
+
+    if cached is not None:
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            publish_file(tmp_archive, cached)
+        except OSError as ex:
+            logger.warning(f'Unable to cache bytecode for {archive.name}: {ex}')
+
+    os.replace(str(tmp_archive), str(archive))
+
+    return archive
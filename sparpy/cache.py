@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import time
+from logging import Logger, getLogger
+from pathlib import Path
+from shutil import rmtree
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config import ConfigParser
+from .locking import DEFAULT_LOCK_TIMEOUT, FileLock, link_or_copy
+
+PACKAGE_FILE_PATTERNS = ('*.whl', '*.zip', '*.egg', '*.tar.gz', '*.tar.bz2', '*.tgz')
+
+
+def default_cache_dir() -> Path:
+    try:
+        return Path(os.environ['XDG_CACHE_HOME']) / 'sparpy'
+    except KeyError:
+        return Path.home() / '.cache' / 'sparpy'
+
+
+def get_cache_dir(config=None) -> Path:
+    try:
+        cache_config = config['cache']
+    except (KeyError, TypeError):
+        return default_cache_dir()
+
+    return cache_config.getpath('dir', fallback=default_cache_dir())
+
+
+def file_digest(path: Path, algorithm: str = 'sha256') -> str:
+    h = hashlib.new(algorithm)
+    with Path(path).open('rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def iter_package_files(path: Path) -> Iterable[Path]:
+    seen = set()
+    for pattern in PACKAGE_FILE_PATTERNS:
+        for p in Path(path).glob(pattern):
+            if p.is_file() and p.name not in seen:
+                seen.add(p.name)
+                yield p
+
+
+class ResolutionCache:
+    """
+    Persistent cache of resolved plugin sets.
+
+    Each entry is stored in a directory named after the hash of the normalized
+    download inputs, together with a manifest describing its files. Entries
+    whose packages are all pinned by a lockfile or by requirements and
+    constraints never expire, the rest expire after ``ttl`` seconds.
+    """
+
+    MANIFEST_FILENAME = 'manifest.json'
+
+    def __init__(self,
+                 config=None,
+                 cache_dir: Path = None,
+                 ttl: int = None,
+                 enabled: bool = None,
+                 logger: Logger = None):
+        try:
+            cache_config = config['cache']
+        except (KeyError, TypeError):
+            config = ConfigParser(default_sections=('cache',))
+            cache_config = config['cache']
+
+        self.logger = logger or getLogger(__name__)
+
+        self.enabled = cache_config.getboolean('enabled', fallback=True)
+        self.cache_dir = cache_config.getpath('dir', fallback=default_cache_dir())
+        self.ttl = cache_config.getint('resolution-ttl', fallback=0)
+        self.lock_timeout = cache_config.getint('lock-timeout', fallback=DEFAULT_LOCK_TIMEOUT)
+
+        if cache_dir is not None:
+            self.cache_dir = Path(cache_dir)
+
+        if ttl is not None:
+            self.ttl = ttl
+
+        if enabled is not None:
+            self.enabled = enabled
+
+    @property
+    def resolutions_dir(self) -> Path:
+        return self.cache_dir / 'resolutions'
+
+    @property
+    def locks_dir(self) -> Path:
+        return self.cache_dir / 'locks'
+
+    def lock(self, key: str) -> FileLock:
+        """
+        Lock of a resolution, so only one process resolves and downloads same
+        inputs at a time and the rest reuse its result.
+        """
+        return FileLock(self.locks_dir / f'resolution-{key}.lock', timeout=self.lock_timeout, logger=self.logger)
+
+    @staticmethod
+    def build_key(inputs: Dict[str, Any]) -> str:
+        data = json.dumps(inputs, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def is_cacheable(self, pinned: bool) -> bool:
+        return self.enabled and (pinned or self.ttl > 0)
+
+    def get(self, key: str, pinned: bool = False, fresh_since: float = None) -> Optional[List[Path]]:
+        """
+        Returns files of a valid entry. Entry never expires when `pinned` is
+        set and it was stored as pinned. When `fresh_since` is set, only an
+        entry stored after it is valid, like one stored by a concurrent
+        process while waiting for its lock.
+        """
+        entry_dir = self.resolutions_dir / key
+        try:
+            with (entry_dir / self.MANIFEST_FILENAME).open('r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if fresh_since is not None:
+            if manifest.get('created', 0) < fresh_since:
+                return None
+        elif not (pinned and manifest.get('pinned', False)) and time.time() - manifest.get('created', 0) > self.ttl:
+            self.logger.debug(f'Resolution cache entry {key} expired')
+            return None
+
+        files = [entry_dir / f['name'] for f in manifest.get('files', [])]
+        if not all(f.is_file() for f in files):
+            self.logger.debug(f'Resolution cache entry {key} is incomplete')
+            return None
+
+        touch(entry_dir)
+        return files
+
+    def store(self,
+              key: str,
+              files: Iterable[Path],
+              inputs: Dict[str, Any] = None,
+              pinned: bool = False) -> Optional[Path]:
+        entry_dir = self.resolutions_dir / key
+        tmp_dir = self.resolutions_dir / f'.{key}.{os.getpid()}.tmp'
+        old_dir = self.resolutions_dir / f'.{key}.{os.getpid()}.old'
+
+        try:
+            tmp_dir.mkdir(parents=True, exist_ok=True)
+
+            manifest_files = []
+            for f in files:
+                link_or_copy(f, tmp_dir / f.name)
+                manifest_files.append({'name': f.name,
+                                       'size': f.stat().st_size})
+
+            with (tmp_dir / self.MANIFEST_FILENAME).open('w') as f:
+                json.dump({'created': time.time(),
+                           'pinned': pinned,
+                           'inputs': inputs or {},
+                           'files': manifest_files}, f, indent=2)
+
+            # Previous entry is moved away first, so entry directory is always complete or missing
+            if entry_dir.exists():
+                entry_dir.rename(old_dir)
+            tmp_dir.rename(entry_dir)
+        except OSError as ex:
+            self.logger.warning(f'Unable to store resolution cache entry {key}: {ex}')
+            rmtree(str(tmp_dir), ignore_errors=True)
+            return None
+        finally:
+            rmtree(str(old_dir), ignore_errors=True)
+
+        return entry_dir
+
+    @staticmethod
+    def restore(files: Iterable[Path], target_dir: Path) -> List[Path]:
+        target_dir = Path(target_dir)
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        result = []
+        for f in files:
+            dst = target_dir / f.name
+            if not dst.exists():
+                link_or_copy(f, dst)
+            result.append(dst)
+
+        return result
+
+
+def touch(path: Path):
+    """
+    Updates modification time of a cache entry when it is used, so least
+    recently used entries are evicted first.
+    """
+    try:
+        os.utime(str(path))
+    except OSError:
+        pass
+
+
+class CacheStats:
+    """
+    Counters of cache lookups by kind (resolutions, artifacts, bytecode...):
+    hits, misses and bytes which were not downloaded thanks to hits. They are
+    kept in memory and merged on `stats.json` of cache directory when
+    process finishes.
+    """
+
+    FILENAME = 'stats.json'
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._registered = False
+
+    def record(self, cache_dir: Path, kind: str, hit: bool, size: int = 0):
+        counters = self._counters.setdefault(str(cache_dir), {}).setdefault(kind, {'hits': 0,
+                                                                                   'misses': 0,
+                                                                                   'bytes_saved': 0})
+        if hit:
+            counters['hits'] += 1
+            counters['bytes_saved'] += size
+        else:
+            counters['misses'] += 1
+
+        if not self._registered:
+            import atexit
+
+            self._registered = True
+            atexit.register(self.flush)
+
+    def flush(self):
+        pending, self._counters = self._counters, {}
+        for cache_dir, kinds in pending.items():
+            cache_dir = Path(cache_dir)
+            try:
+                with FileLock(cache_dir / 'locks' / 'stats.lock', timeout=5):
+                    stats = load_cache_stats(cache_dir)
+                    for kind, counters in kinds.items():
+                        current = stats.setdefault(kind, {})
+                        for name, value in counters.items():
+                            current[name] = current.get(name, 0) + value
+
+                    tmp_file = cache_dir / f'.{self.FILENAME}.{os.getpid()}.tmp'
+                    with tmp_file.open('w') as f:
+                        json.dump(stats, f, indent=2, sort_keys=True)
+                    os.replace(str(tmp_file), str(cache_dir / self.FILENAME))
+            except OSError as ex:
+                getLogger(__name__).debug(f'Unable to write cache statistics on {cache_dir}: {ex}')
+
+
+def load_cache_stats(cache_dir: Path) -> Dict[str, Dict[str, int]]:
+    try:
+        with (Path(cache_dir) / CacheStats.FILENAME).open('r') as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return stats if isinstance(stats, dict) else {}
+
+
+_cache_stats: Optional[CacheStats] = None
+
+
+def record_cache_lookup(cache_dir: Path, kind: str, hit: bool, size: int = 0):
+    global _cache_stats
+
+    if cache_dir is None:
+        return
+    if _cache_stats is None:
+        _cache_stats = CacheStats()
+    _cache_stats.record(cache_dir, kind, hit, size=size)
+
+
+def flush_cache_stats():
+    if _cache_stats is not None:
+        _cache_stats.flush()
@@ -1,5 +1,5 @@
+import os
 from pathlib import Path
-from shutil import rmtree
 
 import click
 
@@ -7,12 +7,20 @@ from .cli_options import (common_spark_options, general_options,
                           plugins_options, spark_interactive_options,
                           spark_submit_options)
 from .logger import build_logger
-from .plugins import DownloadPlugins, DynamicGroup
-from .spark import SparkInteractiveCommand, SparkSubmitCommand
+from .plugins import DynamicGroup
+from .profiling import PROFILERS
 
 
 @click.group(cls=DynamicGroup)
-def sparpy_runner():
+@click.option('--profile',
+              type=click.Choice(PROFILERS),
+              default=None,
+              help='Run plugin command under a profiler')
+@click.option('--profile-dir',
+              type=click.Path(file_okay=False),
+              default=None,
+              help='Directory where profiles are written. By default, YARN container log directory or current one.')
+def sparpy_runner(profile, profile_dir):
     pass
 
 
@@ -25,23 +33,52 @@ def run_sparpy_runner():
 @plugins_options
 @common_spark_options
 @spark_submit_options
+@click.option('--profile',
+              type=click.Choice(PROFILERS),
+              default=None,
+              envvar='SPARPY_PROFILE',
+              help='Run plugin command on driver under a profiler (pstats output for cprofile, collapsed stacks '
+                   'for sampling) and enable python workers profiling.')
+@click.option('--profile-dir',
+              type=str,
+              default=None,
+              envvar='SPARPY_PROFILE_DIR',
+              help='Directory on driver host where profiles are written. By default, YARN container log '
+                   'directory or driver working directory.')
 @click.pass_context
 def sparpy(ctx,
            job_args,
+           profile,
+           profile_dir,
            **kwargs):
     """
     Submit an spark job defined on an sparpy plugin
     """
 
-    job_args = list(job_args)
-    job_args.insert(0, str(Path(__file__).parent / 'run.py'))
+    runner_args = [str(Path(__file__).parent / 'run.py')]
+    if profile:
+        from .profiling import WORKERS_PROFILE_DIR
+
+        runner_args.extend(['--profile', profile])
+        kwargs['conf'] = [*kwargs['conf'], 'spark.python.profile=true']
+        if profile_dir:
+            runner_args.extend(['--profile-dir', profile_dir])
+            kwargs['conf'].append(f'spark.python.profile.dump={Path(profile_dir) / WORKERS_PROFILE_DIR}')
+
+    plugin_command = job_args[0] if job_args else None
+    job_args = [*runner_args, *job_args]
 
     return ctx.invoke(sparpy_submit,
                       job_args=job_args,
+                      plugin_command=plugin_command,
                       **kwargs)
 
 
 def run_sparpy():
+    if os.environ.get('SPARPY_DAEMON_SOCKET'):
+        from .daemon import run_daemon_client
+
+        run_daemon_client('sparpy')
     sparpy(obj={})
 
 
@@ -57,6 +94,15 @@ def run_sparpy():
               type=click.Path(file_okay=False, writable=True, resolve_path=True),
               required=False,
               help='Directory where to download packages. If it is not provided a temporal directory will be created.')
+@click.option('--capture-provided-manifest',
+              type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+              required=False,
+              help='Write a manifest of packages installed on python environment, to be used as '
+                   '--provided-manifest, instead of downloading packages.')
+@click.option('--provided-python',
+              type=str,
+              required=False,
+              help='Python interpreter of environment to capture. Current one by default.')
 @click.pass_context
 def sparpy_download(ctx,
                     config,
@@ -73,17 +119,40 @@ def sparpy_download(ctx,
                     force_download,
                     pre,
                     proxy,
+                    lockfile,
+                    compile_bytecode,
+                    drop_sources,
+                    download_engine,
+                    provided_manifest,
                     plugin_env,
                     # Output
                     convert_to_zip,
                     output_dir,
+                    capture_provided_manifest=None,
+                    provided_python=None,
                     *,
                     logger=None):
     """
     Download all dependencies and store them in a directory
     """
+    from .metrics import configure_metrics
+    from .plugins import DownloadPlugins
 
     logger = logger or build_logger(config, debug)
+    configure_metrics(config, command=ctx.find_root().info_name, logger=logger)
+
+    if capture_provided_manifest:
+        from .provided import ProvidedManifest
+
+        try:
+            manifest = ProvidedManifest.capture(provided_python)
+            manifest.save(capture_provided_manifest)
+        except RuntimeError as ex:
+            click.echo(ex)
+            raise ctx.exit(-1)
+
+        click.echo(f'Provided manifest: {capture_provided_manifest} ({len(manifest.packages)} packages)')
+        return None
 
     download_command = DownloadPlugins(config=config,
                                        plugins=plugin,
@@ -97,6 +166,11 @@ def sparpy_download(ctx,
                                        force_download=force_download,
                                        pre=pre,
                                        proxy=proxy,
+                                       lockfile=lockfile,
+                                       compile_bytecode=compile_bytecode,
+                                       drop_sources=drop_sources,
+                                       download_engine=download_engine,
+                                       provided_manifest=provided_manifest,
                                        env=plugin_env,
                                        logger=logger,
                                        convert_to_zip=convert_to_zip,
@@ -115,6 +189,236 @@ def run_sparpy_download():
     sparpy_download(obj={})
 
 
+@click.command(name='sparpy-lock')
+@general_options
+@plugins_options
+@click.option('--output', '-o',
+              type=click.Path(dir_okay=False, writable=True, resolve_path=True),
+              default='sparpy.lock',
+              show_default=True,
+              help='Lockfile path')
+@click.pass_context
+def sparpy_lock(ctx,
+                config,
+                debug,
+                # Plugin options
+                plugin,
+                requirements_file,
+                constraint,
+                exclude_python_package,
+                extra_index_url,
+                find_links,
+                no_index,
+                no_self,
+                force_download,
+                pre,
+                proxy,
+                lockfile,
+                compile_bytecode,
+                drop_sources,
+                download_engine,
+                provided_manifest,
+                plugin_env,
+                # Output
+                output,
+                *,
+                logger=None):
+    """
+    Resolve all dependencies and write a lockfile with pinned and hashed packages
+    """
+    from shutil import rmtree
+
+    from .lock import Lockfile
+    from .metrics import configure_metrics
+    from .plugins import DownloadPlugins
+
+    logger = logger or build_logger(config, debug)
+    configure_metrics(config, command=ctx.find_root().info_name, logger=logger)
+
+    download_command = DownloadPlugins(config=config,
+                                       plugins=plugin,
+                                       requirements_files=requirements_file,
+                                       constraints=constraint,
+                                       exclude_packages=exclude_python_package,
+                                       extra_index_urls=extra_index_url,
+                                       find_links=find_links,
+                                       no_index=no_index,
+                                       no_self=no_self,
+                                       force_download=force_download,
+                                       pre=pre,
+                                       proxy=proxy,
+                                       lockfile=lockfile,
+                                       compile_bytecode=compile_bytecode,
+                                       drop_sources=drop_sources,
+                                       download_engine=download_engine,
+                                       provided_manifest=provided_manifest,
+                                       env=plugin_env,
+                                       logger=logger,
+                                       convert_to_zip=False,
+                                       build_wheels=False)
+    try:
+        reqs_path = download_command.download(debug=debug)
+        if reqs_path is None:
+            click.echo('Nothing to lock')
+            raise ctx.exit(-1)
+
+        lock = Lockfile.from_directory(reqs_path, inputs={'plugins': list(download_command.iter_requirements()),
+                                                          'requirements_files': [str(r) for r in
+                                                                                 download_command.requirements_files],
+                                                          'constraints': [str(c) for c in
+                                                                          download_command.constraints]})
+        lock.save(output)
+    except RuntimeError as ex:
+        click.echo(ex)
+        raise ctx.exit(-1)
+    finally:
+        rmtree(download_command.reqs_path, ignore_errors=True)
+
+    click.echo(f'Lockfile: {output} ({len(lock.artifacts)} packages)')
+    return output
+
+
+def run_sparpy_lock():
+    sparpy_lock(obj={})
+
+
+@click.command(name='sparpy-mirror')
+@general_options
+@plugins_options
+@click.option('--prune/--no-prune',
+              default=None,
+              help='Remove mirrored files which are not referenced by lockfiles nor requirements '
+                   '[default: prune on mirror section or true]')
+@click.argument('mirror_dir',
+                type=click.Path(file_okay=False, writable=True, resolve_path=True))
+@click.argument('lockfiles',
+                nargs=-1,
+                type=click.Path(exists=True, dir_okay=False))
+@click.pass_context
+def sparpy_mirror(ctx,
+                  config,
+                  debug,
+                  # Plugin options
+                  plugin,
+                  requirements_file,
+                  constraint,
+                  exclude_python_package,
+                  extra_index_url,
+                  find_links,
+                  no_index,
+                  no_self,
+                  force_download,
+                  pre,
+                  proxy,
+                  lockfile,
+                  compile_bytecode,
+                  drop_sources,
+                  download_engine,
+                  provided_manifest,
+                  plugin_env,
+                  # Mirror options
+                  prune,
+                  mirror_dir,
+                  lockfiles,
+                  *,
+                  logger=None):
+    """
+    Mirror packages of lockfiles and requirements on a local wheelhouse with a simple index
+    """
+    from shutil import rmtree
+
+    from .cache import iter_package_files
+    from .lock import Lockfile
+    from .metrics import configure_metrics
+    from .mirror import Mirror
+    from .plugins import DownloadPlugins
+
+    logger = logger or build_logger(config, debug)
+    configure_metrics(config, command=ctx.find_root().info_name, logger=logger)
+
+    if prune is None:
+        try:
+            prune = config['mirror'].getboolean('prune', fallback=True)
+        except KeyError:
+            prune = True
+
+    lockfiles = [*lockfiles, *([lockfile] if lockfile else [])]
+    if not lockfiles and not plugin and not requirements_file:
+        click.echo('Nothing to mirror')
+        raise ctx.exit(-1)
+
+    mirror = Mirror(mirror_dir, logger=logger)
+    referenced = set()
+    added = []
+
+    def mirror_packages(lock_path=None, plugins=None, requirements_files=None):
+        download_command = DownloadPlugins(config=config,
+                                           plugins=plugins,
+                                           requirements_files=requirements_files,
+                                           constraints=constraint,
+                                           exclude_packages=exclude_python_package,
+                                           extra_index_urls=extra_index_url,
+                                           find_links=find_links,
+                                           no_index=no_index,
+                                           no_self=no_self,
+                                           force_download=force_download,
+                                           pre=pre,
+                                           proxy=proxy,
+                                           lockfile=lock_path,
+                                           download_engine=download_engine,
+                                           provided_manifest=provided_manifest,
+                                           env=plugin_env,
+                                           logger=logger,
+                                           convert_to_zip=False,
+                                           build_wheels=False)
+        try:
+            if lock_path is not None:
+                # Already mirrored artifacts are not downloaded again
+                mirror.seed({a.filename: a.sha256 for a in Lockfile.load(lock_path).artifacts},
+                            Path(download_command.reqs_path))
+
+            reqs_path = download_command.download(debug=debug)
+            if reqs_path is None:
+                return
+
+            for path in iter_package_files(Path(reqs_path)):
+                referenced.add(path.name)
+                if mirror.add(path):
+                    added.append(path.name)
+        finally:
+            rmtree(download_command.reqs_path, ignore_errors=True)
+
+    try:
+        with mirror.lock():
+            mirror.refresh()
+
+            for lock_path in lockfiles:
+                logger.info(f'Mirroring packages of {lock_path}...')
+                mirror_packages(lock_path=lock_path)
+
+            if plugin or requirements_file:
+                logger.info('Mirroring requirements...')
+                mirror_packages(plugins=plugin, requirements_files=requirements_file)
+
+            pruned = mirror.prune(referenced) if prune else []
+            mirror.write_index()
+            mirror.save()
+    except RuntimeError as ex:
+        click.echo(ex)
+        raise ctx.exit(-1)
+
+    for filename in added:
+        click.echo(f'Added: {filename}')
+    for path in pruned:
+        click.echo(f'Pruned: {path.name}')
+    click.echo(f'Mirror: {mirror.directory} ({len(mirror.files)} packages, {len(added)} added, {len(pruned)} pruned)')
+    return mirror
+
+
+def run_sparpy_mirror():
+    sparpy_mirror(obj={})
+
+
 @click.command(name='sparpy-submit', context_settings={'ignore_unknown_options': True})
 @general_options
 @plugins_options
@@ -136,9 +440,16 @@ def sparpy_submit(ctx,
                   force_download,
                   pre,
                   proxy,
+                  lockfile,
+                  compile_bytecode,
+                  drop_sources,
+                  download_engine,
+                  provided_manifest,
                   plugin_env,
                   # Spark submit options
                   spark_submit_executable,
+                  status_file,
+                  exec_mode,
                   # Common Spark options
                   master,
                   deploy_mode,
@@ -150,52 +461,72 @@ def sparpy_submit(ctx,
                   env,
                   properties_file,
                   klass,
+                  bundle,
+                  packed_env,
                   # Job arguments
                   job_args,
                   *,
+                  plugin_command=None,
                   logger=None):
     """
     Submit an spark job defined on an script
     """
+    from shutil import rmtree
+
+    from .metrics import configure_metrics, span
+    from .spark import SparkSubmitCommand
 
     logger = logger or build_logger(config, debug)
+    configure_metrics(config, command=ctx.find_root().info_name, logger=logger)
+
+    with span('submit.conf_split'):
+        if conf:
+            sparpy_conf = [tuple(k.split('=', 1)) for k in conf if k.startswith('sparpy.')]
+            conf = [k for k in conf if not k.startswith('sparpy.')]
+            if len(sparpy_conf):
+                plugin = [*plugin, *[v for k, v in sparpy_conf if k == 'sparpy.plugins']]
+                requirements_file = [*requirements_file,
+                                     *[v for k, v in sparpy_conf if k == 'sparpy.requirements-file']]
+                constraint = [*constraint, *[v for k, v in sparpy_conf if k == 'sparpy.constraints']]
+                exclude_python_package = [*exclude_python_package, *
+                                          [v for k, v in sparpy_conf if k == 'sparpy.exclude-python-packages']]
+                extra_index_url = [*extra_index_url, *[v for k, v in sparpy_conf if k == 'sparpy.extra-index-url']]
+                find_links = [*find_links, *[v for k, v in sparpy_conf if k == 'sparpy.find-links']]
+
+                try:
+                    lockfile = [v for k, v in sparpy_conf if k == 'sparpy.lockfile'][-1]
+                except IndexError:
+                    pass
+
+                try:
+                    provided_manifest = [v for k, v in sparpy_conf if k == 'sparpy.provided-manifest'][-1]
+                except IndexError:
+                    pass
+
+                try:
+                    no_index = [v for k, v in sparpy_conf if k == 'sparpy.no-index'][0].lower() not in ['true', '1']
+                except (IndexError, AttributeError):
+                    pass
 
-    if conf:
-        sparpy_conf = [tuple(k.split('=', 1)) for k in conf if k.startswith('sparpy.')]
-        conf = [k for k in conf if not k.startswith('sparpy.')]
-        if len(sparpy_conf):
-            plugin = [*plugin, *[v for k, v in sparpy_conf if k == 'sparpy.plugins']]
-            requirements_file = [*requirements_file, *[v for k, v in sparpy_conf if k == 'sparpy.requirements-file']]
-            constraint = [*constraint, *[v for k, v in sparpy_conf if k == 'sparpy.constraints']]
-            exclude_python_package = [*exclude_python_package, *
-                                      [v for k, v in sparpy_conf if k == 'sparpy.exclude-python-packages']]
-            extra_index_url = [*extra_index_url, *[v for k, v in sparpy_conf if k == 'sparpy.extra-index-url']]
-            find_links = [*find_links, *[v for k, v in sparpy_conf if k == 'sparpy.find-links']]
-
-            try:
-                no_index = [v for k, v in sparpy_conf if k == 'sparpy.no-index'][0].lower() not in ['true', '1']
-            except (IndexError, AttributeError):
-                pass
-
-            try:
-                no_self = [v for k, v in sparpy_conf if k == 'sparpy.no-self'][0].lower() not in ['true', '1']
-            except (IndexError, AttributeError):
-                pass
-
-            try:
-                force_download = [v for k, v in sparpy_conf
-                                  if k == 'sparpy.force-download'][0].lower() not in ['true', '1']
-            except (IndexError, AttributeError):
-                pass
-
-            try:
-                pre = [v for k, v in sparpy_conf
-                       if k == 'sparpy.pre-releases'][0].lower() not in ['true', '1']
-            except (IndexError, AttributeError):
-                pass
-
-            plugin_env.update(dict([v.split('=', 1) for k, v in sparpy_conf
-                                    if k == 'sparpy.plugin-env']))
+                try:
+                    no_self = [v for k, v in sparpy_conf if k == 'sparpy.no-self'][0].lower() not in ['true', '1']
+                except (IndexError, AttributeError):
+                    pass
+
+                try:
+                    force_download = [v for k, v in sparpy_conf
+                                      if k == 'sparpy.force-download'][0].lower() not in ['true', '1']
+                except (IndexError, AttributeError):
+                    pass
+
+                try:
+                    pre = [v for k, v in sparpy_conf
+                           if k == 'sparpy.pre-releases'][0].lower() not in ['true', '1']
+                except (IndexError, AttributeError):
+                    pass
+
+                plugin_env.update(dict([v.split('=', 1) for k, v in sparpy_conf
+                                        if k == 'sparpy.plugin-env']))
 
     reqs_path = ctx.invoke(sparpy_download,
                            config=config,
@@ -211,14 +542,15 @@ def sparpy_submit(ctx,
                            force_download=force_download,
                            pre=pre,
                            proxy=proxy,
+                           lockfile=lockfile,
+                           compile_bytecode=compile_bytecode,
+                           drop_sources=drop_sources,
+                           download_engine=download_engine,
+                           provided_manifest=provided_manifest,
                            plugin_env=plugin_env,
                            convert_to_zip=True,
                            logger=logger)
 
-    reqs_paths = []
-    if reqs_path is not None:
-        reqs_paths.append(reqs_path)
-
     spark_command = SparkSubmitCommand(config=config,
                                        spark_executable=spark_submit_executable,
                                        master=master,
@@ -228,13 +560,24 @@ def sparpy_submit(ctx,
                                        packages=packages,
                                        exclude_packages=exclude_packages,
                                        repositories=repositories,
-                                       reqs_paths=reqs_paths,
                                        env=dict(env or {}),
                                        properties_file=properties_file,
                                        klass=klass,
+                                       bundle=bundle,
+                                       packed_env=packed_env,
+                                       status_file=status_file,
+                                       exec_mode=exec_mode,
+                                       plugin_command=plugin_command,
                                        logger=logger)
 
     try:
+        if reqs_path is not None:
+            if spark_command.exec_mode:
+                spark_command.stage(reqs_path)
+                reqs_path = None
+            else:
+                spark_command.reqs_paths.append(Path(reqs_path))
+
         spark_command.run(job_args=job_args)
     except RuntimeError as ex:
         click.echo(ex)
@@ -245,6 +588,10 @@ def sparpy_submit(ctx,
 
 
 def run_sparpy_submit():
+    if os.environ.get('SPARPY_DAEMON_SOCKET'):
+        from .daemon import run_daemon_client
+
+        run_daemon_client('sparpy-submit')
     sparpy_submit(obj={})
 
 
@@ -269,6 +616,11 @@ def isparpy(ctx,
             force_download,
             pre,
             proxy,
+            lockfile,
+            compile_bytecode,
+            drop_sources,
+            download_engine,
+            provided_manifest,
             plugin_env,
             # Spark interactive options
             pyspark_executable,
@@ -282,14 +634,21 @@ def isparpy(ctx,
             exclude_packages,
             repositories,
             env,
+            bundle,
+            packed_env,
             *,
             logger=None,
             **kwargs):
     """
     Start a pyspark interactive session with dependencies loaded
     """
+    from shutil import rmtree
+
+    from .metrics import configure_metrics
+    from .spark import SparkInteractiveCommand
 
     logger = logger or build_logger(config, debug)
+    configure_metrics(config, command=ctx.find_root().info_name, logger=logger)
 
     reqs_path = ctx.invoke(sparpy_download,
                            debug=debug,
@@ -305,6 +664,11 @@ def isparpy(ctx,
                            force_download=force_download,
                            pre=pre,
                            proxy=proxy,
+                           lockfile=lockfile,
+                           compile_bytecode=compile_bytecode,
+                           drop_sources=drop_sources,
+                           download_engine=download_engine,
+                           provided_manifest=provided_manifest,
                            plugin_env=plugin_env,
                            convert_to_zip=True,
                            logger=logger)
@@ -325,6 +689,8 @@ def isparpy(ctx,
                                             repositories=repositories,
                                             reqs_paths=reqs_paths,
                                             env=dict(env or {}),
+                                            bundle=bundle,
+                                            packed_env=packed_env,
                                             logger=logger)
 
     try:
@@ -339,3 +705,407 @@ def isparpy(ctx,
 
 def run_isparpy():
     isparpy(obj={})
+
+
+@click.command(name='sparpy-janitor')
+@general_options
+@click.option('--grace-period',
+              type=int,
+              default=None,
+              help='Seconds a staged directory without live processes is kept since it was used last time '
+                   '[default: janitor-grace-period on spark section or 3600]')
+@click.option('--dry-run',
+              is_flag=True,
+              default=False,
+              help='Only show which staged directories would be removed')
+@click.pass_context
+def sparpy_janitor(ctx,
+                   config,
+                   debug,
+                   grace_period,
+                   dry_run,
+                   *,
+                   logger=None):
+    """
+    Remove staged packages directories which are no longer used by any job
+    """
+    from .staging import DEFAULT_GRACE_PERIOD, Staging, get_staging_dir
+
+    logger = logger or build_logger(config, debug)
+
+    if grace_period is None:
+        try:
+            grace_period = config['spark'].getint('janitor-grace-period', fallback=DEFAULT_GRACE_PERIOD)
+        except KeyError:
+            grace_period = DEFAULT_GRACE_PERIOD
+
+    staging = Staging(get_staging_dir(config), logger=logger)
+    removed = staging.clean(grace_period=grace_period, dry_run=dry_run)
+
+    for path in removed:
+        click.echo(f'{"Would remove" if dry_run else "Removed"}: {path}')
+    return removed
+
+
+def run_sparpy_janitor():
+    sparpy_janitor(obj={})
+
+
+@click.command(name='sparpy-daemon')
+@general_options
+@click.option('--socket', 'socket_path',
+              type=click.Path(dir_okay=False),
+              envvar='SPARPY_DAEMON_SOCKET',
+              help='Unix socket where daemon listens [default: socket on daemon section or daemon.sock on cache]')
+@click.option('--max-concurrency',
+              type=int,
+              default=None,
+              help='Maximum number of concurrent requests [default: max-concurrency on daemon section or 8]')
+@click.pass_context
+def sparpy_daemon(ctx,
+                  config,
+                  debug,
+                  socket_path,
+                  max_concurrency,
+                  *,
+                  logger=None):
+    """
+    Serve sparpy and sparpy-submit requests sent by clients with SPARPY_DAEMON_SOCKET environment variable
+    """
+    from .daemon import (DEFAULT_MAX_CONCURRENCY, SparpyDaemon,
+                         default_socket_path)
+
+    logger = logger or build_logger(config, debug)
+
+    try:
+        daemon_config = config['daemon']
+    except KeyError:
+        config.add_section('daemon')
+        daemon_config = config['daemon']
+
+    socket_path = socket_path or daemon_config.getpath('socket', fallback=default_socket_path(config))
+    max_concurrency = max_concurrency or daemon_config.getint('max-concurrency', fallback=DEFAULT_MAX_CONCURRENCY)
+
+    daemon = SparpyDaemon(socket_path=socket_path,
+                          config=config,
+                          max_concurrency=max_concurrency,
+                          logger=logger)
+    try:
+        daemon.serve_forever()
+    except RuntimeError as ex:
+        click.echo(ex)
+        raise ctx.exit(-1)
+
+
+def run_sparpy_daemon():
+    sparpy_daemon(obj={})
+
+
+@click.command(name='sparpy-batch')
+@general_options
+@plugins_options
+@common_spark_options
+@click.option('--spark-submit-executable',
+              type=str,
+              help='Spark submit executable')
+@click.option('--max-concurrency', '-j',
+              type=int,
+              default=None,
+              help='Maximum number of concurrent jobs [default: max-concurrency on batch section or 4]')
+@click.option('--log-dir',
+              type=click.Path(file_okay=False, writable=True, resolve_path=True),
+              required=False,
+              help='Directory where output of every job is written. By default it is not redirected.')
+@click.option('--status-file',
+              type=click.Path(dir_okay=False, writable=True),
+              envvar='SPARPY_STATUS_FILE',
+              help='JSON file where aggregated status and exit code of every job are written.')
+@click.argument('manifest',
+                type=click.Path(exists=True, dir_okay=False))
+@click.pass_context
+def sparpy_batch(ctx,
+                 config,
+                 debug,
+                 # Plugin options
+                 plugin,
+                 requirements_file,
+                 constraint,
+                 exclude_python_package,
+                 extra_index_url,
+                 find_links,
+                 no_index,
+                 no_self,
+                 force_download,
+                 pre,
+                 proxy,
+                 lockfile,
+                 compile_bytecode,
+                 drop_sources,
+                 download_engine,
+                 provided_manifest,
+                 plugin_env,
+                 # Common Spark options
+                 master,
+                 deploy_mode,
+                 queue,
+                 conf,
+                 packages,
+                 exclude_packages,
+                 repositories,
+                 env,
+                 properties_file,
+                 klass,
+                 bundle,
+                 packed_env,
+                 # Batch options
+                 spark_submit_executable,
+                 max_concurrency,
+                 log_dir,
+                 status_file,
+                 manifest,
+                 *,
+                 logger=None):
+    """
+    Submit a batch of spark jobs defined on a JSON or YAML manifest, resolving their plugins once
+    """
+    from shutil import rmtree
+
+    from .batch import (DEFAULT_MAX_CONCURRENCY, BatchRunner,
+                        build_batch_status, load_batch_manifest,
+                        write_batch_status)
+    from .metrics import configure_metrics
+    from .spark import SparkSubmitCommand
+
+    logger = logger or build_logger(config, debug)
+    configure_metrics(config, command=ctx.find_root().info_name, logger=logger)
+
+    try:
+        jobs = load_batch_manifest(manifest)
+    except RuntimeError as ex:
+        click.echo(ex)
+        raise ctx.exit(-1)
+
+    if max_concurrency is None:
+        try:
+            max_concurrency = config['batch'].getint('max-concurrency', fallback=DEFAULT_MAX_CONCURRENCY)
+        except KeyError:
+            max_concurrency = DEFAULT_MAX_CONCURRENCY
+
+    plugins = list(plugin)
+    for job in jobs:
+        plugins.extend(p for p in job.plugins if p not in plugins)
+
+    reqs_path = ctx.invoke(sparpy_download,
+                           config=config,
+                           debug=debug,
+                           plugin=plugins,
+                           requirements_file=requirements_file,
+                           constraint=constraint,
+                           exclude_python_package=exclude_python_package,
+                           extra_index_url=extra_index_url,
+                           find_links=find_links,
+                           no_index=no_index,
+                           no_self=no_self,
+                           force_download=force_download,
+                           pre=pre,
+                           proxy=proxy,
+                           lockfile=lockfile,
+                           compile_bytecode=compile_bytecode,
+                           drop_sources=drop_sources,
+                           download_engine=download_engine,
+                           provided_manifest=provided_manifest,
+                           plugin_env=plugin_env,
+                           convert_to_zip=True,
+                           logger=logger)
+
+    results = []
+    try:
+        # Commands are built sequentially, bundles and packed environments are shared by jobs
+        commands = []
+        for job in jobs:
+            spark_command = SparkSubmitCommand(config=config,
+                                               spark_executable=spark_submit_executable,
+                                               master=job.master or master,
+                                               deploy_mode=job.deploy_mode or deploy_mode,
+                                               queue=job.queue or queue,
+                                               conf=[*conf, *job.conf],
+                                               packages=packages,
+                                               exclude_packages=exclude_packages,
+                                               repositories=repositories,
+                                               env={**dict(env or {}), **job.env},
+                                               properties_file=properties_file,
+                                               klass=klass,
+                                               bundle=bundle,
+                                               packed_env=packed_env,
+                                               plugin_command=job.command,
+                                               logger=logger)
+            if reqs_path is not None:
+                spark_command.reqs_paths.append(Path(reqs_path))
+
+            spark_cmd = spark_command.build_command(job_args=job.job_args)
+            logger.debug(f'{job.name}: {" ".join(spark_cmd)}')
+            commands.append((job.name, spark_cmd, spark_command.build_env()))
+
+        logger.info(f'Executing {len(commands)} Spark jobs...')
+
+        def on_result(result):
+            results.append(result)
+            if status_file:
+                write_batch_status(status_file, build_batch_status(results, total=len(commands)))
+
+        results = BatchRunner(max_concurrency=max_concurrency,
+                              log_dir=log_dir,
+                              logger=logger).run(commands, on_result=on_result)
+    except RuntimeError as ex:
+        click.echo(ex)
+        raise ctx.exit(-1)
+    finally:
+        if reqs_path:
+            rmtree(reqs_path)
+
+    status = build_batch_status(results)
+    if status_file:
+        write_batch_status(status_file, status)
+
+    for r in results:
+        click.echo(f'{r.name}: {"OK" if r.succeeded else "FAILED"} ({r.returncode})')
+    click.echo(f'{status["succeeded"]} jobs succeeded, {status["failed"]} jobs failed')
+
+    if status['failed']:
+        raise ctx.exit(-1)
+    return status
+
+
+def run_sparpy_batch():
+    sparpy_batch(obj={})
+
+
+@click.group(name='sparpy-cache')
+@general_options
+@click.pass_context
+def sparpy_cache(ctx, config, debug):
+    """
+    Inspect, bound and check sparpy cache
+    """
+    from .maintenance import CacheMaintenance
+
+    try:
+        ctx.obj['maintenance'] = CacheMaintenance(config, logger=build_logger(config, debug))
+    except RuntimeError as ex:
+        click.echo(ex)
+        raise ctx.exit(-1)
+
+
+@sparpy_cache.command(name='stats')
+@click.option('--top',
+              type=int,
+              default=10,
+              help='Number of largest entries shown')
+@click.option('--json', 'as_json',
+              is_flag=True,
+              default=False,
+              help='Show statistics as JSON')
+@click.pass_context
+def sparpy_cache_stats(ctx, top, as_json):
+    """
+    Show cache size, hit rates and largest entries
+    """
+    from datetime import datetime
+
+    from .maintenance import format_size
+
+    stats = ctx.obj['maintenance'].stats(top=top)
+
+    if as_json:
+        import json
+
+        click.echo(json.dumps(stats, indent=2))
+        return stats
+
+    limits = [f'max size {format_size(stats["max_size"])}' if stats['max_size'] else '',
+              f'max age {stats["max_age"]}s' if stats['max_age'] else '']
+    click.echo(f'Cache directory: {stats["cache_dir"]}')
+    click.echo(f'Total size: {format_size(stats["size"])} on {stats["entries"]} entries'
+               + (f' ({", ".join(limit for limit in limits if limit)})' if any(limits) else ''))
+    for area, area_stats in stats['areas'].items():
+        click.echo(f'  {area:<14}{area_stats["entries"]:>8} entries {format_size(area_stats["size"]):>12}')
+
+    if stats['lookups']:
+        click.echo('Lookups:')
+        for kind, lookup in stats['lookups'].items():
+            hit_rate = f'{lookup["hit_rate"] * 100:.1f}%' if lookup['hit_rate'] is not None else '-'
+            click.echo(f'  {kind:<14}{lookup["hits"]:>8} hits {lookup["misses"]:>8} misses '
+                       f'{hit_rate:>7} hit rate {format_size(lookup["bytes_saved"]):>12} saved')
+
+    if stats['largest']:
+        click.echo('Largest entries:')
+        for entry in stats['largest']:
+            last_used = datetime.fromtimestamp(entry['last_used']).strftime('%Y-%m-%d %H:%M')
+            click.echo(f'  {format_size(entry["size"]):>12}  {last_used}  {entry["area"]:<14}{entry["path"]}')
+    return stats
+
+
+@sparpy_cache.command(name='gc')
+@click.option('--max-size',
+              default=None,
+              help='Maximum cache size, with optional unit (K, M, G or T) [default: max-size on cache section]')
+@click.option('--max-age',
+              type=int,
+              default=None,
+              help='Seconds an unused cache entry is kept [default: max-age on cache section]')
+@click.option('--grace-period',
+              type=int,
+              default=None,
+              help='Seconds since last use an entry is protected from eviction '
+                   '[default: janitor-grace-period on spark section or 3600]')
+@click.option('--dry-run',
+              is_flag=True,
+              default=False,
+              help='Only show which entries would be removed')
+@click.pass_context
+def sparpy_cache_gc(ctx, max_size, max_age, grace_period, dry_run):
+    """
+    Remove orphaned temporary files and evict expired or least recently used entries
+    """
+    from .maintenance import format_size, parse_size
+
+    try:
+        max_size = parse_size(max_size) if max_size else None
+    except RuntimeError as ex:
+        click.echo(ex)
+        raise ctx.exit(-1)
+
+    result = ctx.obj['maintenance'].gc(max_size=max_size, max_age=max_age, grace_period=grace_period, dry_run=dry_run)
+
+    action = 'Would remove' if dry_run else 'Removed'
+    for path in [*result.temp_dirs, *result.temporaries, *result.staged]:
+        click.echo(f'{action}: {path}')
+    for entry in result.removed:
+        click.echo(f'{action}: {entry.path} ({format_size(entry.size)})')
+    click.echo(f'{"Would free" if dry_run else "Freed"} {format_size(result.freed)} '
+               f'evicting {len(result.removed)} entries')
+    return result
+
+
+@sparpy_cache.command(name='verify')
+@click.option('--fix',
+              is_flag=True,
+              default=False,
+              help='Remove corrupted entries')
+@click.pass_context
+def sparpy_cache_verify(ctx, fix):
+    """
+    Check integrity of cache entries
+    """
+    corrupted = ctx.obj['maintenance'].verify(fix=fix)
+
+    for entry, problem in corrupted:
+        click.echo(f'{"Removed" if fix else "Corrupted"}: {entry.path}: {problem}')
+
+    if corrupted and not fix:
+        raise ctx.exit(1)
+    return corrupted
+
+
+def run_sparpy_cache():
+    sparpy_cache(obj={})
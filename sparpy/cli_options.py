@@ -121,6 +121,45 @@ def plugins_options(func=None):
                 envvar='SPARPY_PROXY',
                 help='Proxy to pass through to Python repositories.'
             ),
+            click.option(
+                '--lockfile',
+                type=click.Path(dir_okay=False),
+                default=None,
+                envvar='SPARPY_LOCKFILE',
+                help='Lockfile with pinned packages to download. Dependency resolution is skipped.'
+            ),
+            click.option(
+                '--compile-bytecode',
+                is_flag=True,
+                type=bool,
+                default=None,
+                envvar='SPARPY_COMPILE_BYTECODE',
+                help='Embed compiled bytecode on zipped packages.'
+            ),
+            click.option(
+                '--drop-sources',
+                is_flag=True,
+                type=bool,
+                default=None,
+                envvar='SPARPY_DROP_SOURCES',
+                help='Remove python sources of compiled modules from zipped packages.'
+            ),
+            click.option(
+                '--download-engine',
+                type=click.Choice(['pip', 'native']),
+                default=None,
+                envvar='SPARPY_DOWNLOAD_ENGINE',
+                help='Engine used to download packages. Native engine downloads wheels concurrently '
+                     'and uses pip only for source distributions.'
+            ),
+            click.option(
+                '--provided-manifest',
+                type=click.Path(dir_okay=False),
+                default=None,
+                envvar='SPARPY_PROVIDED_MANIFEST',
+                help='Manifest of packages installed on executors python environment. '
+                     'Requirements satisfied by them are not downloaded.'
+            ),
             click.option(
                 '--plugin-env',
                 type=EnvValue(),
@@ -198,6 +237,23 @@ def common_spark_options(func=None):
                 help="Path to a file from which to load extra properties. If not"
                      "specified, this will look for conf/spark-defaults.conf."
             ),
+            click.option(
+                '--bundle',
+                is_flag=True,
+                type=bool,
+                default=None,
+                envvar='SPARPY_BUNDLE',
+                help='Merge all python packages in a single zip file.'
+            ),
+            click.option(
+                '--packed-env',
+                is_flag=True,
+                type=bool,
+                default=None,
+                envvar='SPARPY_PACKED_ENV',
+                help='Ship python packages unpacked on a relocatable environment archive, '
+                     'so packages with compiled extensions could be used.'
+            ),
             click.option(
                 '--klass', '--class',
                 type=str,
@@ -220,6 +276,20 @@ def spark_submit_options(func=None):
                 type=str,
                 help='Spark submit executable'
             ),
+            click.option(
+                '--status-file',
+                type=click.Path(dir_okay=False, writable=True),
+                envvar='SPARPY_STATUS_FILE',
+                help='JSON file where Spark application id, state and tracking URL are written.'
+            ),
+            click.option(
+                '--exec', 'exec_mode',
+                is_flag=True,
+                type=bool,
+                default=None,
+                envvar='SPARPY_EXEC',
+                help='Replace sparpy process with spark-submit. Packages are staged on cache directory.'
+            ),
             click.argument(
                 'job_args',
                 nargs=-1,
@@ -263,9 +333,24 @@ class Config(click.ParamType):
         if isinstance(value, ConfigParser):
             return value
 
+        from .metrics import span
+
         if value:
             value = Path(value)
-        return load_user_config(value)
+        with span('config.load'):
+            return load_user_config(value)
+
+
+def load_default_config(ctx, param, value):
+    """
+    User configuration is only loaded when no configuration file is given.
+    """
+    if value is None:
+        from .metrics import span
+
+        with span('config.load'):
+            return load_user_config()
+    return value
 
 
 def general_options(func=None):
@@ -275,7 +360,8 @@ def general_options(func=None):
             click.option(
                 '--config',
                 type=Config(),
-                default=load_user_config(),
+                default=None,
+                callback=load_default_config,
                 envvar='SPARPY_CONFIG',
                 help='Path to configuration file'
             ),
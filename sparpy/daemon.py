@@ -0,0 +1,311 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from array import array
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, List
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+STARTED_EVENT = 'started'
+EXIT_EVENT = 'exit'
+
+DAEMON_COMMANDS = ('sparpy', 'sparpy-submit')
+
+# Modules imported once by daemon, so requests do not pay their import time
+WARM_UP_MODULES = ('tempfile', 'concurrent.futures.thread', 'asyncio',
+                   'sparpy.cache', 'sparpy.plugins', 'sparpy.spark', 'sparpy.supervisor',
+                   'sparpy.fetcher', 'sparpy.resolution', 'sparpy.scanner', 'sparpy.staging')
+
+
+def send_fds(sock: socket.socket, fds: List[int]):
+    sock.sendmsg([b'F'], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array('i', fds))])
+
+
+def recv_fds(sock: socket.socket, maxfds: int) -> List[int]:
+    fds = array('i')
+    msg, ancdata, flags, addr = sock.recvmsg(1, socket.CMSG_LEN(maxfds * fds.itemsize))
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    if len(fds) != maxfds:
+        raise RuntimeError('Invalid daemon request: standard streams not received')
+    return list(fds)
+
+
+def default_socket_path(config=None) -> Path:
+    from .cache import get_cache_dir
+
+    return get_cache_dir(config) / 'daemon.sock'
+
+
+class _ForkingUnixServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        fds = recv_fds(self.request, 3)
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+        self.server.sparpy_daemon.serve_request(request, fds, self.wfile)
+
+
+class SparpyDaemon:
+    """
+    Local submit server. It keeps parsed configuration and imported modules
+    and forks a worker for every request, so requests are isolated from each
+    other (environment, configuration and working directory) and never pay
+    interpreter start up. Clients send their standard streams, so spark-submit
+    output goes straight to them, and they receive worker pid and exit code.
+    Resolved environments are shared through resolution cache.
+    """
+
+    def __init__(self,
+                 socket_path: Path,
+                 config=None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 logger: Logger = None):
+        self.socket_path = Path(socket_path)
+        self.config = config
+        self.max_concurrency = max(1, max_concurrency)
+        self.logger = logger or getLogger(__name__)
+        self._server = None
+
+    def warm_up(self):
+        from importlib import import_module
+
+        for module in WARM_UP_MODULES:
+            try:
+                import_module(module)
+            except ImportError as ex:
+                self.logger.debug(f'Module {module} not warmed up: {ex}')
+
+    def _bind(self):
+        if self.socket_path.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.socket_path))
+            except OSError:
+                self.socket_path.unlink()
+            else:
+                raise RuntimeError(f'Sparpy daemon already running on {self.socket_path}')
+            finally:
+                probe.close()
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _ForkingUnixServer(str(self.socket_path), _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+        self._server.max_children = self.max_concurrency
+        self._server.sparpy_daemon = self
+
+    def serve_forever(self):
+        self.warm_up()
+        self._bind()
+
+        def terminate(*_):
+            raise SystemExit(0)
+
+        signal.signal(signal.SIGTERM, terminate)
+
+        self.logger.info(f'Sparpy daemon listening on {self.socket_path}')
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+            try:
+                self.socket_path.unlink()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _send(wfile, event: str, **kwargs):
+        wfile.write(json.dumps({'event': event, **kwargs}).encode('utf-8') + b'\n')
+        wfile.flush()
+
+    def serve_request(self, request: Dict, fds: List[int], wfile):
+        """
+        Runs a request on a forked worker process.
+        """
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+
+        os.environ.clear()
+        os.environ.update(request.get('env', {}))
+        try:
+            os.chdir(request.get('cwd') or '/')
+        except OSError:
+            pass
+
+        self._send(wfile, STARTED_EVENT, pid=os.getpid())
+
+        try:
+            returncode = self.run_command(request.get('command'), list(request.get('argv', [])))
+        finally:
+            # Forked workers finish without running exit handlers
+            from .cache import flush_cache_stats
+            from .metrics import get_metrics
+
+            flush_cache_stats()
+            get_metrics().flush()
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+        self._send(wfile, EXIT_EVENT, returncode=returncode)
+
+    @staticmethod
+    def is_exec_requested(cmd, command: str, argv: List[str]) -> bool:
+        """
+        Checks whether `--exec` is one of sparpy options. Job arguments are
+        not taken into account. Callbacks are not run, so invalid arguments
+        are reported later by command itself.
+        """
+        import click
+
+        try:
+            opts, _, _ = cmd.make_parser(click.Context(cmd, info_name=command)).parse_args(list(argv))
+        except click.ClickException:
+            return False
+        return bool(opts.get('exec_mode'))
+
+    def run_command(self, command: str, argv: List[str]) -> int:
+        import click
+
+        from .cli import sparpy, sparpy_submit
+
+        if command not in DAEMON_COMMANDS:
+            click.echo(f'Command {command} is not supported by sparpy daemon', err=True)
+            return 2
+
+        cmd = sparpy if command == 'sparpy' else sparpy_submit
+        if self.is_exec_requested(cmd, command, argv):
+            click.echo('Exec mode is not supported by sparpy daemon', err=True)
+            return 2
+
+        # Workers must never be replaced by spark-submit, even when exec mode is configured
+        default_map = {'exec_mode': False}
+        if self.config is not None and 'SPARPY_CONFIG' not in os.environ:
+            default_map['config'] = self.config
+        if 'SPARPY_EXEC' in os.environ:
+            del os.environ['SPARPY_EXEC']
+
+        try:
+            result = cmd.main(args=argv,
+                              prog_name=command,
+                              obj={},
+                              default_map=default_map,
+                              standalone_mode=False)
+        except click.ClickException as ex:
+            ex.show()
+            return ex.exit_code
+        except click.Abort:
+            click.echo('Aborted!', err=True)
+            return 1
+        except SystemExit as ex:
+            return ex.code if isinstance(ex.code, int) else 1
+        except Exception:
+            import traceback
+
+            traceback.print_exc()
+            return 1
+
+        return result if isinstance(result, int) else 0
+
+
+def connect_daemon(socket_path: str) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _stream_fileno(stream, mode: int) -> int:
+    try:
+        return stream.fileno()
+    except (AttributeError, ValueError, OSError):
+        return os.open(os.devnull, mode)
+
+
+def submit_to_daemon(sock: socket.socket, command: str, argv: List[str]) -> int:
+    """
+    Sends a request to sparpy daemon and waits for its exit code. Signals
+    received meanwhile are forwarded to the worker process.
+    """
+    try:
+        send_fds(sock, [_stream_fileno(sys.stdin, os.O_RDONLY),
+                        _stream_fileno(sys.stdout, os.O_WRONLY),
+                        _stream_fileno(sys.stderr, os.O_WRONLY)])
+        sock.sendall(json.dumps({'command': command,
+                                 'argv': argv,
+                                 'env': dict(os.environ),
+                                 'cwd': os.getcwd()}).encode('utf-8') + b'\n')
+
+        with sock.makefile('rb') as reader:
+            for line in reader:
+                message = json.loads(line.decode('utf-8'))
+
+                if message['event'] == STARTED_EVENT:
+                    pid = message['pid']
+
+                    def forward(sig, _=None):
+                        try:
+                            os.kill(pid, sig)
+                        except OSError:
+                            pass
+
+                    signal.signal(signal.SIGINT, forward)
+                    signal.signal(signal.SIGTERM, forward)
+
+                elif message['event'] == EXIT_EVENT:
+                    return message['returncode']
+    finally:
+        sock.close()
+
+    print('Sparpy daemon closed connection without exit status', file=sys.stderr)
+    return 1
+
+
+def run_daemon_client(command: str):
+    """
+    Runs command through sparpy daemon when `SPARPY_DAEMON_SOCKET` is set and
+    daemon is listening. Otherwise it returns, so command is run locally.
+    """
+    socket_path = os.environ.get('SPARPY_DAEMON_SOCKET')
+    if not socket_path:
+        return
+
+    try:
+        sock = connect_daemon(socket_path)
+    except OSError as ex:
+        print(f'Sparpy daemon not available, running locally: {ex}', file=sys.stderr)
+        return
+
+    # Once request is sent, command must not be run locally again
+    try:
+        returncode = submit_to_daemon(sock, command, sys.argv[1:])
+    except OSError as ex:
+        print(f'Sparpy daemon connection failed: {ex}', file=sys.stderr)
+        returncode = 1
+
+    sys.exit(returncode)
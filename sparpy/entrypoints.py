@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sys
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .cache import get_cache_dir
+
+try:
+    from importlib.metadata import EntryPoint, distributions
+except ImportError:  # pragma: no cover
+    from importlib_metadata import EntryPoint, distributions
+
+
+def path_fingerprint(paths: Iterable[str]) -> str:
+    """
+    Hash of path entries with their modification times and sizes. Directory
+    modification time changes whenever a distribution is added or removed.
+    """
+    h = hashlib.sha256()
+    for p in paths:
+        try:
+            st = os.stat(p or '.')
+            h.update(f'{p}\0{st.st_mtime_ns}\0{st.st_size}\n'.encode('utf-8', errors='surrogateescape'))
+        except OSError:
+            h.update(f'{p}\0-\n'.encode('utf-8', errors='surrogateescape'))
+    return h.hexdigest()
+
+
+def container_local_paths(paths: Iterable[str]) -> List[str]:
+    """
+    Path entries inside a YARN container working directory. They are created
+    again for every container, so their fingerprint never repeats.
+    """
+    if not os.environ.get('CONTAINER_ID'):
+        return []
+
+    work_dir = os.path.realpath(os.getcwd())
+    result = []
+    for p in paths:
+        real_path = os.path.realpath(p or '.')
+        if not os.path.isabs(p) or real_path == work_dir or real_path.startswith(work_dir + os.sep):
+            result.append(p)
+    return result
+
+
+class EntryPointIndex:
+    """
+    Index of entry points of a group, built using `importlib.metadata`. It is
+    persisted on cache directory keyed by `sys.path` fingerprint, so it is
+    rebuilt automatically when any path entry changes. Indexes of paths local
+    to a YARN container are not persisted, as they would never be reused.
+    """
+
+    def __init__(self,
+                 group: str,
+                 paths: List[str] = None,
+                 cache_dir: Path = None,
+                 config=None,
+                 logger: Logger = None):
+        self.group = group
+        self.paths = list(paths if paths is not None else sys.path)
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir(config) / 'entry-points'
+        self.logger = logger or getLogger(__name__)
+
+        self._index: Optional[Dict[str, Dict[str, str]]] = None
+        self.from_cache = False
+
+    @property
+    def cache_file(self) -> Path:
+        key = hashlib.sha256(f'{self.group}\0{path_fingerprint(self.paths)}'.encode('utf-8')).hexdigest()
+        return self.cache_dir / f'{key}.json'
+
+    def build(self) -> Dict[str, Dict[str, str]]:
+        index = {}
+        for dist in distributions(path=self.paths):
+            for ep in dist.entry_points:
+                if ep.group != self.group or ep.name in index:
+                    continue
+                index[ep.name] = {'value': ep.value,
+                                  'dist': dist.metadata['Name'],
+                                  'version': dist.version}
+        return index
+
+    def _load_cached(self, cache_file: Path) -> Optional[Dict[str, Dict[str, str]]]:
+        try:
+            with cache_file.open('r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, cache_file: Path, index: Dict[str, Dict[str, str]]):
+        tmp_file = cache_file.with_name(f'.{cache_file.name}.{os.getpid()}.tmp')
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_file.open('w') as f:
+                json.dump(index, f)
+            os.replace(str(tmp_file), str(cache_file))
+        except OSError as ex:
+            self.logger.debug(f'Unable to store entry points index: {ex}')
+
+    @property
+    def index(self) -> Dict[str, Dict[str, str]]:
+        if self._index is None:
+            cache_file = self.cache_file
+            index = self._load_cached(cache_file)
+            if index is None:
+                index = self.build()
+                local_paths = container_local_paths(self.paths)
+                if local_paths:
+                    self.logger.debug(f'Entry points index is not stored, container local paths: {local_paths}')
+                else:
+                    self._store(cache_file, index)
+            else:
+                self.from_cache = True
+            self._index = index
+
+        return self._index
+
+    def load(self) -> bool:
+        """
+        Loads index, returns whether it was already built.
+        """
+        return self.index is not None and self.from_cache
+
+    def names(self) -> List[str]:
+        return list(self.index)
+
+    def get(self, name: str) -> Optional[EntryPoint]:
+        try:
+            return EntryPoint(name=name, value=self.index[name]['value'], group=self.group)
+        except KeyError:
+            return None
+
+    def iter_entry_points(self) -> Iterable[EntryPoint]:
+        for name in self.index:
+            yield self.get(name)
@@ -0,0 +1,654 @@
+import base64
+import hashlib
+import json
+import os
+import ssl
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from html.parser import HTMLParser
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from logging import Logger, getLogger
+from pathlib import Path
+from queue import Empty, Full, LifoQueue
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import unquote, urldefrag, urljoin, urlparse
+from urllib.request import url2pathname
+from zipfile import BadZipFile, ZipFile
+
+from .cache import file_digest, record_cache_lookup, touch
+from .locking import DEFAULT_LOCK_TIMEOUT, FileLock, publish_file
+
+DEFAULT_INDEX_URL = 'https://pypi.org/simple/'
+SIMPLE_ACCEPT = ('application/vnd.pypi.simple.v1+json, '
+                 'application/vnd.pypi.simple.v1+html;q=0.2, '
+                 'text/html;q=0.1')
+CHUNK_SIZE = 256 * 1024
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class NativeDownloadError(RuntimeError):
+    pass
+
+
+class Link(NamedTuple):
+    filename: str
+    url: str
+    sha256: Optional[str] = None
+    requires_python: Optional[str] = None
+    yanked: bool = False
+
+
+class Candidate(NamedTuple):
+    name: str
+    version: Any
+    link: Link
+    is_wheel: bool
+    priority: int
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of keep-alive HTTP connections, grouped by host.
+    """
+
+    def __init__(self,
+                 proxy: str = None,
+                 trusted_hosts: Iterable[str] = None,
+                 timeout: float = 60,
+                 maxsize: int = 10):
+        if proxy and '://' not in proxy:
+            proxy = f'http://{proxy}'
+        self.proxy = urlparse(proxy) if proxy else None
+        self.trusted_hosts = set(trusted_hosts or [])
+        self.timeout = timeout
+        self.maxsize = maxsize
+
+        self._pools: Dict[Tuple[str, str, int], LifoQueue] = {}
+        self._lock = threading.Lock()
+
+    def _get_queue(self, key) -> LifoQueue:
+        with self._lock:
+            try:
+                return self._pools[key]
+            except KeyError:
+                queue = self._pools[key] = LifoQueue(self.maxsize)
+                return queue
+
+    def _proxy_headers(self) -> Dict[str, str]:
+        if self.proxy and self.proxy.username:
+            credentials = f'{unquote(self.proxy.username)}:{unquote(self.proxy.password or "")}'
+            return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials.encode()).decode()}
+        return {}
+
+    def _new_connection(self, scheme: str, host: str, port: int):
+        context = None
+        if scheme == 'https':
+            if host in self.trusted_hosts:
+                context = ssl._create_unverified_context()
+            else:
+                context = ssl.create_default_context()
+
+        if self.proxy:
+            proxy_port = self.proxy.port or 80
+            if scheme == 'https':
+                conn = HTTPSConnection(self.proxy.hostname, proxy_port, timeout=self.timeout, context=context)
+                conn.set_tunnel(host, port, headers=self._proxy_headers())
+                return conn
+            return HTTPConnection(self.proxy.hostname, proxy_port, timeout=self.timeout)
+
+        if scheme == 'https':
+            return HTTPSConnection(host, port, timeout=self.timeout, context=context)
+        return HTTPConnection(host, port, timeout=self.timeout)
+
+    def _release(self, key, conn, response):
+        if response.will_close or not response.isclosed():
+            conn.close()
+            return
+
+        try:
+            self._get_queue(key).put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def _request(self, url: str, headers: Dict[str, str] = None, redirects: int = 5):
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            raise NativeDownloadError(f'Unsupported URL scheme: {url}')
+
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        key = (parsed.scheme, parsed.hostname, port)
+
+        request_headers = {'User-Agent': 'sparpy', 'Accept-Encoding': 'identity'}
+        request_headers.update(headers or {})
+        if parsed.username:
+            credentials = f'{unquote(parsed.username)}:{unquote(parsed.password or "")}'
+            request_headers['Authorization'] = 'Basic ' + base64.b64encode(credentials.encode()).decode()
+
+        if self.proxy and parsed.scheme == 'http':
+            path = parsed._replace(netloc=f'{parsed.hostname}:{port}', fragment='').geturl()
+            request_headers.update(self._proxy_headers())
+        else:
+            path = parsed.path or '/'
+            if parsed.query:
+                path = f'{path}?{parsed.query}'
+
+        queue = self._get_queue(key)
+        while True:
+            try:
+                conn, reused = queue.get_nowait(), True
+            except Empty:
+                conn, reused = self._new_connection(*key), False
+
+            try:
+                conn.request('GET', path, headers=request_headers)
+                response = conn.getresponse()
+            except (OSError, HTTPException) as ex:
+                conn.close()
+                if reused:
+                    # Stale keep-alive connection, try another one
+                    continue
+                raise NativeDownloadError(f'Unable to request {url}: {ex}')
+            break
+
+        if response.status in REDIRECT_STATUSES and redirects > 0:
+            location = urljoin(url, response.getheader('Location', ''))
+            response.read()
+            self._release(key, conn, response)
+            return self._request(location, headers=headers, redirects=redirects - 1)
+
+        return key, conn, response, url
+
+    def get(self, url: str, headers: Dict[str, str] = None) -> Tuple[int, str, bytes, str]:
+        key, conn, response, final_url = self._request(url, headers=headers)
+        try:
+            body = response.read()
+        except (OSError, HTTPException) as ex:
+            raise NativeDownloadError(f'Unable to read {url}: {ex}')
+        finally:
+            self._release(key, conn, response)
+
+        return response.status, response.getheader('Content-Type', ''), body, final_url
+
+    def download(self, url: str, dst: Path, sha256: str = None):
+        key, conn, response, _ = self._request(url)
+        tmp_dst = dst.with_name(f'.{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            if response.status != 200:
+                response.read()
+                raise NativeDownloadError(f'Unable to download {url}: HTTP {response.status}')
+
+            h = hashlib.sha256()
+            try:
+                with tmp_dst.open('wb') as f:
+                    for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                        h.update(chunk)
+                        f.write(chunk)
+            except (OSError, HTTPException) as ex:
+                raise NativeDownloadError(f'Unable to download {url}: {ex}')
+
+            if sha256 and h.hexdigest() != sha256:
+                raise NativeDownloadError(f'Hash mismatch for {dst.name}: expected {sha256}, got {h.hexdigest()}')
+
+            os.replace(str(tmp_dst), str(dst))
+        finally:
+            self._release(key, conn, response)
+            if tmp_dst.exists():
+                tmp_dst.unlink()
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+
+        for queue in pools:
+            while True:
+                try:
+                    queue.get_nowait().close()
+                except Empty:
+                    break
+
+
+class _LinkParser(HTMLParser):
+
+    def __init__(self, base_url: str):
+        super(_LinkParser, self).__init__()
+        self.base_url = base_url
+        self.links: List[Link] = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'base' and attrs.get('href'):
+            self.base_url = urljoin(self.base_url, attrs['href'])
+            return
+
+        if tag != 'a' or not attrs.get('href'):
+            return
+
+        url, fragment = urldefrag(urljoin(self.base_url, attrs['href']))
+        self.links.append(Link(filename=unquote(urlparse(url).path.rsplit('/', 1)[-1]),
+                               url=url,
+                               sha256=fragment[len('sha256='):] if fragment.startswith('sha256=') else None,
+                               requires_python=attrs.get('data-requires-python') or None,
+                               yanked='data-yanked' in attrs))
+
+
+def parse_simple_page(content_type: str, body: bytes, base_url: str) -> List[Link]:
+    if 'json' in content_type:
+        try:
+            data = json.loads(body.decode('utf-8'))
+            return [Link(filename=f['filename'],
+                         url=urljoin(base_url, f['url']),
+                         sha256=f.get('hashes', {}).get('sha256'),
+                         requires_python=f.get('requires-python') or None,
+                         yanked=bool(f.get('yanked', False)))
+                    for f in data.get('files', [])]
+        except (ValueError, KeyError, TypeError, AttributeError) as ex:
+            raise NativeDownloadError(f'Invalid simple index page {base_url}: {ex!r}')
+
+    parser = _LinkParser(base_url)
+    parser.feed(body.decode('utf-8', errors='replace'))
+    return parser.links
+
+
+def parse_requirements_file(path: Path, requirements: List[str] = None, constraints: List[str] = None):
+    """
+    Parses a requirements file. Only requirement lines and nested `-r`/`-c`
+    files are supported, any other option raises an error.
+    """
+    requirements = requirements if requirements is not None else []
+    constraints = constraints if constraints is not None else []
+
+    content = Path(path).read_text().replace('\\\n', ' ')
+    for line in content.splitlines():
+        line = line.split(' #', 1)[0].strip()
+        if not line or line.startswith('#'):
+            continue
+
+        if line.startswith('-'):
+            option, _, value = line.replace('=', ' ', 1).partition(' ')
+            value = value.strip()
+            if option in ('-r', '--requirement'):
+                parse_requirements_file(Path(path).parent / value, requirements, constraints)
+            elif option in ('-c', '--constraint'):
+                parse_requirements_file(Path(path).parent / value, constraints, constraints)
+            else:
+                raise NativeDownloadError(f'Unsupported requirements option: {line}')
+            continue
+
+        if ' --' in line:
+            raise NativeDownloadError(f'Unsupported requirement options: {line}')
+
+        requirements.append(line)
+
+    return requirements, constraints
+
+
+def read_wheel_requirements(path: Path) -> List[str]:
+    try:
+        with ZipFile(str(path)) as zf:
+            for name in zf.namelist():
+                parts = name.split('/')
+                if len(parts) == 2 and parts[0].endswith('.dist-info') and parts[1] == 'METADATA':
+                    metadata = BytesParser().parsebytes(zf.read(name), headersonly=True)
+                    return metadata.get_all('Requires-Dist') or []
+    except (BadZipFile, OSError) as ex:
+        raise NativeDownloadError(f'Invalid wheel {path.name}: {ex}')
+
+    raise NativeDownloadError(f'Metadata not found on {path.name}')
+
+
+class PackageFinder:
+    """
+    Looks for distributions on PEP 503/691 simple indexes and find-links
+    locations.
+    """
+
+    def __init__(self,
+                 pool: ConnectionPool,
+                 index_urls: Iterable[str] = None,
+                 find_links: Iterable[str] = None,
+                 logger: Logger = None):
+        from packaging.tags import sys_tags
+
+        self.pool = pool
+        self.index_urls = [u if u.endswith('/') else f'{u}/' for u in index_urls or []]
+        self.find_links = [str(f) for f in find_links or []]
+        self.logger = logger or getLogger(__name__)
+
+        self._tag_priority = {t: i for i, t in enumerate(sys_tags())}
+        self._find_links_cache: Optional[List[Link]] = None
+        self._lock = threading.Lock()
+
+    def _iter_find_links(self) -> List[Link]:
+        with self._lock:
+            if self._find_links_cache is not None:
+                return self._find_links_cache
+
+            links = []
+            for location in self.find_links:
+                if location.startswith('file:'):
+                    location = url2pathname(urlparse(location).path)
+
+                if '://' in location:
+                    status, content_type, body, final_url = self.pool.get(location)
+                    if status == 200:
+                        links.extend(parse_simple_page(content_type, body, final_url))
+                    continue
+
+                path = Path(location)
+                if path.is_dir():
+                    links.extend(Link(filename=p.name, url=p.resolve().as_uri())
+                                 for p in path.iterdir() if p.is_file())
+                elif path.is_file():
+                    links.extend(parse_simple_page('text/html', path.read_bytes(), path.resolve().as_uri()))
+
+            self._find_links_cache = links
+            return links
+
+    def find_links_for(self, name: str) -> List[Link]:
+        links = list(self._iter_find_links())
+
+        for index_url in self.index_urls:
+            url = urljoin(index_url, f'{name}/')
+            if url.startswith('file:'):
+                path = Path(url2pathname(urlparse(url).path))
+                if path.is_dir():
+                    path = path / 'index.html'
+                if path.is_file():
+                    links.extend(parse_simple_page('text/html', path.read_bytes(), path.as_uri()))
+                continue
+
+            status, content_type, body, final_url = self.pool.get(url, headers={'Accept': SIMPLE_ACCEPT})
+            if status == 404:
+                continue
+            if status != 200:
+                raise NativeDownloadError(f'Unable to get {url}: HTTP {status}')
+            links.extend(parse_simple_page(content_type, body, final_url))
+
+        return links
+
+    def candidates(self, name: str) -> List[Candidate]:
+        from packaging.utils import (InvalidSdistFilename,
+                                     InvalidWheelFilename, canonicalize_name,
+                                     parse_sdist_filename,
+                                     parse_wheel_filename)
+
+        name = canonicalize_name(name)
+        result = []
+        for link in self.find_links_for(name):
+            try:
+                if link.filename.endswith('.whl'):
+                    dist_name, version, _, tags = parse_wheel_filename(link.filename)
+                    priorities = [self._tag_priority[t] for t in tags if t in self._tag_priority]
+                    if not priorities:
+                        continue
+                    is_wheel, priority = True, min(priorities)
+                else:
+                    dist_name, version = parse_sdist_filename(link.filename)
+                    is_wheel, priority = False, len(self._tag_priority)
+            except (InvalidSdistFilename, InvalidWheelFilename):
+                continue
+
+            if canonicalize_name(dist_name) != name:
+                continue
+
+            result.append(Candidate(name=name, version=version, link=link, is_wheel=is_wheel, priority=priority))
+
+        return sorted(result, key=lambda c: (c.version, -c.priority), reverse=True)
+
+
+class NativeDownloader:
+    """
+    Resolves and downloads wheels without starting pip. Resolution is greedy
+    (highest compatible version, no backtracking) and it is done in waves:
+    all packages found on a dependency level are looked up and downloaded
+    concurrently. Requirements which only have source distributions are
+    returned, in order to download them using pip. Their dependencies are not
+    resolved, so they must be resolved by pip too, pinning packages already
+    selected (`pinned`).
+    """
+
+    def __init__(self,
+                 index_urls: Iterable[str] = None,
+                 find_links: Iterable[str] = None,
+                 pre: bool = False,
+                 proxy: str = None,
+                 trusted_hosts: Iterable[str] = None,
+                 workers: int = 8,
+                 artifacts_dir: Path = None,
+                 locks_dir: Path = None,
+                 lock_timeout: int = DEFAULT_LOCK_TIMEOUT,
+                 logger: Logger = None):
+        self.logger = logger or getLogger(__name__)
+        self.pre = pre
+        self.workers = max(1, workers)
+        self.artifacts_dir = Path(artifacts_dir) if artifacts_dir else None
+        self.locks_dir = Path(locks_dir) if locks_dir else (self.artifacts_dir / '.locks' if artifacts_dir else None)
+        self.lock_timeout = lock_timeout
+        self.pool = ConnectionPool(proxy=proxy, trusted_hosts=trusted_hosts, maxsize=self.workers)
+        self.finder = PackageFinder(self.pool, index_urls=index_urls, find_links=find_links, logger=self.logger)
+
+        self._python_version = '.'.join(str(v) for v in sys.version_info[:3])
+        self.excluded: List[str] = []
+        self.provided: List[str] = []
+        self.pinned: List[str] = []
+
+    def close(self):
+        self.pool.close()
+
+    def _is_compatible(self, candidate: Candidate, spec) -> bool:
+        from packaging.specifiers import InvalidSpecifier, SpecifierSet
+
+        if candidate.link.yanked and not any(s.operator in ('==', '===') for s in spec):
+            return False
+
+        if not spec.contains(candidate.version, prereleases=True if self.pre else None):
+            return False
+
+        if candidate.link.requires_python:
+            try:
+                if not SpecifierSet(candidate.link.requires_python).contains(self._python_version,
+                                                                             prereleases=True):
+                    return False
+            except InvalidSpecifier:
+                pass
+
+        return True
+
+    def select(self, candidates: List[Candidate], spec, wheel: bool = True) -> Optional[Candidate]:
+        for candidate in candidates:
+            if candidate.is_wheel == wheel and self._is_compatible(candidate, spec):
+                return candidate
+        return None
+
+    def fetch(self, link: Link, dest: Path, sha256: str = None) -> Path:
+        """
+        Downloads a file. Remote files with known hash are stored on artifacts
+        directory: only one process downloads each of them, while the rest
+        wait for it, and they are linked on `dest`.
+        """
+        sha256 = sha256 or link.sha256
+        dst = Path(dest) / link.filename
+        if dst.is_file():
+            if not sha256 or file_digest(dst) == sha256:
+                return dst
+
+        if self.artifacts_dir is None or not sha256 or link.url.startswith('file:'):
+            return self._fetch(link, dst, sha256)
+
+        artifact = self.artifacts_dir / sha256 / link.filename
+        hit = True
+        if not artifact.is_file():
+            with FileLock(self.locks_dir / f'artifact-{sha256}.lock', timeout=self.lock_timeout, logger=self.logger):
+                if not artifact.is_file():
+                    artifact.parent.mkdir(parents=True, exist_ok=True)
+                    self._fetch(link, artifact, sha256)
+                    hit = False
+                else:
+                    self.logger.debug(f'Artifact {link.filename} downloaded by another process')
+
+        publish_file(artifact, dst)
+        touch(artifact.parent)
+        record_cache_lookup(self.artifacts_dir.parent, 'artifacts', hit, size=artifact.stat().st_size if hit else 0)
+        return dst
+
+    def _fetch(self, link: Link, dst: Path, sha256: str = None) -> Path:
+        if link.url.startswith('file:'):
+            src = Path(url2pathname(urlparse(link.url).path))
+            tmp_dst = dst.with_name(f'.{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            try:
+                if sha256 and file_digest(src) != sha256:
+                    raise NativeDownloadError(f'Hash mismatch for {link.filename}')
+                with src.open('rb') as fsrc, tmp_dst.open('wb') as fdst:
+                    for chunk in iter(lambda: fsrc.read(CHUNK_SIZE), b''):
+                        fdst.write(chunk)
+                os.replace(str(tmp_dst), str(dst))
+            except OSError as ex:
+                raise NativeDownloadError(f'Unable to copy {link.url}: {ex}')
+            finally:
+                if tmp_dst.exists():
+                    tmp_dst.unlink()
+            return dst
+
+        self.logger.debug(f'Downloading {link.url}')
+        self.pool.download(link.url, dst, sha256=sha256)
+        return dst
+
+    def download(self,
+                 requirements: Iterable[str],
+                 dest: Path,
+                 constraints: Iterable[str] = None,
+                 exclude: Iterable[str] = None,
+                 provided=None) -> List[str]:
+        """
+        Resolves and downloads requirements on `dest` directory. Returns the
+        requirements which could only be satisfied by source distributions.
+        Excluded packages and requirements satisfied by `provided` manifest
+        are not traversed, so dependencies only required by them are never
+        looked up.
+        """
+        from packaging.requirements import InvalidRequirement, Requirement
+        from packaging.specifiers import SpecifierSet
+        from packaging.utils import canonicalize_name
+
+        def parse(req):
+            try:
+                return Requirement(req)
+            except InvalidRequirement as ex:
+                raise NativeDownloadError(f'Unsupported requirement {req}: {ex}')
+
+        constraint_specs: Dict[str, Any] = {}
+        for c in constraints or []:
+            r = parse(c)
+            if r.marker is None or r.marker.evaluate({'extra': ''}):
+                name = canonicalize_name(r.name)
+                constraint_specs[name] = constraint_specs.get(name, SpecifierSet()) & r.specifier
+
+        specs: Dict[str, Any] = {}
+        display_names: Dict[str, str] = {}
+        chosen: Dict[str, Candidate] = {}
+        dependencies: Dict[str, List[str]] = {}
+        requested_extras: Dict[str, Set[str]] = {}
+        processed_extras: Dict[str, Set[str]] = {}
+        sdist_names: List[str] = []
+        excluded = {canonicalize_name(e) for e in exclude or []}
+        provided_names: Dict[str, str] = {}
+        self.excluded = []
+        self.provided = []
+        self.pinned = []
+
+        Path(dest).mkdir(parents=True, exist_ok=True)
+
+        pending = [r for r in (parse(req) for req in requirements)
+                   if r.marker is None or r.marker.evaluate({'extra': ''})]
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending:
+                new_names = []
+                for req in pending:
+                    if req.url:
+                        raise NativeDownloadError(f'Unsupported direct reference: {req}')
+
+                    name = canonicalize_name(req.name)
+                    if name in excluded:
+                        if req.name not in self.excluded:
+                            self.excluded.append(req.name)
+                        continue
+
+                    if provided is not None and name not in chosen and \
+                            provided.satisfies(name, req.specifier, extras=req.extras):
+                        provided_names.setdefault(name, req.name)
+                        continue
+
+                    display_names.setdefault(name, req.name)
+                    specs[name] = specs.get(name, SpecifierSet()) & req.specifier
+                    requested_extras.setdefault(name, set()).update(req.extras)
+
+                    if name in chosen:
+                        if not specs[name].contains(chosen[name].version, prereleases=True):
+                            raise NativeDownloadError(f'Conflicting requirements for {name}: {specs[name]} '
+                                                      f'does not allow already selected {chosen[name].version}')
+                    elif name not in new_names and name not in sdist_names:
+                        new_names.append(name)
+
+                to_download = []
+                for name, candidates in zip(new_names, executor.map(self.finder.candidates, new_names)):
+                    spec = specs[name] & constraint_specs.get(name, SpecifierSet())
+
+                    candidate = self.select(candidates, spec, wheel=True)
+                    if candidate is None:
+                        if self.select(candidates, spec, wheel=False) is None:
+                            raise NativeDownloadError(f'No matching distribution found for {name}{spec}')
+                        self.logger.debug(f'Only source distributions found for {name}{spec}')
+                        sdist_names.append(name)
+                        continue
+
+                    chosen[name] = candidate
+                    to_download.append(candidate)
+
+                paths = list(executor.map(lambda c: self.fetch(c.link, dest), to_download))
+                for candidate, path in zip(to_download, paths):
+                    dependencies[candidate.name] = read_wheel_requirements(path)
+
+                pending = []
+                for name in chosen:
+                    for extra in {''} | requested_extras.get(name, set()):
+                        if extra in processed_extras.setdefault(name, set()):
+                            continue
+                        processed_extras[name].add(extra)
+
+                        for dep in (parse(d) for d in dependencies[name]):
+                            if dep.marker is None:
+                                if extra == '':
+                                    pending.append(dep)
+                            elif dep.marker.evaluate({'extra': extra}) and \
+                                    (extra == '' or not dep.marker.evaluate({'extra': ''})):
+                                pending.append(dep)
+
+        self.provided = [v for k, v in provided_names.items() if k not in chosen and k not in sdist_names]
+        self.pinned = [f'{display_names[n]}=={c.version}' for n, c in chosen.items()]
+
+        return [f'{display_names[n]}{specs[n] & constraint_specs.get(n, SpecifierSet())}' for n in sdist_names]
+
+    def download_artifacts(self, artifacts: Iterable[Any], dest: Path) -> List[Path]:
+        """
+        Downloads locked artifacts, looking them up by file name and verifying
+        their hashes.
+        """
+        artifacts = list(artifacts)
+        names = sorted({a.name for a in artifacts})
+        Path(dest).mkdir(parents=True, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            links = {}
+            for candidates in executor.map(self.finder.candidates, names):
+                links.update({c.link.filename: c.link for c in candidates})
+
+            missing = [a.filename for a in artifacts if a.filename not in links]
+            if missing:
+                raise NativeDownloadError(f'Locked packages not found: {", ".join(missing)}')
+
+            return list(executor.map(lambda a: self.fetch(links[a.filename], dest, sha256=a.sha256),
+                                     artifacts))
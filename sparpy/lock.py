@@ -0,0 +1,76 @@
+import hashlib
+import json
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+from .cache import file_digest, iter_package_files
+from .packages import parse_package_filename
+
+
+class LockedArtifact(NamedTuple):
+    name: str
+    version: str
+    filename: str
+    size: int
+    sha256: str
+
+    @classmethod
+    def from_file(cls, path: Path) -> 'LockedArtifact':
+        name, version = parse_package_filename(path.name)
+        return cls(name=name,
+                   version=version,
+                   filename=path.name,
+                   size=path.stat().st_size,
+                   sha256=file_digest(path))
+
+    def as_requirement(self) -> str:
+        return f'{self.name}=={self.version} --hash=sha256:{self.sha256}'
+
+    def verify(self, path: Path) -> bool:
+        return path.is_file() and path.stat().st_size == self.size and file_digest(path) == self.sha256
+
+
+class Lockfile:
+    """
+    Fully pinned set of artifacts, with their sizes and hashes.
+    """
+
+    VERSION = 1
+
+    def __init__(self, artifacts: Iterable[LockedArtifact], inputs: Dict[str, Any] = None):
+        self.artifacts: List[LockedArtifact] = sorted(artifacts, key=lambda a: a.filename)
+        self.inputs = inputs or {}
+
+    @classmethod
+    def from_directory(cls, path: PathLike, inputs: Dict[str, Any] = None) -> 'Lockfile':
+        return cls([LockedArtifact.from_file(p) for p in iter_package_files(Path(path))],
+                   inputs=inputs)
+
+    @classmethod
+    def load(cls, filename: PathLike) -> 'Lockfile':
+        try:
+            with Path(filename).open('r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as ex:
+            raise RuntimeError(f'Invalid lockfile {filename}: {ex}')
+
+        if data.get('version') != cls.VERSION:
+            raise RuntimeError(f'Unsupported lockfile version: {data.get("version")}')
+
+        return cls([LockedArtifact(**a) for a in data.get('artifacts', [])],
+                   inputs=data.get('inputs'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'version': self.VERSION,
+                'inputs': self.inputs,
+                'artifacts': [a._asdict() for a in self.artifacts]}
+
+    def save(self, filename: PathLike):
+        with Path(filename).open('w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    def digest(self) -> str:
+        data = json.dumps([a._asdict() for a in self.artifacts], sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
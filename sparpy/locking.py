@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import time
+from logging import Logger, getLogger
+from pathlib import Path
+from shutil import copy2
+
+DEFAULT_LOCK_TIMEOUT = 600
+
+# Linux ioctl cloning file extents (copy on write) on btrfs, xfs and similar
+FICLONE = 0x40049409
+
+
+class FileLock:
+    """
+    Exclusive lock shared by processes, based on `flock`. Lock files are
+    never removed, so every process locks same inode. When lock is not
+    acquired before `timeout` seconds, it gives up and `acquired` is False:
+    callers must be safe without lock, locks only avoid duplicated work.
+    With zero `timeout` lock is only tried once.
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, path: Path, timeout: float = DEFAULT_LOCK_TIMEOUT, logger: Logger = None):
+        self.path = Path(path)
+        self.timeout = timeout
+        self.logger = logger or getLogger(__name__)
+        self.acquired = False
+        self.waited = False
+        self._fd = None
+
+    def acquire(self) -> bool:
+        import fcntl
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        while True:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.acquired = True
+                return True
+            except BlockingIOError:
+                pass
+
+            if not self.waited:
+                self.waited = True
+                self.logger.debug(f'Lock {self.path} is held by another process, waiting for it')
+
+            if deadline is not None and time.monotonic() >= deadline:
+                if self.timeout:
+                    self.logger.warning(f'Lock {self.path} not acquired after {self.timeout} seconds, '
+                                        f'going on without it')
+                os.close(self._fd)
+                self._fd = None
+                return False
+
+            time.sleep(self.POLL_INTERVAL)
+
+    def release(self):
+        if self._fd is None:
+            return
+
+        import fcntl
+
+        try:
+            if self.acquired:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self.acquired = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+def _reflink(src: Path, dst: Path):
+    import fcntl
+
+    with Path(src).open('rb') as fsrc, Path(dst).open('wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            Path(dst).unlink()
+            raise
+
+
+def link_or_copy(src: Path, dst: Path):
+    """
+    Creates `dst` sharing `src` contents: hard link, reflink (copy on write
+    clone) or, when both fail (different file systems), a copy. Files shared
+    this way must never be modified in place, only replaced.
+    """
+    try:
+        os.link(str(src), str(dst))
+        return
+    except OSError:
+        pass
+
+    if sys.platform.startswith('linux'):
+        try:
+            _reflink(src, dst)
+            return
+        except OSError:
+            pass
+
+    copy2(str(src), str(dst))
+
+
+def publish_file(src: Path, dst: Path):
+    """
+    Atomically places `src` contents on `dst`, replacing it when it exists.
+    """
+    dst = Path(dst)
+    tmp_dst = dst.with_name(f'.{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        if tmp_dst.exists():
+            tmp_dst.unlink()
+        link_or_copy(src, tmp_dst)
+        os.replace(str(tmp_dst), str(dst))
+    finally:
+        if tmp_dst.exists():
+            tmp_dst.unlink()
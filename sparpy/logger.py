@@ -12,7 +12,8 @@ def build_logger(config, debug=False):
         config = config['logger']
 
     logger = getLogger('sparpy')
-    logger.addHandler(StreamHandler(stream=sys.stdout))
+    if not logger.handlers:
+        logger.addHandler(StreamHandler(stream=sys.stdout))
     if debug:
         logger.setLevel(DEBUG)
     else:
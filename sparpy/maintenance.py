@@ -0,0 +1,474 @@
+import json
+import os
+import re
+import time
+from logging import Logger, getLogger
+from pathlib import Path
+from shutil import rmtree
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .cache import file_digest, get_cache_dir, load_cache_stats
+from .config import ConfigParser
+from .locking import FileLock
+from .staging import (DEFAULT_GRACE_PERIOD, Staging, get_staging_dir,
+                      is_process_alive)
+
+DEFAULT_GC_INTERVAL = 3600
+DEFAULT_DOWNLOAD_DIR_PREFIX = 'sparpy_'
+
+# Temporary directories without owner process id were created by older versions
+LEGACY_TEMP_DIR_MAX_AGE = 7 * 24 * 3600
+
+# Unfinished files and directories: `.<name>.<pid>[.<thread>].tmp` or `.<name>.<pid>.old`
+TEMPORARY_REGEX = re.compile(r'^\..+\.(?P<pid>\d+)(?:\.\d+)?\.(?:tmp|old)$')
+TEMP_DIR_PID_REGEX = re.compile(r'^(?P<pid>\d+)-')
+
+SIZE_REGEX = re.compile(r'^\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[KMGT]?)(?:i?B)?\s*$', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+# Entries of these areas are locked while they are written
+LOCKED_AREAS = {'resolutions': 'resolution', 'artifacts': 'artifact', 'wheels': 'wheel'}
+# Entries of these areas are listed, but they are never evicted
+UNEVICTABLE_AREAS = ('staging',)
+
+
+def parse_size(value) -> int:
+    """
+    Parses a size in bytes, with optional binary unit suffix: `500M`, `10G`...
+    """
+    if isinstance(value, int):
+        return value
+
+    match = SIZE_REGEX.match(str(value))
+    if not match:
+        raise RuntimeError(f'Invalid size: {value}')
+    return int(float(match.group('value')) * SIZE_UNITS[match.group('unit').upper()])
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(size) < 1024:
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{int(size)} B'
+        size /= 1024
+    return f'{size:.1f} TiB'
+
+
+class CacheEntry(NamedTuple):
+    area: str
+    path: Path
+    size: int
+    last_used: float
+    # Device, inode and size of every file, so hard linked files are counted once
+    files: Tuple[Tuple[int, int, int], ...] = ()
+
+
+class GcResult(NamedTuple):
+    removed: List[CacheEntry]
+    freed: int
+    temp_dirs: List[Path]
+    temporaries: List[Path]
+    staged: List[Path]
+
+
+def _scan_files(path: Path) -> Tuple[Tuple[int, int, int], ...]:
+    if not path.is_dir():
+        st = path.lstat()
+        return (st.st_dev, st.st_ino, st.st_size),
+
+    files = []
+    for root, _, names in os.walk(str(path)):
+        for name in names:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            files.append((st.st_dev, st.st_ino, st.st_size))
+    return tuple(files)
+
+
+def _unique_size(entries: Iterable[CacheEntry]) -> int:
+    return sum({(dev, ino): size for e in entries for dev, ino, size in e.files}.values())
+
+
+class CacheMaintenance:
+    """
+    Keeps sparpy cache bounded. Resolutions, artifacts, compiled bytecode,
+    built wheels, bundles, packed environments, plugin manifests, scans and
+    pip cache are evicted by age (`max_age` seconds since last use) and in
+    least recently used order while cache is bigger than `max_size` bytes.
+    Entries used during grace period are never evicted, as running jobs
+    could be using them. It also removes orphaned temporary directories of
+    dead sparpy processes and unfinished temporary files.
+    """
+
+    def __init__(self, config=None, logger: Logger = None):
+        try:
+            cache_config = config['cache']
+        except (KeyError, TypeError):
+            config = ConfigParser(default_sections=('cache', 'spark', 'plugins'))
+            cache_config = config['cache']
+
+        self.logger = logger or getLogger(__name__)
+
+        self.cache_dir = get_cache_dir(config)
+        self.max_size = parse_size(cache_config.get('max-size')) if cache_config.get('max-size') else 0
+        self.max_age = cache_config.getint('max-age', fallback=0)
+        self.auto_gc = cache_config.getboolean('auto-gc', fallback=True)
+        self.gc_interval = cache_config.getint('gc-interval', fallback=DEFAULT_GC_INTERVAL)
+
+        try:
+            spark_config = config['spark']
+        except KeyError:
+            spark_config = ConfigParser(default_sections=('spark',))['spark']
+
+        try:
+            plugins_config = config['plugins']
+        except KeyError:
+            plugins_config = ConfigParser(default_sections=('plugins',))['plugins']
+
+        self.grace_period = spark_config.getint('janitor-grace-period', fallback=DEFAULT_GRACE_PERIOD)
+        self.staging_dir = get_staging_dir(config)
+        self.temp_dir_prefix = plugins_config.get('download-dir-prefix', fallback=DEFAULT_DOWNLOAD_DIR_PREFIX)
+
+        self.areas: Dict[str, Path] = {
+            'resolutions': self.cache_dir / 'resolutions',
+            'artifacts': self.cache_dir / 'artifacts',
+            'bytecode': self.cache_dir / 'bytecode',
+            'wheels': self.cache_dir / 'wheels',
+            'bundles': spark_config.getpath('bundle-dir', fallback=self.cache_dir / 'bundles'),
+            'envs': spark_config.getpath('packed-env-dir', fallback=self.cache_dir / 'envs'),
+            'manifests': self.cache_dir / 'manifests',
+            'scans': self.cache_dir / 'scans',
+            'entry-points': self.cache_dir / 'entry-points',
+            'staging': self.staging_dir,
+        }
+        if plugins_config.get('cache-dir'):
+            self.areas['pip'] = plugins_config.getpath('cache-dir')
+
+    @property
+    def locks_dir(self) -> Path:
+        return self.cache_dir / 'locks'
+
+    def _iter_area_paths(self, area: str, area_dir: Path) -> Iterable[Path]:
+        if area == 'pip':
+            # Pip cache layout is not known, every file is an entry
+            for root, dirs, names in os.walk(str(area_dir)):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                for name in names:
+                    if not name.startswith('.'):
+                        yield Path(root) / name
+            return
+
+        try:
+            paths = sorted(area_dir.iterdir())
+        except OSError:
+            return
+        for path in paths:
+            if not path.name.startswith('.'):
+                yield path
+
+    def iter_entries(self, areas: Iterable[str] = None) -> Iterable[CacheEntry]:
+        for area in areas or self.areas:
+            for path in self._iter_area_paths(area, self.areas[area]):
+                try:
+                    files = _scan_files(path)
+                    last_used = path.stat().st_mtime
+                except OSError:
+                    continue
+                yield CacheEntry(area=area,
+                                 path=path,
+                                 size=sum(size for _, _, size in files),
+                                 last_used=last_used,
+                                 files=files)
+
+    def stats(self, top: int = 10) -> Dict:
+        entries = list(self.iter_entries())
+
+        areas = {}
+        for area, area_dir in self.areas.items():
+            area_entries = [e for e in entries if e.area == area]
+            areas[area] = {'path': str(area_dir),
+                           'entries': len(area_entries),
+                           'size': _unique_size(area_entries)}
+
+        lookups = {}
+        for kind, counters in sorted(load_cache_stats(self.cache_dir).items()):
+            hits = counters.get('hits', 0)
+            misses = counters.get('misses', 0)
+            lookups[kind] = {'hits': hits,
+                             'misses': misses,
+                             'hit_rate': hits / (hits + misses) if hits + misses else None,
+                             'bytes_saved': counters.get('bytes_saved', 0)}
+
+        return {'cache_dir': str(self.cache_dir),
+                'size': _unique_size(entries),
+                'entries': len(entries),
+                'max_size': self.max_size or None,
+                'max_age': self.max_age or None,
+                'areas': areas,
+                'lookups': lookups,
+                'largest': [{'area': e.area,
+                             'path': str(e.path),
+                             'size': e.size,
+                             'last_used': e.last_used}
+                            for e in sorted(entries, key=lambda e: e.size, reverse=True)[:top]]}
+
+    def _delete(self, path: Path):
+        if path.is_dir() and not path.is_symlink():
+            # Directory is moved away first, so it is complete or missing
+            old_path = path.with_name(f'.{path.name}.{os.getpid()}.old')
+            path.rename(old_path)
+            rmtree(str(old_path), ignore_errors=True)
+        else:
+            path.unlink()
+
+    def remove(self, entry: CacheEntry, dry_run: bool = False) -> bool:
+        """
+        Removes a cache entry. Entries being written by other process are
+        skipped, and it returns False.
+        """
+        if dry_run:
+            return True
+
+        lock = None
+        if entry.area in LOCKED_AREAS:
+            lock = FileLock(self.locks_dir / f'{LOCKED_AREAS[entry.area]}-{entry.path.name}.lock',
+                            timeout=0,
+                            logger=self.logger)
+            if not lock.acquire():
+                self.logger.debug(f'Cache entry {entry.path} is locked by another process, skipped')
+                return False
+
+        try:
+            self._delete(entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError as ex:
+            self.logger.warning(f'Unable to remove cache entry {entry.path}: {ex}')
+            return False
+        finally:
+            if lock is not None:
+                lock.release()
+
+        return True
+
+    def iter_orphan_temp_dirs(self, grace_period: float = None) -> Iterable[Path]:
+        """
+        Temporary download directories of dead sparpy processes. Their names
+        include owner process id.
+        """
+        from tempfile import gettempdir
+
+        grace_period = self.grace_period if grace_period is None else grace_period
+        now = time.time()
+
+        try:
+            paths = sorted(Path(gettempdir()).iterdir())
+        except OSError:
+            return
+
+        for path in paths:
+            if not path.name.startswith(self.temp_dir_prefix):
+                continue
+            try:
+                st = path.lstat()
+            except OSError:
+                continue
+            if not path.is_dir() or path.is_symlink() or st.st_uid != os.getuid():
+                continue
+
+            age = now - st.st_mtime
+            match = TEMP_DIR_PID_REGEX.match(path.name[len(self.temp_dir_prefix):])
+            if match:
+                if age < grace_period or is_process_alive(int(match.group('pid'))):
+                    continue
+            elif age < LEGACY_TEMP_DIR_MAX_AGE:
+                continue
+
+            yield path
+
+    def iter_temporaries(self, grace_period: float = None) -> Iterable[Path]:
+        """
+        Unfinished temporary files and directories left on cache by killed
+        processes.
+        """
+        grace_period = self.grace_period if grace_period is None else grace_period
+        now = time.time()
+
+        dirs = [self.cache_dir, *(d for a, d in self.areas.items() if a not in ('pip', 'staging'))]
+        dirs.extend(d for d in self._iter_area_paths('artifacts', self.areas['artifacts']) if d.is_dir())
+        for directory in dirs:
+            try:
+                paths = sorted(directory.iterdir())
+            except OSError:
+                continue
+            for path in paths:
+                match = TEMPORARY_REGEX.match(path.name)
+                if not match:
+                    continue
+                try:
+                    age = now - path.lstat().st_mtime
+                except OSError:
+                    continue
+                if age >= grace_period and not is_process_alive(int(match.group('pid'))):
+                    yield path
+
+    def gc(self,
+           max_size: int = None,
+           max_age: int = None,
+           grace_period: float = None,
+           dry_run: bool = False) -> GcResult:
+        """
+        Removes orphaned temporary directories, unfinished temporaries and
+        staged packages without leases, then cache entries unused for more
+        than `max_age` seconds and, least recently used first, entries until
+        cache size is under `max_size` bytes.
+        """
+        max_size = self.max_size if max_size is None else max_size
+        max_age = self.max_age if max_age is None else max_age
+        grace_period = self.grace_period if grace_period is None else grace_period
+
+        temp_dirs = list(self.iter_orphan_temp_dirs(grace_period))
+        temporaries = list(self.iter_temporaries(grace_period))
+        if not dry_run:
+            for path in temp_dirs:
+                self.logger.debug(f'Removing orphaned temporary directory: {path}')
+                rmtree(str(path), ignore_errors=True)
+            for path in temporaries:
+                self.logger.debug(f'Removing unfinished temporary: {path}')
+                try:
+                    self._delete(path)
+                except OSError:
+                    pass
+
+        staged = Staging(self.staging_dir, logger=self.logger).clean(grace_period=grace_period, dry_run=dry_run)
+
+        entries = [e for e in self.iter_entries() if e.area not in UNEVICTABLE_AREAS]
+        refs: Dict[Tuple[int, int], int] = {}
+        sizes: Dict[Tuple[int, int], int] = {}
+        for entry in entries:
+            for dev, ino, size in entry.files:
+                refs[(dev, ino)] = refs.get((dev, ino), 0) + 1
+                sizes[(dev, ino)] = size
+        total = sum(sizes.values())
+
+        now = time.time()
+        removed = []
+        freed = 0
+        for entry in sorted(entries, key=lambda e: e.last_used):
+            expired = max_age and now - entry.last_used > max_age
+            oversized = max_size and total > max_size
+            if not expired and not oversized:
+                break
+            if now - entry.last_used < grace_period:
+                # Following entries were used even later
+                break
+            if not self.remove(entry, dry_run=dry_run):
+                continue
+
+            removed.append(entry)
+            for dev, ino, _ in entry.files:
+                refs[(dev, ino)] -= 1
+                if not refs[(dev, ino)]:
+                    freed += sizes[(dev, ino)]
+                    total -= sizes[(dev, ino)]
+
+        if max_size and total > max_size:
+            self.logger.warning(f'Cache size ({format_size(total)}) is still over limit ({format_size(max_size)}): '
+                                f'rest of entries were used recently')
+
+        return GcResult(removed=removed, freed=freed, temp_dirs=temp_dirs, temporaries=temporaries, staged=staged)
+
+    def maybe_gc(self) -> Optional[GcResult]:
+        """
+        Runs garbage collection when cache is bounded and it did not run
+        during last `gc_interval` seconds. Only one process runs it at a time.
+        """
+        if not self.auto_gc or not (self.max_size or self.max_age):
+            return None
+
+        marker = self.cache_dir / '.last-gc'
+        try:
+            if time.time() - marker.stat().st_mtime < self.gc_interval:
+                return None
+        except OSError:
+            pass
+
+        lock = FileLock(self.locks_dir / 'gc.lock', timeout=0, logger=self.logger)
+        if not lock.acquire():
+            return None
+        try:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+            result = self.gc()
+        finally:
+            lock.release()
+
+        if result.removed:
+            self.logger.info(f'Sparpy cache bounded: {len(result.removed)} entries evicted, '
+                             f'{format_size(result.freed)} freed')
+        return result
+
+    def check(self, entry: CacheEntry) -> Optional[str]:
+        """
+        Returns the problem of a corrupted entry, or None.
+        """
+        path = entry.path
+        try:
+            if entry.area == 'resolutions':
+                with (path / 'manifest.json').open('r') as f:
+                    manifest = json.load(f)
+                for file in manifest.get('files', []):
+                    size = (path / file['name']).stat().st_size
+                    if size != file['size']:
+                        return f'size of {file["name"]} is {size} instead of {file["size"]}'
+            elif entry.area == 'artifacts':
+                for file in path.iterdir():
+                    if file.name.startswith('.'):
+                        continue
+                    if file_digest(file) != path.name:
+                        return f'hash of {file.name} does not match'
+            elif path.name.endswith('.zip') or entry.area == 'wheels':
+                from zipfile import BadZipFile, ZipFile
+
+                for file in ([path] if path.is_file() else sorted(path.glob('*.whl'))):
+                    try:
+                        with ZipFile(str(file)) as zf:
+                            bad = zf.testzip()
+                    except BadZipFile as ex:
+                        return f'invalid zip file {file.name}: {ex}'
+                    if bad is not None:
+                        return f'corrupted zip member {bad} of {file.name}'
+            elif path.name.endswith('.tar.gz') and path.is_file():
+                import tarfile
+
+                try:
+                    with tarfile.open(str(path), 'r:gz') as tf:
+                        for member in tf:
+                            if member.isfile():
+                                tf.extractfile(member).read()
+                except (tarfile.TarError, EOFError, ValueError) as ex:
+                    return f'invalid packed environment: {ex}'
+            elif path.name.endswith('.json'):
+                with path.open('r') as f:
+                    json.load(f)
+        except FileNotFoundError as ex:
+            return f'missing file {ex.filename}'
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            return f'unreadable: {ex}'
+        return None
+
+    def verify(self, fix: bool = False) -> List[Tuple[CacheEntry, str]]:
+        """
+        Checks integrity of cache entries. When `fix` is set, corrupted
+        entries are removed.
+        """
+        corrupted = []
+        for entry in self.iter_entries([a for a in self.areas if a not in ('pip', 'staging')]):
+            problem = self.check(entry)
+            if problem is None:
+                continue
+            corrupted.append((entry, problem))
+            if fix:
+                self.remove(entry)
+        return corrupted
@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+DEFAULT_STATSD_PORT = 8125
+DEFAULT_PREFIX = 'sparpy'
+
+METRIC_NAME_REGEX = re.compile(r'[^a-zA-Z0-9_]')
+
+
+class Span(NamedTuple):
+    name: str
+    timestamp: float
+    duration: float
+    tags: Dict[str, str] = {}
+
+
+class JsonLinesSink:
+    """
+    Appends a JSON line for every span. Every line is written on a single
+    write call, so concurrent processes could share same file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def emit(self, spans: List[Span], tags: Dict[str, str]):
+        lines = ''.join(json.dumps({'metric': s.name,
+                                    'timestamp': s.timestamp,
+                                    'duration': s.duration,
+                                    'pid': os.getpid(),
+                                    'tags': {**tags, **s.tags}}) + '\n'
+                        for s in spans)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+
+class StatsdSink:
+    """
+    Sends span durations as StatsD timers (in milliseconds) over UDP. Tags are
+    sent using DogStatsD format when `send_tags` is enabled.
+    """
+
+    # Safe payload size for most networks
+    MAX_PACKET_SIZE = 512
+
+    def __init__(self, host: str, port: int = DEFAULT_STATSD_PORT, prefix: str = DEFAULT_PREFIX,
+                 send_tags: bool = False):
+        self.host = host
+        self.port = port
+        self.prefix = prefix
+        self.send_tags = send_tags
+
+    def format(self, span: Span, tags: Dict[str, str]) -> str:
+        name = f'{self.prefix}.{span.name}' if self.prefix else span.name
+        line = f'{name}:{span.duration * 1000:.3f}|ms'
+        tags = {**tags, **span.tags}
+        if self.send_tags and tags:
+            line += '|#' + ','.join(f'{k}:{v}' for k, v in sorted(tags.items()))
+        return line
+
+    def emit(self, spans: List[Span], tags: Dict[str, str]):
+        import socket
+
+        packets = []
+        for line in (self.format(s, tags) for s in spans):
+            if packets and len(packets[-1]) + len(line) + 1 <= self.MAX_PACKET_SIZE:
+                packets[-1] += '\n' + line
+            else:
+                packets.append(line)
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for packet in packets:
+                sock.sendto(packet.encode('utf-8'), (self.host, self.port))
+
+
+class PrometheusTextfileSink:
+    """
+    Writes last duration of every span on a file for node exporter textfile
+    collector. File is replaced atomically, and it keeps every span emitted
+    by current process.
+    """
+
+    def __init__(self, path: Path, prefix: str = DEFAULT_PREFIX):
+        self.path = Path(path)
+        self.prefix = METRIC_NAME_REGEX.sub('_', prefix or DEFAULT_PREFIX)
+        self._spans: Dict[str, Span] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> str:
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        return ','.join(f'{METRIC_NAME_REGEX.sub("_", k)}="{escape(v)}"' for k, v in sorted(labels.items()))
+
+    def emit(self, spans: List[Span], tags: Dict[str, str]):
+        for span in spans:
+            self._spans[span.name] = span
+
+        duration_metric = f'{self.prefix}_phase_duration_seconds'
+        timestamp_metric = f'{self.prefix}_phase_timestamp_seconds'
+        lines = [f'# HELP {duration_metric} Duration of last sparpy phase.',
+                 f'# TYPE {duration_metric} gauge']
+        lines.extend(f'{duration_metric}{{{self._labels({**tags, **s.tags, "phase": s.name})}}} {s.duration:.6f}'
+                     for s in sorted(self._spans.values()))
+        lines.extend([f'# HELP {timestamp_metric} Start time of last sparpy phase.',
+                      f'# TYPE {timestamp_metric} gauge'])
+        lines.extend(f'{timestamp_metric}{{{self._labels({**tags, **s.tags, "phase": s.name})}}} {s.timestamp:.3f}'
+                     for s in sorted(self._spans.values()))
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_name(f'.{self.path.name}.{os.getpid()}.tmp')
+        with tmp_file.open('w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(str(tmp_file), str(self.path))
+
+
+class Metrics:
+    """
+    Records named spans of sparpy phases. Spans are kept in memory until sinks
+    are configured and they are flushed, so phases run before configuration
+    is loaded are also reported. Without sinks, spans are discarded.
+    """
+
+    def __init__(self, logger: Logger = None):
+        self.logger = logger or getLogger(__name__)
+        self.sinks = []
+        self.tags: Dict[str, str] = {}
+        self.configured = False
+        self._spans: List[Span] = []
+
+    @property
+    def enabled(self) -> bool:
+        return not self.configured or len(self.sinks) > 0
+
+    def configure(self, config=None, logger: Logger = None):
+        """
+        Builds sinks from `[metrics]` configuration section. Only first call
+        is applied.
+        """
+        if self.configured:
+            return
+
+        import atexit
+
+        if logger is not None:
+            self.logger = logger
+
+        self.configured = True
+        self.sinks = build_sinks(config)
+        if self.sinks:
+            atexit.register(self.flush)
+        else:
+            self._spans = []
+
+    def record(self, name: str, duration: float, timestamp: float = None, **tags):
+        if not self.enabled:
+            return
+        self._spans.append(Span(name=name,
+                                timestamp=timestamp if timestamp is not None else time.time() - duration,
+                                duration=duration,
+                                tags={k: str(v) for k, v in tags.items()}))
+
+    @contextmanager
+    def span(self, name: str, **tags):
+        timestamp = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, timestamp=timestamp, **tags)
+
+    def flush(self):
+        spans, self._spans = self._spans, []
+        if not spans or not self.sinks:
+            return
+
+        for sink in self.sinks:
+            try:
+                sink.emit(spans, self.tags)
+            except OSError as ex:
+                self.logger.warning(f'Unable to emit metrics to {type(sink).__name__}: {ex}')
+
+
+def build_sinks(config=None) -> list:
+    try:
+        metrics_config = config['metrics']
+    except (KeyError, TypeError):
+        return []
+
+    prefix = metrics_config.get('prefix', fallback=DEFAULT_PREFIX)
+
+    sinks = []
+    if metrics_config.get('jsonl-file'):
+        sinks.append(JsonLinesSink(metrics_config.getpath('jsonl-file')))
+
+    if metrics_config.get('statsd-host'):
+        sinks.append(StatsdSink(metrics_config.get('statsd-host'),
+                                port=metrics_config.getint('statsd-port', fallback=DEFAULT_STATSD_PORT),
+                                prefix=prefix,
+                                send_tags=metrics_config.getboolean('statsd-tags', fallback=False)))
+
+    if metrics_config.get('prometheus-textfile'):
+        sinks.append(PrometheusTextfileSink(metrics_config.getpath('prometheus-textfile'), prefix=prefix))
+
+    return sinks
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def span(name: str, **tags):
+    return get_metrics().span(name, **tags)
+
+
+def configure_metrics(config=None, command: str = None, logger: Logger = None) -> Metrics:
+    metrics = get_metrics()
+    metrics.configure(config, logger=logger)
+    if command:
+        metrics.tags.setdefault('command', command)
+    return metrics
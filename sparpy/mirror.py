@@ -0,0 +1,224 @@
+import html
+import json
+import os
+from logging import Logger, getLogger
+from pathlib import Path
+from shutil import rmtree
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .cache import file_digest, iter_package_files
+from .locking import FileLock, link_or_copy, publish_file
+from .packages import (canonicalize_name, is_wheel_filename,
+                       parse_package_filename)
+
+FILES_DIRNAME = 'files'
+SIMPLE_DIRNAME = 'simple'
+MANIFEST_FILENAME = 'mirror.json'
+MANIFEST_VERSION = 1
+
+INDEX_TEMPLATE = '''<!DOCTYPE html>
+<html>
+  <head>
+    <meta name="pypi:repository-version" content="1.0">
+    <title>{title}</title>
+  </head>
+  <body>
+{links}
+  </body>
+</html>
+'''
+
+
+class MirroredFile(NamedTuple):
+    filename: str
+    name: str
+    version: str
+    sha256: str
+    size: int
+    mtime: float
+    requires_python: Optional[str] = None
+
+
+def read_requires_python(path: Path) -> Optional[str]:
+    """
+    Returns `Requires-Python` metadata of a wheel, if any.
+    """
+    from email.parser import HeaderParser
+    from zipfile import BadZipFile, ZipFile
+
+    if not is_wheel_filename(path.name):
+        return None
+
+    try:
+        with ZipFile(str(path)) as zf:
+            metadata = next((n for n in zf.namelist()
+                             if n.count('/') == 1 and n.endswith('.dist-info/METADATA')), None)
+            if metadata is None:
+                return None
+            headers = HeaderParser().parsestr(zf.read(metadata).decode('utf-8', errors='replace'))
+    except (OSError, BadZipFile):
+        return None
+
+    return headers.get('Requires-Python') or None
+
+
+class Mirror:
+    """
+    Local wheelhouse of python packages (`files` directory) with a static
+    PEP 503 simple index (`simple` directory), so packages could be resolved
+    from local disk using `--find-links` or `--extra-index-url`. Hashes of
+    mirrored files are recorded on a manifest, so only new files are hashed.
+    """
+
+    def __init__(self, directory: Path, logger: Logger = None):
+        self.directory = Path(directory)
+        self.logger = logger or getLogger(__name__)
+        self.files: Dict[str, MirroredFile] = {}
+
+    @property
+    def files_dir(self) -> Path:
+        return self.directory / FILES_DIRNAME
+
+    @property
+    def simple_dir(self) -> Path:
+        return self.directory / SIMPLE_DIRNAME
+
+    @property
+    def manifest_file(self) -> Path:
+        return self.directory / MANIFEST_FILENAME
+
+    def lock(self) -> FileLock:
+        """
+        Lock of mirror, so only one process updates it at a time.
+        """
+        return FileLock(self.directory / '.mirror.lock', logger=self.logger)
+
+    def _describe(self, path: Path) -> MirroredFile:
+        st = path.stat()
+        name, version = parse_package_filename(path.name)
+        return MirroredFile(filename=path.name,
+                            name=name,
+                            version=version,
+                            sha256=file_digest(path),
+                            size=st.st_size,
+                            mtime=st.st_mtime,
+                            requires_python=read_requires_python(path))
+
+    def refresh(self) -> Dict[str, MirroredFile]:
+        """
+        Loads mirrored files. Files not found on manifest, or changed since
+        they were recorded, are hashed again.
+        """
+        try:
+            with self.manifest_file.open('r') as f:
+                data = json.load(f)
+            recorded = {f['filename']: MirroredFile(**f) for f in data.get('files', [])
+                        if data.get('version') == MANIFEST_VERSION}
+        except (OSError, ValueError, TypeError):
+            recorded = {}
+
+        self.files = {}
+        for path in iter_package_files(self.files_dir):
+            try:
+                st = path.stat()
+                current = recorded.get(path.name)
+                if current is None or current.size != st.st_size or current.mtime != st.st_mtime:
+                    current = self._describe(path)
+            except ValueError as ex:
+                self.logger.warning(f'File {path.name} is not mirrored: {ex}')
+                continue
+            self.files[path.name] = current
+
+        return self.files
+
+    def seed(self, filenames: Dict[str, str], target_dir: Path) -> List[Path]:
+        """
+        Links mirrored files with same name and hash on `target_dir`, so they
+        are not downloaded again.
+        """
+        result = []
+        for filename, sha256 in filenames.items():
+            mirrored = self.files.get(filename)
+            if mirrored is None or mirrored.sha256 != sha256 or (Path(target_dir) / filename).exists():
+                continue
+            link_or_copy(self.files_dir / filename, Path(target_dir) / filename)
+            result.append(Path(target_dir) / filename)
+        return result
+
+    def add(self, path: Path) -> bool:
+        """
+        Adds a file to mirror. It returns False when it was already mirrored.
+        """
+        path = Path(path)
+        sha256 = file_digest(path)
+        mirrored = self.files.get(path.name)
+        if mirrored is not None and mirrored.sha256 == sha256:
+            return False
+
+        if mirrored is not None:
+            self.logger.warning(f'Mirrored file {path.name} replaced, its content changed')
+
+        self.files_dir.mkdir(parents=True, exist_ok=True)
+        publish_file(path, self.files_dir / path.name)
+        self.files[path.name] = self._describe(self.files_dir / path.name)
+        return True
+
+    def prune(self, keep: Iterable[str], dry_run: bool = False) -> List[Path]:
+        """
+        Removes mirrored files not referenced by `keep` filenames.
+        """
+        keep = set(keep)
+        removed = []
+        for filename in sorted(set(self.files) - keep):
+            path = self.files_dir / filename
+            removed.append(path)
+            if dry_run:
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            del self.files[filename]
+        return removed
+
+    def _write(self, path: Path, content: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with tmp_path.open('w') as f:
+            f.write(content)
+        os.replace(str(tmp_path), str(path))
+
+    def write_index(self):
+        """
+        Writes simple index of mirrored files. Every page is replaced
+        atomically, so index could be read while it is updated.
+        """
+        projects: Dict[str, List[MirroredFile]] = {}
+        for mirrored in self.files.values():
+            projects.setdefault(canonicalize_name(mirrored.name), []).append(mirrored)
+
+        for project, files in sorted(projects.items()):
+            links = []
+            for mirrored in sorted(files, key=lambda f: f.filename):
+                attrs = f' data-requires-python="{html.escape(mirrored.requires_python)}"' \
+                    if mirrored.requires_python else ''
+                links.append(f'    <a href="../../{FILES_DIRNAME}/{html.escape(mirrored.filename)}'
+                             f'#sha256={mirrored.sha256}"{attrs}>{html.escape(mirrored.filename)}</a><br/>')
+            self._write(self.simple_dir / project / 'index.html',
+                        INDEX_TEMPLATE.format(title=f'Links for {html.escape(project)}', links='\n'.join(links)))
+
+        self._write(self.simple_dir / 'index.html',
+                    INDEX_TEMPLATE.format(title='Simple index',
+                                          links='\n'.join(f'    <a href="{html.escape(p)}/">{html.escape(p)}</a><br/>'
+                                                          for p in sorted(projects))))
+
+        if self.simple_dir.is_dir():
+            for path in self.simple_dir.iterdir():
+                if path.is_dir() and path.name not in projects:
+                    rmtree(str(path), ignore_errors=True)
+
+    def save(self):
+        self._write(self.manifest_file,
+                    json.dumps({'version': MANIFEST_VERSION,
+                                'files': [f._asdict() for _, f in sorted(self.files.items())]},
+                               indent=2) + '\n')
@@ -0,0 +1,35 @@
+import re
+from typing import Tuple
+
+NAME_NORMALIZE_REGEX = re.compile(r'[-_.]+')
+
+SDIST_EXTENSIONS = ('.tar.gz', '.tar.bz2', '.tgz', '.tar.xz', '.zip')
+
+
+def canonicalize_name(name: str) -> str:
+    return NAME_NORMALIZE_REGEX.sub('-', name).lower()
+
+
+def is_wheel_filename(filename: str) -> bool:
+    return filename.endswith('.whl') or (filename.endswith('.zip') and filename.count('-') >= 4)
+
+
+def parse_package_filename(filename: str) -> Tuple[str, str]:
+    """
+    Returns distribution name and version from a wheel, egg or sdist filename.
+    Wheels converted to zip files keep their wheel name.
+    """
+    if is_wheel_filename(filename) or filename.endswith('.egg'):
+        parts = filename.rsplit('.', 1)[0].split('-')
+        if len(parts) < 2:
+            raise ValueError(f'Invalid package filename: {filename}')
+        return parts[0], parts[1]
+
+    for ext in SDIST_EXTENSIONS:
+        if filename.endswith(ext):
+            name, _, version = filename[:-len(ext)].rpartition('-')
+            if not name:
+                raise ValueError(f'Invalid package filename: {filename}')
+            return name, version
+
+    raise ValueError(f'Unknown package file type: {filename}')
@@ -0,0 +1,211 @@
+import gzip
+import hashlib
+import io
+import os
+import sys
+import tarfile
+from logging import Logger, getLogger
+from pathlib import Path
+from shutil import rmtree
+from typing import Dict, Iterable, Tuple
+from zipfile import ZipFile, ZipInfo
+
+from .bundle import _egg_info_name
+from .cache import file_digest, touch
+
+PACKED_ENV_PREFIX = 'sparpy-env-'
+PACKED_ENV_ALIAS = 'env'
+LAYOUT_VERSION = 1
+
+LAUNCHER_TEMPLATE = '''#!/bin/sh
+# Relocatable launcher: packages are added to sys.path by sitecustomize module.
+# Interpreter is not embedded, it must be installed on every node.
+ENV_DIR="$(cd "$(dirname "$0")/.." && pwd)"
+export PYTHONPATH="$ENV_DIR/lib/sparpy-boot${{PYTHONPATH:+:$PYTHONPATH}}"
+exec "${{SPARPY_ENV_INTERPRETER:-{interpreter}}}" "$@"
+'''
+
+SITECUSTOMIZE = '''import os
+import site
+
+site.addsitedir(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'site-packages'))
+'''
+
+
+def default_interpreter() -> str:
+    return f'python{sys.version_info[0]}.{sys.version_info[1]}'
+
+
+def _env_digest(archives: Iterable[Path], interpreter: str) -> str:
+    h = hashlib.sha256(f'{LAYOUT_VERSION}\0{interpreter}\0{sys.implementation.cache_tag}\n'.encode('utf-8'))
+    for archive in archives:
+        h.update(archive.name.encode('utf-8'))
+        h.update(file_digest(archive).encode('ascii'))
+    return h.hexdigest()
+
+
+def _site_packages_name(arcname: str, data_dir: str) -> str:
+    """
+    Maps a wheel entry to its path relative to site-packages, or returns an
+    empty string when it must not be installed.
+    """
+    if data_dir and arcname.startswith(data_dir):
+        scheme, _, path = arcname[len(data_dir):].partition('/')
+        if scheme in ('purelib', 'platlib'):
+            return path
+        return ''
+    return arcname
+
+
+def _iter_entries(archive: Path, zf: ZipFile, logger: Logger) -> Iterable[Tuple[str, ZipInfo]]:
+    names = zf.namelist()
+    data_dir = next((n.split('/', 1)[0] + '/' for n in names if n.split('/', 1)[0].endswith('.data')), '')
+    egg_info = _egg_info_name(archive) if archive.suffix == '.egg' else None
+
+    for info in zf.infolist():
+        if info.filename.endswith('/'):
+            continue
+
+        arcname = _site_packages_name(info.filename, data_dir)
+        if not arcname:
+            logger.debug(f'Entry {info.filename} of {archive.name} is not installed on packed environment')
+            continue
+
+        if egg_info and arcname.startswith('EGG-INFO/'):
+            arcname = egg_info + arcname[len('EGG-INFO'):]
+
+        yield arcname, info
+
+
+def _tar_info(name: str, size: int = 0, mode: int = 0o644, kind=tarfile.REGTYPE) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mode = mode
+    info.type = kind
+    info.mtime = 0
+    info.uid = info.gid = 0
+    info.uname = info.gname = ''
+    return info
+
+
+def build_packed_env(archives: Iterable[Path],
+                     output_dir: Path,
+                     interpreter: str = None,
+                     logger: Logger = None) -> Path:
+    """
+    Builds a relocatable python environment tarball from python packages.
+    Wheels are unpacked on `lib/site-packages`, so compiled extensions can be
+    loaded, and `bin/python` is a shell launcher which runs `interpreter`
+    (`pythonX.Y` of the one running sparpy, by default) from PATH with those
+    packages. No interpreter is embedded, so it must be installed on every
+    node. Result is deterministic, so tarball name is derived from its
+    contents, and it is reused when it exists.
+    """
+    logger = logger or getLogger(__name__)
+    interpreter = interpreter or default_interpreter()
+
+    archives = sorted({Path(a).resolve() for a in archives}, key=lambda a: (a.name, str(a)))
+    output_dir = Path(output_dir)
+
+    packed_env = output_dir / f'{PACKED_ENV_PREFIX}{_env_digest(archives, interpreter)[:16]}.tar.gz'
+    if packed_env.is_file():
+        logger.debug(f'Using existing packed environment {packed_env}')
+        touch(packed_env)
+        return packed_env
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    entries: Dict[str, Tuple[Path, ZipInfo]] = {}
+    for archive in archives:
+        with ZipFile(str(archive)) as zf:
+            for arcname, info in _iter_entries(archive, zf, logger):
+                if arcname in entries:
+                    logger.debug(f'Duplicated entry {arcname} on {archive.name} ignored')
+                    continue
+                entries[arcname] = (archive, info)
+
+    launcher = LAUNCHER_TEMPLATE.format(interpreter=interpreter).encode('utf-8')
+    sitecustomize = SITECUSTOMIZE.encode('utf-8')
+
+    tmp_env = packed_env.with_name(f'.{packed_env.name}.{os.getpid()}.tmp')
+    opened: Dict[Path, ZipFile] = {}
+    try:
+        with tmp_env.open('wb') as raw, \
+                gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0, compresslevel=6) as gz, \
+                tarfile.open(fileobj=gz, mode='w', format=tarfile.PAX_FORMAT) as tf:
+
+            for directory in ('bin', 'lib', 'lib/sparpy-boot', 'lib/site-packages'):
+                tf.addfile(_tar_info(directory, mode=0o755, kind=tarfile.DIRTYPE))
+
+            tf.addfile(_tar_info('bin/python', len(launcher), mode=0o755), io.BytesIO(launcher))
+            tf.addfile(_tar_info('lib/sparpy-boot/sitecustomize.py', len(sitecustomize)), io.BytesIO(sitecustomize))
+
+            for arcname in sorted(entries):
+                archive, info = entries[arcname]
+                try:
+                    src = opened[archive]
+                except KeyError:
+                    src = opened[archive] = ZipFile(str(archive))
+
+                mode = 0o755 if (info.external_attr >> 16) & 0o111 else 0o644
+                with src.open(info) as f:
+                    tf.addfile(_tar_info(f'lib/site-packages/{arcname}', info.file_size, mode=mode), f)
+
+        os.replace(str(tmp_env), str(packed_env))
+    finally:
+        for zf in opened.values():
+            zf.close()
+        if tmp_env.exists():
+            tmp_env.unlink()
+
+    logger.debug(f'Packed environment {packed_env.name} built with {len(entries)} files')
+    return packed_env
+
+
+def _extract_all(tf: tarfile.TarFile, path: Path):
+    """
+    Extracts a tarball refusing members outside `path`, links and devices.
+    """
+    if hasattr(tarfile, 'data_filter'):
+        tf.extractall(str(path), filter='data')
+        return
+
+    root = os.path.realpath(str(path))
+    for member in tf.getmembers():
+        target = os.path.realpath(os.path.join(root, member.name))
+        if target != root and not target.startswith(root + os.sep):
+            raise tarfile.TarError(f'Member {member.name} is outside of extraction directory')
+        if not (member.isfile() or member.isdir()):
+            raise tarfile.TarError(f'Member {member.name} is not a regular file or directory')
+    tf.extractall(str(path))
+
+
+def extract_packed_env(packed_env: Path, output_dir: Path = None) -> Path:
+    """
+    Extracts a packed environment next to it (or on `output_dir`), in order to
+    use it locally. Extracted environments are reused.
+    """
+    packed_env = Path(packed_env)
+    output_dir = Path(output_dir) if output_dir else packed_env.parent
+
+    target = output_dir / packed_env.name[:-len('.tar.gz')]
+    if target.is_dir():
+        touch(target)
+        return target
+
+    tmp_dir = target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+    rmtree(str(tmp_dir), ignore_errors=True)
+    try:
+        with tarfile.open(str(packed_env), 'r:gz') as tf:
+            _extract_all(tf, tmp_dir)
+    except tarfile.TarError as ex:
+        rmtree(str(tmp_dir), ignore_errors=True)
+        raise RuntimeError(f'Invalid packed environment {packed_env.name}: {ex}')
+
+    try:
+        os.rename(str(tmp_dir), str(target))
+    except OSError:
+        # Extracted concurrently by another process
+        rmtree(str(tmp_dir), ignore_errors=True)
+
+    return target
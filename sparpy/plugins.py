@@ -4,19 +4,23 @@ import sys
 from itertools import chain
 from logging import Logger, getLogger
 from pathlib import Path
-from pkgutil import iter_modules
-from tempfile import mkdtemp
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List, Optional, Set
 from urllib.parse import urlparse
 from zipimport import zipimporter
 
 import click
-from pkg_resources import find_distributions, iter_entry_points, working_set
 
 from .config import ConfigParser
+from .metrics import span
+from .packages import canonicalize_name, parse_package_filename
 from .processor import ProcessManager
 
 PLUGIN_REGEX = re.compile(r'([^[,]+(?:\[[^]]+])?(?:(?:[><~=]?=|[><~])[^,]+)?)')
+PIP_ENGINE = 'pip'
+NATIVE_ENGINE = 'native'
+DOWNLOAD_ENGINES = (PIP_ENGINE, NATIVE_ENGINE)
+
+PINNED_REGEX = re.compile(r'^(?P<name>[A-Za-z0-9._-]+)(?:\[[^]]+])?\s*===?\s*[^*,<>~!=\s;]+\s*(?:;.*)?$')
 
 
 class DynamicGroup(click.Group):
@@ -25,20 +29,47 @@ class DynamicGroup(click.Group):
     def __init__(self, *args, **kwargs):
         super(DynamicGroup, self).__init__(*args, **kwargs)
 
-        ensure_plugin_distribution()
+        self._entry_points = None
+
+    @property
+    def entry_points(self):
+        if self._entry_points is None:
+            from .entrypoints import EntryPointIndex
+
+            self._entry_points = EntryPointIndex(self.PLUGINS_ENTRY_POINT, config=self.load_config())
+
+            # Registering zip distributions on pkg_resources is only needed by plugins
+            # using it, so it is deferred until a plugin is loaded.
+            if os.environ.get('SPARPY_EAGER_DISTRIBUTIONS'):
+                ensure_plugin_distribution()
+
+        return self._entry_points
+
+    def load_config(self):
+        """
+        Plugins runner has no configuration option, configuration is found
+        same way as sparpy commands do: `SPARPY_CONFIG` or user configuration.
+        """
+        from .config import load_user_config
+
+        try:
+            return load_user_config(os.environ.get('SPARPY_CONFIG'))
+        except RuntimeError as ex:
+            getLogger(__name__).debug(f'Configuration not loaded: {ex}')
+            return None
 
     def iter_plugins(self):
-        yield from iter_entry_points(self.PLUGINS_ENTRY_POINT)
+        yield from self.entry_points.iter_entry_points()
 
     def get_plugin(self, name):
-        for plugin in self.iter_plugins():
-            if plugin.name == name:
-                return plugin
+        plugin = self.entry_points.get(name)
+        if plugin is None:
+            raise RuntimeError(f'Plugin {name} does not exist')
 
-        raise RuntimeError(f'Plugin {name} does not exist')
+        return plugin
 
     def list_commands(self, ctx):
-        rv = sorted([plugin.name for plugin in self.iter_plugins()])
+        rv = sorted(self.entry_points.names())
         return rv
 
     def get_command(self, ctx, name):
@@ -47,11 +78,22 @@ class DynamicGroup(click.Group):
         except IndexError:
             return None
 
-        command = plugin.resolve()
+        command = plugin.load()
+
+        if 'pkg_resources' in sys.modules:
+            ensure_plugin_distribution()
 
         if isinstance(command, click.BaseCommand):
+            if ctx.params.get('profile'):
+                from copy import copy
+
+                command = copy(command)
+                command.invoke = self.profile(ctx, name, command.invoke)
             return command
 
+        if ctx.params.get('profile'):
+            command = self.profile(ctx, name, command)
+
         @click.command(name=name, context_settings={'ignore_unknown_options': True})
         @click.argument(
             'job_args',
@@ -63,14 +105,62 @@ class DynamicGroup(click.Group):
 
         return wrapper
 
+    @staticmethod
+    def profile(ctx, name, fn):
+        from .logger import build_logger
+        from .profiling import profile_callable
+
+        return profile_callable(fn,
+                                profiler=ctx.params['profile'],
+                                name=name,
+                                output_dir=ctx.params.get('profile_dir'),
+                                logger=build_logger(None))
+
 
-def ensure_plugin_distribution():
-    for module_info in iter_modules():
-        if not isinstance(module_info.module_finder, zipimporter):
+_registered_archives = set()
+
+
+def iter_zip_archives(paths: Iterable[str] = None) -> Iterable[str]:
+    from zipfile import is_zipfile
+
+    for path in (paths if paths is not None else sys.path):
+        if path and os.path.isfile(path) and is_zipfile(path):
+            yield path
+
+
+def ensure_plugin_distribution(paths: Iterable[str] = None):
+    """
+    Registers distributions contained on zip archives of `sys.path` on
+    `pkg_resources` working set. Metadata directories are found using zip
+    central directory and each archive is only inspected once.
+    """
+    archives = [a for a in iter_zip_archives(paths) if a not in _registered_archives]
+    if not archives:
+        return
+
+    from zipfile import BadZipFile, ZipFile
+
+    from pkg_resources import Distribution, EggMetadata, working_set
+
+    for archive in archives:
+        _registered_archives.add(archive)
+
+        try:
+            with ZipFile(archive) as zf:
+                names = zf.namelist()
+        except (OSError, BadZipFile):
             continue
 
-        for dist in find_distributions(module_info.module_finder.archive):
-            working_set.add(dist)
+        if 'EGG-INFO/PKG-INFO' in names:
+            working_set.add(Distribution.from_filename(archive, metadata=EggMetadata(zipimporter(archive))))
+
+        meta_dirs = sorted({n.split('/', 1)[0] for n in names
+                            if '/' in n and n.split('/', 1)[0].lower().endswith(('.dist-info', '.egg-info'))})
+        for meta_dir in meta_dirs:
+            meta_path = os.path.join(archive, meta_dir)
+            metadata = EggMetadata(zipimporter(meta_path))
+            metadata.egg_info = meta_path
+            working_set.add(Distribution.from_location(archive, meta_dir, metadata))
 
 
 def _convert_to_zip(f: Path):
@@ -94,13 +184,22 @@ class DownloadPlugins:
                  force_download: bool = None,
                  pre: bool = None,
                  proxy: str = None,
+                 lockfile: str = None,
+                 compile_bytecode: bool = None,
+                 drop_sources: bool = None,
+                 download_engine: str = None,
+                 provided_manifest: str = None,
                  logger: Logger = None,
                  download_dir: str = None,
                  convert_to_zip: bool = True,
-                 env: Dict[str, str] = None):
+                 env: Dict[str, str] = None,
+                 build_wheels: bool = None):
         try:
             plugin_config = config['plugins']
-        except (KeyError, TypeError):
+        except KeyError:
+            config.add_section('plugins')
+            plugin_config = config['plugins']
+        except TypeError:
             config = ConfigParser(default_sections=('plugins', 'plugin-env'))
             plugin_config = config['plugins']
 
@@ -128,6 +227,15 @@ class DownloadPlugins:
         self.force_download = plugin_config.getboolean('force-download', fallback=False)
         self.pre = plugin_config.getboolean('pre', fallback=False)
         self.proxy = plugin_config.get('proxy')
+        self.lockfile = plugin_config.getpath('lockfile', fallback=None)
+        self.download_workers = plugin_config.getint('download-workers', fallback=4)
+        self.compile_bytecode = plugin_config.getboolean('compile-bytecode', fallback=False)
+        self.drop_sources = plugin_config.getboolean('drop-sources', fallback=False)
+        self.bytecode_optimize = plugin_config.getint('bytecode-optimize', fallback=-1)
+        self.download_engine = plugin_config.get('download-engine', fallback=PIP_ENGINE)
+        self.provided_manifest = plugin_config.getpath('provided-manifest', fallback=None)
+        self.build_wheels = plugin_config.getboolean('build-wheels', fallback=True)
+        self.build_workers = plugin_config.getint('build-workers', fallback=4)
 
         self.env = dict(env_config)
 
@@ -164,19 +272,178 @@ class DownloadPlugins:
         if proxy is not None:
             self.proxy = proxy
 
+        if lockfile:
+            self.lockfile = Path(lockfile)
+
+        if compile_bytecode is not None:
+            self.compile_bytecode = compile_bytecode
+
+        if drop_sources is not None:
+            self.drop_sources = drop_sources
+
+        if download_engine:
+            self.download_engine = download_engine
+
+        if provided_manifest:
+            self.provided_manifest = Path(provided_manifest)
+
+        if build_wheels is not None:
+            self.build_wheels = build_wheels
+
+        if self.download_engine not in DOWNLOAD_ENGINES:
+            raise RuntimeError(f'Invalid download engine: {self.download_engine}')
+
+        if self.download_engine == NATIVE_ENGINE:
+            from importlib.util import find_spec
+
+            if find_spec('packaging') is None:
+                self.logger.warning('Package `packaging` is not available, using pip download engine')
+                self.download_engine = PIP_ENGINE
+
         if env is not None:
             self.env.update(env)
 
         if download_dir:
             self.reqs_path = download_dir
         else:
-            self.reqs_path = mkdtemp(prefix=self.download_dir_prefix)
+            from tempfile import mkdtemp
+            self.reqs_path = mkdtemp(prefix=self.temp_dir_prefix)
 
         self.convert_to_zip = convert_to_zip
-
-    def build_command(self):
-        pip_exec_params = [sys.executable, '-m', 'pip', 'download']
-        pip_exec_params.extend(['-d', self.reqs_path])
+        self.pruned_packages: Dict[str, str] = {}
+        self._provided = None
+
+        from .cache import ResolutionCache, get_cache_dir
+
+        self.config = config
+        self.resolution_cache = ResolutionCache(config=config, logger=self.logger)
+        self.bytecode_cache_dir = get_cache_dir(config) / 'bytecode' if self.resolution_cache.enabled else None
+
+    @property
+    def temp_dir_prefix(self) -> str:
+        """
+        Prefix of temporary directories. It includes owner process id, so
+        orphaned directories could be found and removed.
+        """
+        return f'{self.download_dir_prefix}{os.getpid()}-'
+
+    @property
+    def provided(self):
+        """
+        Manifest of packages provided by executors environment, if any.
+        """
+        if self._provided is None and self.provided_manifest:
+            from .provided import ProvidedManifest
+
+            self._provided = ProvidedManifest.load(self.provided_manifest)
+            self._provided.check_environment(self.logger)
+        return self._provided
+
+    def iter_requirements(self) -> Iterable[str]:
+        yield from chain.from_iterable([PLUGIN_REGEX.findall(p)
+                                        if ',' in p else [p, ] for p in self.plugins])
+
+    def pinned_names(self) -> Optional[Set[str]]:
+        """
+        Names of packages pinned to an exact version by requirements or
+        constraints files. It returns `None` when some requirement is not
+        pinned.
+        """
+        names = set()
+        for req in self.iter_requirements():
+            match = PINNED_REGEX.match(req.strip())
+            if not match:
+                return None
+            names.add(canonicalize_name(match.group('name')))
+
+        req_files = chain([(r, False) for r in self.requirements_files],
+                          [(c, True) for c in self.constraints])
+        for req_file, is_constraint in req_files:
+            try:
+                lines = Path(req_file).read_text().splitlines()
+            except OSError:
+                return None
+
+            for line in lines:
+                line = line.split(' #', 1)[0].strip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('-'):
+                    if line.startswith(('-r', '--requirement', '-e', '--editable')):
+                        return None
+                    continue
+                match = PINNED_REGEX.match(line)
+                if match:
+                    names.add(canonicalize_name(match.group('name')))
+                elif not is_constraint:
+                    return None
+
+        return names
+
+    def is_pinned(self) -> bool:
+        """
+        Whether all requirements are pinned to an exact version. Their
+        resolution could still change when their dependencies are not pinned,
+        see `is_fully_pinned`.
+        """
+        return bool(self.lockfile) or self.pinned_names() is not None
+
+    def is_fully_pinned(self, files: Iterable[Path]) -> bool:
+        """
+        Whether all resolved packages are pinned to an exact version by a
+        lockfile or by requirements and constraints files, so resolution
+        could not change over time.
+        """
+        if self.lockfile:
+            return True
+
+        names = self.pinned_names()
+        if names is None:
+            return False
+        if not self.no_self:
+            names.add('sparpy')
+
+        for f in files:
+            try:
+                name, _ = parse_package_filename(f.name)
+            except ValueError:
+                return False
+            if canonicalize_name(name) not in names:
+                return False
+        return True
+
+    def build_cache_inputs(self) -> Dict:
+        import platform
+
+        from . import __version__
+        from .cache import file_digest
+
+        def digest(path):
+            try:
+                return file_digest(path)
+            except OSError:
+                return None
+
+        return {
+            'lockfile': digest(self.lockfile) if self.lockfile else None,
+            'provided_manifest': digest(self.provided_manifest) if self.provided_manifest else None,
+            'sparpy': None if self.no_self else __version__,
+            'plugins': sorted(r.strip() for r in self.iter_requirements()),
+            'requirements_files': [digest(r) for r in self.requirements_files],
+            'constraints': [digest(c) for c in self.constraints],
+            'exclude_packages': sorted(set(self.exclude_packages)),
+            'extra_index_urls': list(self.extra_index_urls),
+            'find_links': [str(f) for f in self.find_links],
+            'no_index': bool(self.no_index),
+            'pre': bool(self.pre),
+            'build_wheels': bool(self.build_wheels),
+            'env': sorted([*self.env.items(),
+                           *[(k, v) for k, v in os.environ.items() if k.startswith('PIP_')]]),
+            'python': [sys.implementation.cache_tag, sys.platform, platform.machine()],
+        }
+
+    def build_pip_options(self):
+        pip_exec_params = []
 
         if self.force_download:
             pip_exec_params.append('--no-cache-dir')
@@ -189,24 +456,33 @@ class DownloadPlugins:
         if self.proxy:
             pip_exec_params.extend(['--proxy', self.proxy])
 
-        pip_exec_params.extend(chain.from_iterable([['--extra-index-url',
-                                                     u,
-                                                     '--trusted-host',
-                                                     urlparse(u).hostname]
-                                                    for u in self.extra_index_urls]))
+        for u in self.extra_index_urls:
+            pip_exec_params.extend(['--extra-index-url', u])
+            # Local indexes (file URLs) have no host
+            if urlparse(u).hostname:
+                pip_exec_params.extend(['--trusted-host', urlparse(u).hostname])
 
         pip_exec_params.extend(chain.from_iterable([['--find-links', str(r)] for r in self.find_links]))
         if self.no_index:
             pip_exec_params.append('--no-index')
 
-        if not self.no_self:
-            from . import __version__
-            pip_exec_params.append(f'sparpy=={__version__}')
-        if len(self.plugins):
-            pip_exec_params.extend(chain.from_iterable([PLUGIN_REGEX.findall(p)
-                                                        if ',' in p else [p, ] for p in self.plugins]))
-        if len(self.requirements_files):
-            pip_exec_params.extend(chain.from_iterable([['-r', str(r)] for r in self.requirements_files]))
+        return pip_exec_params
+
+    def build_command(self, requirements: Iterable[str] = None):
+        pip_exec_params = [sys.executable, '-m', 'pip', 'download']
+        pip_exec_params.extend(['-d', self.reqs_path])
+        pip_exec_params.extend(self.build_pip_options())
+
+        if requirements is not None:
+            pip_exec_params.extend(requirements)
+        else:
+            if not self.no_self:
+                from . import __version__
+                pip_exec_params.append(f'sparpy=={__version__}')
+            if len(self.plugins):
+                pip_exec_params.extend(self.iter_requirements())
+            if len(self.requirements_files):
+                pip_exec_params.extend(chain.from_iterable([['-r', str(r)] for r in self.requirements_files]))
         if len(self.constraints):
             pip_exec_params.extend(chain.from_iterable([['-c', str(c)] for c in self.constraints]))
 
@@ -214,13 +490,36 @@ class DownloadPlugins:
 
         return pip_exec_params
 
-    def download(self, debug=False):
-        if self.no_self and not len(self.plugins) and not len(self.requirements_files):
-            return None
+    def build_locked_command(self, requirements_file: Path):
+        pip_exec_params = [sys.executable, '-m', 'pip', 'download']
+        pip_exec_params.extend(['-d', self.reqs_path])
+        pip_exec_params.extend(self.build_pip_options())
+        pip_exec_params.extend(['--no-deps', '--require-hashes', '-r', str(requirements_file)])
+        pip_exec_params.extend(['--exists-action', 'i'])
 
-        pip_exec_params = self.build_command()
+        return pip_exec_params
 
-        self.logger.info('Downloading python plugins...')
+    def build_native_downloader(self):
+        from .fetcher import DEFAULT_INDEX_URL, NativeDownloader
+
+        index_urls = []
+        if not self.no_index:
+            index_urls.append(self.env.get('PIP_INDEX_URL', os.environ.get('PIP_INDEX_URL', DEFAULT_INDEX_URL)))
+            index_urls.extend(self.extra_index_urls)
+
+        return NativeDownloader(index_urls=index_urls,
+                                find_links=self.find_links,
+                                pre=self.pre,
+                                proxy=self.proxy,
+                                trusted_hosts=[urlparse(u).hostname for u in self.extra_index_urls],
+                                workers=self.download_workers,
+                                artifacts_dir=(self.resolution_cache.cache_dir / 'artifacts'
+                                               if self.resolution_cache.enabled else None),
+                                locks_dir=self.resolution_cache.locks_dir,
+                                lock_timeout=self.resolution_cache.lock_timeout,
+                                logger=self.logger)
+
+    def _run_pip(self, pip_exec_params, debug=False):
         self.logger.debug(' '.join(pip_exec_params))
 
         env = os.environ.copy()
@@ -234,22 +533,394 @@ class DownloadPlugins:
         if process.returncode != 0:
             raise RuntimeError('Download packages failed')
 
-        [p.unlink()
-         for p in Path(self.reqs_path).glob('*.whl')
-         if p.is_file() and self.is_exclude(p)]
+    def download(self, debug=False):
+        if not self.lockfile and self.no_self and not len(self.plugins) and not len(self.requirements_files):
+            return None
 
-        if self.convert_to_zip:
-            [_convert_to_zip(p.resolve())
+        if not self.resolution_cache.enabled:
+            self._download(debug=debug)
+            return self._finish_download()
+
+        import time
+
+        requested = time.time()
+        pinned = self.is_pinned()
+        cache_inputs = self.build_cache_inputs()
+        cache_key = self.resolution_cache.build_key(cache_inputs)
+
+        if self.resolution_cache.is_cacheable(pinned) and not self.force_download:
+            if self._restore_cached(self.resolution_cache.get(cache_key, pinned=pinned), cache_key):
+                return self._finish_download()
+
+        # Only one process resolves same inputs at a time, the rest wait for it and reuse its result
+        with self.resolution_cache.lock(cache_key) as lock:
+            if lock.waited:
+                self.logger.info('Waited for another sparpy process resolving same python plugins')
+            if self._restore_cached(self.resolution_cache.get(cache_key, fresh_since=requested), cache_key):
+                return self._finish_download()
+
+            self._download(debug=debug)
+
+            from .cache import iter_package_files, record_cache_lookup
+
+            record_cache_lookup(self.resolution_cache.cache_dir, 'resolutions', False)
+            files = list(iter_package_files(Path(self.reqs_path)))
+            self.resolution_cache.store(cache_key,
+                                        files,
+                                        inputs=cache_inputs,
+                                        pinned=self.is_fully_pinned(files))
+
+        self._bound_cache()
+        return self._finish_download()
+
+    def _bound_cache(self):
+        from .maintenance import CacheMaintenance
+
+        try:
+            CacheMaintenance(self.config, logger=self.logger).maybe_gc()
+        except (OSError, RuntimeError) as ex:
+            self.logger.warning(f'Unable to bound sparpy cache: {ex}')
+
+    def _restore_cached(self, files, cache_key) -> bool:
+        if files is None:
+            return False
+
+        from .cache import record_cache_lookup
+
+        try:
+            size = sum(f.stat().st_size for f in files)
+            with span('download.cache_restore'):
+                self.resolution_cache.restore(files, Path(self.reqs_path))
+        except OSError as ex:
+            # Entry evicted meanwhile
+            self.logger.debug(f'Unable to restore resolution cache entry {cache_key}: {ex}')
+            return False
+
+        self.logger.info('Using cached python plugins...')
+        self.logger.debug(f'Resolution cache entry: {cache_key}')
+        record_cache_lookup(self.resolution_cache.cache_dir, 'resolutions', True, size=size)
+        return True
+
+    def _download(self, debug=False):
+        if self.lockfile:
+            with span('download.locked'):
+                self.download_locked(debug=debug)
+        else:
+            self.download_resolved(debug=debug)
+
+    def download_resolved(self, debug=False):
+        self.logger.info('Downloading python plugins...')
+
+        with span('download.resolve', engine=self.download_engine):
+            if self.download_engine == NATIVE_ENGINE:
+                from .fetcher import NativeDownloadError
+
+                try:
+                    self.download_native(debug=debug)
+                except NativeDownloadError as ex:
+                    self.logger.warning(f'Native download failed, falling back to pip: {ex}')
+                    self.clean_reqs_path()
+                    self.download_pip(debug=debug)
+            else:
+                self.download_pip(debug=debug)
+
+        self.build_sdist_wheels(debug=debug)
+
+        with span('download.filter'):
+            [p.unlink()
              for p in Path(self.reqs_path).glob('*.whl')
-             if p.is_file()]
+             if p.is_file() and self.is_exclude(p)]
+
+    def download_pip(self, debug=False):
+        """
+        Downloads packages using pip. When there are excluded or provided
+        packages, dependencies are resolved first without downloading
+        anything, so those packages and dependencies only required by them
+        are pruned before downloading the rest.
+        """
+        if len(self.exclude_packages) or self.provided_manifest:
+            from .resolution import pip_supports_report
+
+            try:
+                import packaging  # noqa
+            except ImportError:
+                self.logger.debug('Package `packaging` is not available, excluded packages are removed after download')
+            else:
+                if pip_supports_report():
+                    return self.download_pruned(debug=debug)
+                self.logger.debug('Pip does not support installation reports, '
+                                  'excluded packages are removed after download')
+
+        self._run_pip(self.build_command(), debug=debug)
+
+    def build_report_command(self, report_file: Path):
+        pip_exec_params = self.build_command()
+        pip_exec_params[3:6] = ['install', '--dry-run', '--ignore-installed', '--quiet',
+                                '--report', str(report_file)]
+
+        return pip_exec_params
+
+    def download_pruned(self, debug=False):
+        from shutil import rmtree
+        from tempfile import mkdtemp
+
+        from .resolution import load_install_report, prune_excluded
+
+        tmp_dir = Path(mkdtemp(prefix=self.temp_dir_prefix))
+        try:
+            report_file = tmp_dir / 'report.json'
+            self._run_pip(self.build_report_command(report_file), debug=debug)
+
+            packages, self.pruned_packages = prune_excluded(load_install_report(report_file),
+                                                            self.exclude_packages,
+                                                            provided=self.provided,
+                                                            requirements=self.iter_requirements())
+            self.log_pruned_packages()
+
+            if not packages:
+                return
+
+            requirements_file = tmp_dir / 'requirements.txt'
+            if all(p.sha256 for p in packages):
+                requirements_file.write_text('\n'.join(p.as_requirement() for p in packages) + '\n')
+                self._run_pip(self.build_locked_command(requirements_file), debug=debug)
+            else:
+                requirements_file.write_text('\n'.join(f'{p.name}=={p.version}' for p in packages) + '\n')
+                pip_exec_params = self.build_locked_command(requirements_file)
+                pip_exec_params.remove('--require-hashes')
+                self._run_pip(pip_exec_params, debug=debug)
+        finally:
+            rmtree(str(tmp_dir), ignore_errors=True)
+
+    def log_pruned_packages(self):
+        if not self.pruned_packages:
+            return
+
+        self.logger.info(f'Pruned {len(self.pruned_packages)} python packages from resolution:')
+        for name, reason in sorted(self.pruned_packages.items()):
+            self.logger.info(f'  {name}: {reason}')
+
+    def download_native(self, debug=False):
+        """
+        Resolves and downloads wheels using native downloader. Requirements
+        which are only available as source distributions are downloaded,
+        along with their dependencies, using pip.
+        """
+        from .fetcher import parse_requirements_file
+
+        requirements = []
+        constraints = []
+        if not self.no_self:
+            from . import __version__
+            requirements.append(f'sparpy=={__version__}')
+        requirements.extend(self.iter_requirements())
+        for r in self.requirements_files:
+            parse_requirements_file(r, requirements, constraints)
+        for c in self.constraints:
+            parse_requirements_file(c, constraints, constraints)
+
+        downloader = self.build_native_downloader()
+        try:
+            sdists = downloader.download(requirements,
+                                         Path(self.reqs_path),
+                                         constraints=constraints,
+                                         exclude=self.exclude_packages,
+                                         provided=self.provided)
+        finally:
+            downloader.close()
+
+        from .resolution import EXCLUDED, PROVIDED
+
+        self.pruned_packages = {n: EXCLUDED for n in downloader.excluded}
+        self.pruned_packages.update({n: f'{PROVIDED} ({self.provided.get(n).version})' for n in downloader.provided})
+        self.log_pruned_packages()
+
+        if sdists:
+            self.download_sdists(sdists, downloader.pinned, debug=debug)
+
+    def download_sdists(self, sdists: List[str], pinned: List[str], debug=False):
+        """
+        Downloads source distributions using pip. Their dependencies are
+        unknown until pip reads their metadata, so pip resolves them, but
+        packages already downloaded by native downloader are pinned to the
+        selected versions.
+        """
+        from shutil import rmtree
+        from tempfile import mkdtemp
+
+        tmp_dir = Path(mkdtemp(prefix=self.temp_dir_prefix))
+        try:
+            pip_exec_params = self.build_command(requirements=sdists)
+            if pinned:
+                constraints_file = tmp_dir / 'constraints.txt'
+                constraints_file.write_text('\n'.join(pinned) + '\n')
+                pip_exec_params.extend(['-c', str(constraints_file)])
+            self._run_pip(pip_exec_params, debug=debug)
+        finally:
+            rmtree(str(tmp_dir), ignore_errors=True)
+
+    def clean_reqs_path(self):
+        """
+        Removes packages downloaded, so packages downloaded by another engine
+        are not mixed with them.
+        """
+        from .cache import iter_package_files
+
+        [p.unlink() for p in iter_package_files(Path(self.reqs_path))]
+
+    def download_locked(self, debug=False):
+        """
+        Downloads artifacts listed on lockfile without resolving dependencies.
+        Downloads are done concurrently, by native downloader or split on
+        several pip processes, and every artifact is verified against its hash.
+        """
+        from .lock import Lockfile
+
+        lock = Lockfile.load(self.lockfile)
+        excluded = {canonicalize_name(p) for p in self.exclude_packages}
+        reqs_path = Path(self.reqs_path)
+
+        if self.provided is not None:
+            excluded.update(canonicalize_name(a.name) for a in lock.artifacts
+                            if self.provided.satisfies(a.name, f'=={a.version}'))
+
+        artifacts = [a for a in lock.artifacts
+                     if canonicalize_name(a.name) not in excluded
+                     and not a.verify(reqs_path / a.filename)]
+
+        self.logger.info(f'Downloading {len(artifacts)} locked python packages...')
+
+        if len(artifacts) and self.download_engine == NATIVE_ENGINE:
+            from .fetcher import NativeDownloadError
+
+            downloader = self.build_native_downloader()
+            try:
+                downloader.download_artifacts(artifacts, reqs_path)
+                artifacts = []
+            except NativeDownloadError as ex:
+                self.logger.warning(f'Native download failed, falling back to pip: {ex}')
+                artifacts = [a for a in artifacts if not a.verify(reqs_path / a.filename)]
+            finally:
+                downloader.close()
+
+        if len(artifacts):
+            workers = max(1, min(self.download_workers, len(artifacts)))
+            chunks = [artifacts[i::workers] for i in range(workers)]
+
+            env = os.environ.copy()
+            if self.env:
+                env.update(self.env)
+
+            import signal
+            from shutil import rmtree
+            from tempfile import mkdtemp
+
+            processes = []
+
+            # Signals are forwarded to every pip process, so none of them is orphaned
+            def send_signal(sig, _=None):
+                for p in processes:
+                    p.send_signal(sig)
+
+            tmp_dir = Path(mkdtemp(prefix=self.temp_dir_prefix))
+            original_sigint_handler = signal.getsignal(signal.SIGINT)
+            original_sigterm_handler = signal.getsignal(signal.SIGTERM)
+            try:
+                for i, chunk in enumerate(chunks):
+                    requirements_file = tmp_dir / f'requirements-{i}.txt'
+                    requirements_file.write_text('\n'.join(a.as_requirement() for a in chunk) + '\n')
+
+                    pip_exec_params = self.build_locked_command(requirements_file)
+                    self.logger.debug(' '.join(pip_exec_params))
+
+                    processes.append(ProcessManager(pip_exec_params, pass_through=debug, env=env,
+                                                    handle_signals=False))
+
+                signal.signal(signal.SIGINT, send_signal)
+                signal.signal(signal.SIGTERM, send_signal)
+
+                for process in processes:
+                    process.start_process()
+
+                for process in processes:
+                    process.wait()
+            finally:
+                signal.signal(signal.SIGINT, original_sigint_handler)
+                signal.signal(signal.SIGTERM, original_sigterm_handler)
+                rmtree(str(tmp_dir), ignore_errors=True)
+
+            if any(p.returncode != 0 for p in processes):
+                raise RuntimeError('Download packages failed')
+
+        for a in lock.artifacts:
+            if canonicalize_name(a.name) in excluded:
+                continue
+            if not a.verify(reqs_path / a.filename):
+                raise RuntimeError(f'Package {a.filename} does not match lockfile hash')
+
+        self.build_sdist_wheels(debug=debug)
+
+    def build_sdist_wheels(self, debug=False):
+        """
+        Replaces downloaded source distributions by wheels built from them, as
+        only wheels, zip and egg files are shipped. Built wheels are cached.
+        """
+        if not self.build_wheels:
+            return
+
+        from .wheels import WheelBuilder, iter_sdists
+
+        if not any(iter_sdists(Path(self.reqs_path))):
+            return
+
+        env = os.environ.copy()
+        if self.env:
+            env.update(self.env)
+
+        builder = WheelBuilder(pip_options=self.build_pip_options(),
+                               cache_dir=self.resolution_cache.cache_dir if self.resolution_cache.enabled else None,
+                               workers=self.build_workers,
+                               env=env,
+                               lock_timeout=self.resolution_cache.lock_timeout,
+                               temp_dir_prefix=self.temp_dir_prefix,
+                               logger=self.logger)
+        with span('download.build_wheels'):
+            built = builder.build_all(Path(self.reqs_path), debug=debug)
+
+        for sdist, wheel in built.items():
+            self.logger.debug(f'Source distribution {sdist} replaced by {wheel.name}')
+
+    def _finish_download(self):
+        if self.convert_to_zip:
+            with span('download.convert_to_zip'):
+                [_convert_to_zip(p.resolve())
+                 for p in Path(self.reqs_path).glob('*.whl')
+                 if p.is_file()]
+
+            if self.compile_bytecode:
+                from .bytecode import compile_archive
+
+                self.logger.info('Compiling python packages...')
+                with span('download.compile_bytecode'):
+                    [compile_archive(p,
+                                     drop_sources=self.drop_sources,
+                                     optimize=self.bytecode_optimize,
+                                     cache_dir=self.bytecode_cache_dir,
+                                     logger=self.logger)
+                     for p in Path(self.reqs_path).glob('*.zip')
+                     if p.is_file()]
 
         return self.reqs_path
 
     def is_exclude(self, package_file: Path) -> bool:
         from pkginfo import Wheel
-        if len(self.exclude_packages) == 0:
+        if len(self.exclude_packages) == 0 and not self.provided_manifest:
             return False
 
         w = Wheel(str(package_file))
 
+        if self.provided is not None and self.provided.get(w.name) is not None \
+                and self.provided.get(w.name).version == w.version:
+            return True
+
         return w.name in self.exclude_packages
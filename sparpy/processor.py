@@ -1,33 +1,56 @@
 import signal
 import sys
-from io import StringIO, TextIOWrapper
 from subprocess import PIPE, Popen
 from typing import Dict, List, Optional
 
+CHUNK_SIZE = 64 * 1024
+MAX_MEMORY_OUTPUT = 1024 * 1024
+
+
+def copy_stream(src, dst, chunk_size: int = CHUNK_SIZE):
+    read = getattr(src, 'read1', src.read)
+    while True:
+        data = read(chunk_size)
+        if len(data) == 0:
+            break
+        dst.write(data)
+
 
 class ProcessManager:
 
     def __init__(self,
                  params: List[str],
                  env: Dict = None,
-                 pass_through=False):
+                 pass_through=False,
+                 max_memory_output: int = MAX_MEMORY_OUTPUT,
+                 handle_signals: bool = True,
+                 stdout=None,
+                 stderr=None):
 
         self._current_process: Optional[Popen] = None
 
         self._params = params
         self._env = env
+        self._pass_through = pass_through
+        self._handle_signals = handle_signals
+        self._copy_futures = []
 
         if pass_through:
             self._stdin_stream = sys.stdin
-            self._stdout_stream = sys.stdout
-            self._stderr_stream = sys.stderr
+            self._stdout_stream = stdout or sys.stdout
+            self._stderr_stream = stderr or sys.stderr
         else:
+            # Output is kept in memory up to `max_memory_output` bytes, then it is spilled to disk
+            from tempfile import SpooledTemporaryFile
+
             self._stdin_stream = sys.stdin
-            self._stdout_stream = StringIO()
-            self._stderr_stream = StringIO()
+            self._stdout_stream = SpooledTemporaryFile(max_size=max_memory_output, mode='w+b')
+            self._stderr_stream = SpooledTemporaryFile(max_size=max_memory_output, mode='w+b')
 
-        self._original_sigint_handler = signal.getsignal(signal.SIGINT)
-        self._original_sigterm_handler = signal.getsignal(signal.SIGTERM)
+        # Signal handlers could only be set on main thread
+        if handle_signals:
+            self._original_sigint_handler = signal.getsignal(signal.SIGINT)
+            self._original_sigterm_handler = signal.getsignal(signal.SIGTERM)
 
     def send_signal(self, sig, _=None):
         if self._current_process:
@@ -37,7 +60,7 @@ class ProcessManager:
 
         stdout = self._stdout_stream
         stderr = self._stderr_stream
-        if isinstance(self._stdout_stream, StringIO):
+        if not self._pass_through:
             stdout = PIPE
             stderr = PIPE
 
@@ -47,26 +70,21 @@ class ProcessManager:
                                       stdin=self._stdin_stream,
                                       env=self._env)
 
-        signal.signal(signal.SIGTERM, self.send_signal)
-        signal.signal(signal.SIGINT, self.send_signal)
+        if self._handle_signals:
+            signal.signal(signal.SIGTERM, self.send_signal)
+            signal.signal(signal.SIGINT, self.send_signal)
 
         if stdout == PIPE:
             from concurrent.futures.thread import ThreadPoolExecutor
             pool = ThreadPoolExecutor(max_workers=2)
 
-            def copy_stream(src, dst, buffer=1):
-                while True:
-                    data = src.read(buffer)
-                    if len(data) == 0:
-                        break
-                    dst.write(data)
-
-            pool.submit(copy_stream,
-                        TextIOWrapper(self._current_process.stdout),
-                        self._stdout_stream)
-            pool.submit(copy_stream,
-                        TextIOWrapper(self._current_process.stderr),
-                        self._stderr_stream)
+            self._copy_futures = [pool.submit(copy_stream,
+                                              self._current_process.stdout,
+                                              self._stdout_stream),
+                                  pool.submit(copy_stream,
+                                              self._current_process.stderr,
+                                              self._stderr_stream)]
+            pool.shutdown(wait=False)
 
     def __enter__(self):
         self.start_process()
@@ -82,17 +100,29 @@ class ProcessManager:
     def returncode(self) -> int:
         return self._current_process.returncode
 
+    @staticmethod
+    def _replay(src, dst):
+        src.seek(0)
+        dst.flush()
+        copy_stream(src, getattr(dst, 'buffer', dst))
+        dst.flush()
+
     def wait(self, timeout=None) -> int:
         result = self._current_process.wait(timeout=timeout)
 
-        if self._current_process.returncode != 0:
-            if isinstance(self._stdout_stream, StringIO):
-                self._stdout_stream.seek(0)
-                sys.stdout.write(self._stdout_stream.read())
-            if isinstance(self._stderr_stream, StringIO):
-                self._stderr_stream.seek(0)
-                sys.stderr.write(self._stderr_stream.read())
+        for future in self._copy_futures:
+            future.result()
+        self._copy_futures = []
+
+        if not self._pass_through and not self._stdout_stream.closed:
+            if self._current_process.returncode != 0:
+                self._replay(self._stdout_stream, sys.stdout)
+                self._replay(self._stderr_stream, sys.stderr)
+
+            self._stdout_stream.close()
+            self._stderr_stream.close()
 
-        signal.signal(signal.SIGTERM, self._original_sigterm_handler)
-        signal.signal(signal.SIGINT, self._original_sigint_handler)
+        if self._handle_signals:
+            signal.signal(signal.SIGTERM, self._original_sigterm_handler)
+            signal.signal(signal.SIGINT, self._original_sigint_handler)
         return result
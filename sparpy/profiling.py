@@ -0,0 +1,164 @@
+import os
+import sys
+import threading
+from collections import Counter
+from functools import wraps
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Callable, Optional
+
+CPROFILE_PROFILER = 'cprofile'
+SAMPLING_PROFILER = 'sampling'
+PROFILERS = (CPROFILE_PROFILER, SAMPLING_PROFILER)
+
+WORKERS_PROFILE_DIR = 'workers'
+
+DEFAULT_SAMPLING_INTERVAL = 0.005
+
+
+def default_profile_dir() -> Path:
+    """
+    Profiles are written next to container logs on YARN (`LOG_DIRS`), so they
+    are aggregated with them, or on current directory otherwise.
+    """
+    log_dirs = [d for d in os.environ.get('LOG_DIRS', '').split(',') if d]
+    if log_dirs:
+        return Path(log_dirs[0])
+    return Path.cwd()
+
+
+class CProfileProfiler:
+    """
+    Deterministic profiler. Stats are written on pstats format.
+    """
+
+    extension = 'pstats'
+
+    def __init__(self):
+        import cProfile
+
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def write(self, path: Path):
+        self._profile.dump_stats(str(path))
+
+
+class SamplingProfiler:
+    """
+    Wall clock sampling profiler. A background thread samples stack of the
+    profiled thread every `interval` seconds, so time waiting on I/O (like
+    collecting data from JVM) is also accounted. Stacks are written on
+    collapsed format, ready for flame graph tools.
+    """
+
+    extension = 'collapsed'
+
+    def __init__(self, interval: float = DEFAULT_SAMPLING_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+
+        self._thread_id = None
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    @staticmethod
+    def _stack(frame) -> str:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                self.samples[self._stack(frame)] += 1
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._sampler = threading.Thread(target=self._sample, name='sparpy-profiler', daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler.join()
+
+    def write(self, path: Path):
+        with Path(path).open('w') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f'{stack} {count}\n')
+
+
+def build_profiler(profiler: str):
+    if profiler == CPROFILE_PROFILER:
+        return CProfileProfiler()
+    if profiler == SAMPLING_PROFILER:
+        return SamplingProfiler()
+    raise RuntimeError(f'Invalid profiler: {profiler}')
+
+
+def dump_spark_profiles(output_dir: Path, logger: Logger = None) -> Optional[Path]:
+    """
+    Collects python workers profiles of active spark context, when python
+    profiling is enabled.
+    """
+    logger = logger or getLogger(__name__)
+
+    if 'pyspark' not in sys.modules:
+        return None
+
+    from pyspark import SparkContext
+
+    sc = SparkContext._active_spark_context
+    if sc is None or getattr(sc, 'profiler_collector', None) is None:
+        return None
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sc.dump_profiles(str(output_dir))
+    logger.info(f'Python workers profiles written on {output_dir}')
+    return output_dir
+
+
+def profile_callable(fn: Callable,
+                     profiler: str,
+                     name: str,
+                     output_dir: Path = None,
+                     logger: Logger = None) -> Callable:
+    """
+    Wraps a callable, so it runs under a profiler. Profile is written on
+    `output_dir` when it finishes, even when it fails or exits.
+    """
+    logger = logger or getLogger(__name__)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        directory = Path(output_dir) if output_dir else default_profile_dir()
+        p = build_profiler(profiler)
+
+        p.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            p.stop()
+
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+                profile_file = directory / f'sparpy-{name}-{os.getpid()}.{p.extension}'
+                p.write(profile_file)
+                logger.info(f'Driver profile written on {profile_file}')
+
+                dump_spark_profiles(directory / WORKERS_PROFILE_DIR, logger=logger)
+            except OSError as ex:
+                logger.warning(f'Unable to write profile: {ex}')
+
+    return wrapper
@@ -0,0 +1,166 @@
+import json
+import subprocess
+import sys
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from .packages import canonicalize_name
+
+# Runs on the python environment to capture, which could be an old interpreter
+CAPTURE_SCRIPT = '''
+import json, platform, sys, sysconfig
+
+def wheel_tags(text):
+    return [l.split(':', 1)[1].strip() for l in (text or '').splitlines() if l.startswith('Tag:')]
+
+packages = {}
+try:
+    try:
+        from importlib.metadata import distributions
+    except ImportError:
+        from importlib_metadata import distributions
+
+    for dist in distributions():
+        name = dist.metadata['Name']
+        if name and name.lower() not in packages:
+            packages[name.lower()] = {'name': name,
+                                      'version': dist.version,
+                                      'tags': wheel_tags(dist.read_text('WHEEL'))}
+except ImportError:
+    import pkg_resources
+
+    for dist in pkg_resources.working_set:
+        tags = wheel_tags(dist.get_metadata('WHEEL')) if dist.has_metadata('WHEEL') else []
+        packages.setdefault(dist.project_name.lower(), {'name': dist.project_name,
+                                                        'version': dist.version,
+                                                        'tags': tags})
+
+json.dump({'environment': {'python': platform.python_version(),
+                           'implementation': platform.python_implementation(),
+                           'platform': sysconfig.get_platform(),
+                           'executable': sys.executable},
+           'packages': sorted(packages.values(), key=lambda p: p['name'].lower())},
+          sys.stdout)
+'''
+
+
+class ProvidedPackage(NamedTuple):
+    name: str
+    version: str
+    tags: List[str] = []
+
+
+class ProvidedManifest:
+    """
+    Distributions already installed on executors python environment. Resolved
+    requirements satisfied by them are not downloaded.
+    """
+
+    VERSION = 1
+
+    def __init__(self, packages: Iterable[ProvidedPackage], environment: Dict[str, str] = None):
+        self.packages: Dict[str, ProvidedPackage] = {canonicalize_name(p.name): p for p in packages}
+        self.environment = dict(environment or {})
+        self._supported_tags: Optional[Set[str]] = None
+
+    @classmethod
+    def capture(cls, python: str = None) -> 'ProvidedManifest':
+        python = python or sys.executable
+        try:
+            result = subprocess.run([python, '-c', CAPTURE_SCRIPT], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as ex:
+            raise RuntimeError(f'Unable to run {python}: {ex}')
+
+        if result.returncode != 0:
+            raise RuntimeError(f'Unable to capture provided packages from {python}: '
+                               f'{result.stderr.decode(errors="replace").strip()}')
+
+        return cls.from_dict(json.loads(result.stdout.decode()))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProvidedManifest':
+        return cls(packages=[ProvidedPackage(name=p['name'], version=p['version'], tags=list(p.get('tags', [])))
+                             for p in data.get('packages', [])],
+                   environment=data.get('environment'))
+
+    @classmethod
+    def load(cls, path: Path) -> 'ProvidedManifest':
+        try:
+            with Path(path).open('r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as ex:
+            raise RuntimeError(f'Invalid provided manifest {path}: {ex}')
+
+        if data.get('version', cls.VERSION) > cls.VERSION:
+            raise RuntimeError(f'Unsupported provided manifest version: {data["version"]}')
+
+        return cls.from_dict(data)
+
+    def to_dict(self) -> Dict:
+        return {'version': self.VERSION,
+                'environment': self.environment,
+                'packages': [p._asdict() for p in sorted(self.packages.values(), key=lambda p: p.name.lower())]}
+
+    def save(self, path: Path):
+        with Path(path).open('w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def get(self, name: str) -> Optional[ProvidedPackage]:
+        return self.packages.get(canonicalize_name(name))
+
+    def is_compatible(self, package: ProvidedPackage) -> bool:
+        """
+        Whether a provided package was built for the interpreter and platform
+        packages are resolved for. Packages without wheel tags (installed from
+        source) are considered compatible.
+        """
+        if not package.tags:
+            return True
+
+        from packaging.tags import parse_tag, sys_tags
+
+        if self._supported_tags is None:
+            self._supported_tags = {str(t) for t in sys_tags()}
+
+        try:
+            return any(str(t) in self._supported_tags for tag in package.tags for t in parse_tag(tag))
+        except ValueError:
+            return False
+
+    def satisfies(self, name: str, specifier='', extras: Iterable[str] = ()) -> bool:
+        """
+        Whether a requirement is satisfied by a provided package. Requirements
+        with extras are never satisfied, as extra dependencies could be missing
+        on provided environment. Neither are packages built for another
+        interpreter or platform.
+        """
+        from packaging.specifiers import SpecifierSet
+
+        package = self.get(name)
+        if package is None or len(list(extras)) or not self.is_compatible(package):
+            return False
+
+        if not isinstance(specifier, SpecifierSet):
+            specifier = SpecifierSet(specifier or '')
+        return specifier.contains(package.version, prereleases=True)
+
+    def check_environment(self, logger: Logger = None):
+        logger = logger or getLogger(__name__)
+
+        python = self.environment.get('python')
+        current = '.'.join(str(v) for v in sys.version_info[:2])
+        if python and not (python == current or python.startswith(f'{current}.')):
+            logger.warning(f'Provided manifest was captured on python {python}, '
+                           f'but packages are resolved for python {current}')
+
+        import platform
+        import sysconfig
+
+        for key, current in (('implementation', platform.python_implementation()),
+                             ('platform', sysconfig.get_platform())):
+            captured = self.environment.get(key)
+            if captured and captured != current:
+                logger.warning(f'Provided manifest was captured on {key} {captured}, '
+                               f'but packages are resolved for {key} {current}. '
+                               'Packages built for another platform are not considered provided')
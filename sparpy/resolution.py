@@ -0,0 +1,145 @@
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .packages import canonicalize_name
+
+EXCLUDED = 'excluded'
+PROVIDED = 'provided by environment'
+ONLY_REQUIRED_BY_PRUNED = 'only required by pruned packages'
+
+# First pip version supporting `pip install --dry-run --report`
+REPORT_PIP_VERSION = (22, 2)
+
+
+class ResolvedPackage(NamedTuple):
+    name: str
+    version: str
+    requires: List[str] = []
+    url: Optional[str] = None
+    sha256: Optional[str] = None
+    requested: bool = False
+    extras: List[str] = []
+
+    @property
+    def key(self) -> str:
+        return canonicalize_name(self.name)
+
+    def as_requirement(self) -> str:
+        if self.sha256:
+            return f'{self.name}=={self.version} --hash=sha256:{self.sha256}'
+        return f'{self.name}=={self.version}'
+
+
+def pip_supports_report() -> bool:
+    try:
+        from importlib.metadata import version
+    except ImportError:  # pragma: no cover
+        from importlib_metadata import version
+
+    try:
+        pip_version = tuple(int(v) for v in version('pip').split('.')[:2])
+    except Exception:
+        return False
+    return pip_version >= REPORT_PIP_VERSION
+
+
+def load_install_report(path: Path) -> List[ResolvedPackage]:
+    """
+    Reads packages from a pip installation report (`pip install --report`).
+    """
+    try:
+        with Path(path).open('r') as f:
+            report = json.load(f)
+    except (OSError, ValueError) as ex:
+        raise RuntimeError(f'Invalid pip installation report {path}: {ex}')
+
+    packages = []
+    for item in report.get('install', []):
+        metadata = item.get('metadata', {})
+        download_info = item.get('download_info', {})
+        hashes = download_info.get('archive_info', {}).get('hashes', {})
+
+        packages.append(ResolvedPackage(name=metadata['name'],
+                                        version=metadata['version'],
+                                        requires=list(metadata.get('requires_dist', [])),
+                                        url=download_info.get('url'),
+                                        sha256=hashes.get('sha256'),
+                                        requested=bool(item.get('requested')),
+                                        extras=list(item.get('requested_extras', []))))
+    return packages
+
+
+def prune_excluded(packages: Iterable[ResolvedPackage],
+                   excluded: Iterable[str],
+                   provided=None,
+                   requirements: Iterable[str] = ()) -> Tuple[List[ResolvedPackage], Dict[str, str]]:
+    """
+    Walks dependency graph from requested packages skipping excluded ones and
+    the ones satisfied by `provided` manifest. Returns packages which are
+    still required and pruned packages with the reason they were pruned:
+    excluded, provided by environment or only required by pruned packages.
+    Requested packages are checked against their `requirements`, or against
+    their resolved version.
+    """
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.specifiers import SpecifierSet
+
+    packages = {p.key: p for p in packages}
+    excluded = {canonicalize_name(e) for e in excluded}
+
+    root_specs: Dict[str, SpecifierSet] = {}
+    for r in requirements:
+        try:
+            req = Requirement(r)
+        except InvalidRequirement:
+            continue
+        name = canonicalize_name(req.name)
+        root_specs[name] = root_specs.get(name, SpecifierSet()) & req.specifier
+
+    visited_extras: Dict[str, Set[str]] = {}
+    provided_names: Set[str] = set()
+    pending = [(p.key, {''} | set(p.extras), root_specs.get(p.key, SpecifierSet(f'=={p.version}')))
+               for p in packages.values() if p.requested]
+
+    while pending:
+        name, extras, specifier = pending.pop()
+        if name in excluded or name not in packages:
+            continue
+
+        if name not in visited_extras and provided is not None and \
+                provided.satisfies(name, specifier, extras=extras - {''}):
+            provided_names.add(name)
+            continue
+
+        extras = extras - visited_extras.get(name, set())
+        if not extras and name in visited_extras:
+            continue
+        visited_extras.setdefault(name, set()).update(extras)
+
+        for dep in packages[name].requires:
+            try:
+                req = Requirement(dep)
+            except InvalidRequirement:
+                continue
+
+            if req.marker is None:
+                if '' not in extras:
+                    continue
+            elif not any(req.marker.evaluate({'extra': e}) and (e == '' or not req.marker.evaluate({'extra': ''}))
+                         for e in extras):
+                continue
+
+            pending.append((canonicalize_name(req.name), {''} | set(req.extras), req.specifier))
+
+    def reason(key):
+        if key in excluded:
+            return EXCLUDED
+        if key in provided_names:
+            return f'{PROVIDED} ({provided.get(key).version})'
+        return ONLY_REQUIRED_BY_PRUNED
+
+    kept = [p for k, p in packages.items() if k in visited_extras]
+    pruned = {p.name: reason(k) for k, p in packages.items() if k not in visited_extras}
+
+    return kept, pruned
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
-from sparpy.cli import run_sparpy_runner
-
 if __name__ == '__main__':
+    from sparpy.bootstrap import run_plugin_from_manifest
+
+    run_plugin_from_manifest()
+
+    from sparpy.cli import run_sparpy_runner
+
     run_sparpy_runner()
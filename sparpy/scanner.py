@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import re
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .packages import canonicalize_name, parse_package_filename
+
+PY_FILES_EXTENSIONS = ('.egg', '.whl', '.zip')
+
+HIGHEST_PRECEDENCE = 'highest'
+FIRST_PRECEDENCE = 'first'
+NO_PRECEDENCE = 'none'
+PRECEDENCES = (HIGHEST_PRECEDENCE, FIRST_PRECEDENCE, NO_PRECEDENCE)
+
+VERSION_PART_REGEX = re.compile(r'\d+|[a-z]+')
+# Public version identifiers, as defined by PEP 440
+VERSION_REGEX = re.compile(r'^v?(?:\d+!)?\d+(?:\.\d+)*'
+                           r'(?:[._-]?(?:a|b|c|rc|alpha|beta|pre|preview)[._-]?\d*)?'
+                           r'(?:[._-]?(?:post|rev|r)[._-]?\d*)?'
+                           r'(?:[._-]?dev[._-]?\d*)?'
+                           r'(?:\+[a-z0-9]+(?:[._-][a-z0-9]+)*)?$', re.IGNORECASE)
+
+
+def parse_distribution(filename: str) -> Optional[Tuple[str, str]]:
+    """
+    Returns distribution name and version of a wheel, egg or source
+    distribution filename, or None when it is not named as a distribution,
+    like plain zip files of modules.
+    """
+    try:
+        name, version = parse_package_filename(filename)
+    except ValueError:
+        return None
+
+    if not VERSION_REGEX.match(version):
+        return None
+    return name, version
+
+
+def version_key(version: str):
+    """
+    Sort key of a version. PEP 440 ordering is used when `packaging` is
+    available.
+    """
+    try:
+        from packaging.version import InvalidVersion, Version
+    except ImportError:
+        pass
+    else:
+        try:
+            return 1, Version(version), ()
+        except InvalidVersion:
+            pass
+
+    return 0, None, tuple((0, int(p), '') if p.isdigit() else (-1, 0, p)
+                          for p in VERSION_PART_REGEX.findall(version.lower()))
+
+
+class ReqsScanner:
+    """
+    Looks for python packages on requirements paths walking every directory
+    only once. A manifest of every directory tree could be stored on cache,
+    and it is reused while none of its directories changes. Packages could
+    be deduplicated by distribution name, keeping highest version or first
+    one found. Files not named as distributions are never deduplicated.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self,
+                 cache_dir: Path = None,
+                 precedence: str = NO_PRECEDENCE,
+                 logger: Logger = None):
+        if precedence not in PRECEDENCES:
+            raise RuntimeError(f'Invalid requirements precedence: {precedence}')
+
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.precedence = precedence
+        self.logger = logger or getLogger(__name__)
+
+    @staticmethod
+    def walk(root: str) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Returns package files found on `root` tree, relative to it, and
+        modification times of every directory. Root must be a resolved path.
+        """
+        files = []
+        dirs = {}
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            directory = os.path.join(root, rel_dir) if rel_dir else root
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+                dirs[rel_dir] = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+
+            subdirs = []
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(rel_path)
+                    elif entry.name.endswith(PY_FILES_EXTENSIONS) and entry.is_file():
+                        # Symbolic links are stored resolved, as absolute paths
+                        files.append(os.path.realpath(entry.path) if entry.is_symlink() else rel_path)
+                except OSError:
+                    continue
+            pending.extend(reversed(subdirs))
+
+        return files, dirs
+
+    def _manifest_file(self, root: str) -> Path:
+        return self.cache_dir / f'{hashlib.sha256(root.encode("utf-8", errors="surrogateescape")).hexdigest()}.json'
+
+    def _load_manifest(self, root: str) -> Optional[List[str]]:
+        try:
+            with self._manifest_file(root).open('r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get('version') != self.MANIFEST_VERSION or manifest.get('root') != root:
+            return None
+
+        for rel_dir, mtime in manifest['dirs'].items():
+            try:
+                if os.stat(os.path.join(root, rel_dir) if rel_dir else root).st_mtime_ns != mtime:
+                    return None
+            except OSError:
+                return None
+
+        return manifest['files']
+
+    def _store_manifest(self, root: str, files: List[str], dirs: Dict[str, int]):
+        manifest_file = self._manifest_file(root)
+        tmp_file = manifest_file.with_name(f'.{manifest_file.name}.{os.getpid()}.tmp')
+        try:
+            manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_file.open('w') as f:
+                json.dump({'version': self.MANIFEST_VERSION, 'root': root, 'dirs': dirs, 'files': files}, f)
+            os.replace(str(tmp_file), str(manifest_file))
+        except OSError as ex:
+            self.logger.debug(f'Unable to store requirements path manifest: {ex}')
+
+    def scan(self, path, cache: bool = False) -> List[str]:
+        root = str(Path(path).resolve())
+
+        files = None
+        if cache and self.cache_dir:
+            files = self._load_manifest(root)
+            if files is not None:
+                self.logger.debug(f'Using cached manifest of {root}')
+
+        if files is None:
+            files, dirs = self.walk(root)
+            if cache and self.cache_dir:
+                self._store_manifest(root, files, dirs)
+
+        return [os.path.join(root, f) for f in files]
+
+    def deduplicate(self, files: Iterable[str]) -> List[str]:
+        if self.precedence == NO_PRECEDENCE:
+            return list(files)
+
+        selected: Dict[str, Tuple[str, str]] = {}
+        for f in files:
+            distribution = parse_distribution(os.path.basename(f))
+            if distribution is None:
+                selected[f] = (f, '')
+                continue
+
+            name, version = distribution
+            key = canonicalize_name(name)
+            if key not in selected:
+                selected[key] = (f, version)
+                continue
+
+            current, current_version = selected[key]
+            if self.precedence == HIGHEST_PRECEDENCE and version_key(version) > version_key(current_version):
+                selected[key] = (f, version)
+                self.logger.debug(f'Skipping duplicated python package {current} (using {f})')
+            else:
+                self.logger.debug(f'Skipping duplicated python package {f} (using {current})')
+
+        return [f for f, _ in selected.values()]
+
+    def collect(self, paths: Iterable, cached_paths: Iterable = ()) -> List[str]:
+        """
+        Scans every path, using cached manifests for `cached_paths`, and
+        returns deduplicated package files.
+        """
+        cached = {str(Path(p).resolve()) for p in cached_paths}
+        files = []
+        seen = set()
+        for p in paths:
+            for f in self.scan(p, cache=str(Path(p).resolve()) in cached):
+                if f not in seen:
+                    seen.add(f)
+                    files.append(f)
+
+        return self.deduplicate(files)
@@ -3,9 +3,10 @@ import sys
 from itertools import chain
 from logging import Logger, getLogger
 from pathlib import Path
-from typing import Dict, Iterable, Union
+from typing import Callable, Dict, Iterable, List, Union
 
 from .config import ConfigParser
+from .metrics import get_metrics, span
 from .processor import ProcessManager
 
 
@@ -25,6 +26,8 @@ class BaseSparkCommand:
                  env: Dict[str, str] = None,
                  properties_file: str = None,
                  klass: str = None,
+                 bundle: bool = None,
+                 packed_env: bool = None,
                  logger: Logger = None):
         try:
             cmd_config = config['spark']
@@ -50,10 +53,34 @@ class BaseSparkCommand:
         self.exclude_packages = cmd_config.getlist('exclude-packages', fallback=[])
         self.repositories = cmd_config.getlist('repositories', fallback=[])
         self.reqs_paths = cmd_config.getlist('reqs_paths', fallback=[])
+        self.reqs_precedence = cmd_config.get('reqs-precedence', fallback='none')
+        self.reqs_scan_cache = cmd_config.getboolean('reqs-scan-cache', fallback=False)
+        self._configured_reqs_paths = list(self.reqs_paths)
 
         self.property_file = properties_file or cmd_config.get('property-file')
         self.klass = klass or cmd_config.get('class')
 
+        from .cache import get_cache_dir
+
+        self.bundle = cmd_config.getboolean('bundle', fallback=False)
+        self.bundle_dir = cmd_config.getpath('bundle-dir', fallback=get_cache_dir(config) / 'bundles')
+        self.scan_cache_dir = get_cache_dir(config) / 'scans'
+
+        self.packed_env = cmd_config.getboolean('packed-env', fallback=False)
+        self.packed_env_dir = cmd_config.getpath('packed-env-dir', fallback=get_cache_dir(config) / 'envs')
+        self.packed_env_interpreter = cmd_config.get('packed-env-interpreter', fallback=None)
+        self.packed_env_archive = None
+
+        self.plugin_command = None
+        self.plugin_manifest = cmd_config.getboolean('plugin-manifest', fallback=True)
+        self.plugin_manifest_dir = get_cache_dir(config) / 'manifests'
+
+        if bundle is not None:
+            self.bundle = bundle
+
+        if packed_env is not None:
+            self.packed_env = packed_env
+
         try:
             self.env = {k: v for k, v in env_config.items()}
         except KeyError:
@@ -128,20 +155,122 @@ class BaseSparkCommand:
             spark_cmd.extend(['--class', self.klass])
 
         if self.reqs_paths:
-            ps = [r.strip() for r in chain(*[[str(p.resolve())
-                                              for p in chain(Path(rp).rglob('*.egg'),
-                                                             Path(rp).rglob('*.whl'),
-                                                             Path(rp).rglob('*.zip'))
-                                              if p.is_file()] for rp in self.reqs_paths]) if r.strip()]
+            from .scanner import ReqsScanner
+
+            scanner = ReqsScanner(cache_dir=self.scan_cache_dir if self.reqs_scan_cache else None,
+                                  precedence=self.reqs_precedence,
+                                  logger=self.logger)
+            # Only configured paths are cached, downloaded ones are temporary
+            with span('spark.scan_reqs'):
+                ps = scanner.collect(self.reqs_paths, cached_paths=self._configured_reqs_paths)
+
+            if self.plugin_command and self.plugin_manifest and len(ps):
+                from .bootstrap import build_plugin_manifest
+
+                manifest = build_plugin_manifest([Path(p) for p in ps],
+                                                 self.plugin_command,
+                                                 self.plugin_manifest_dir,
+                                                 logger=self.logger)
+                if manifest is not None:
+                    ps.append(str(manifest))
+
+            if self.packed_env and len(ps):
+                from .packenv import PACKED_ENV_ALIAS, build_packed_env
+
+                self.logger.info(f'Packing {len(ps)} python packages on environment...')
+                with span('spark.packed_env'):
+                    self.packed_env_archive = build_packed_env([Path(p) for p in ps],
+                                                               self.packed_env_dir,
+                                                               interpreter=self.packed_env_interpreter,
+                                                               logger=self.logger)
+                spark_cmd.extend(['--archives', f'{self.packed_env_archive}#{PACKED_ENV_ALIAS}'])
+                spark_cmd.extend(chain(*[['--conf', f'{c}=./{PACKED_ENV_ALIAS}/bin/python']
+                                         for c in ('spark.yarn.appMasterEnv.PYSPARK_PYTHON',
+                                                   'spark.executorEnv.PYSPARK_PYTHON')]))
+                ps = []
+
+            if self.bundle and len(ps) > 1:
+                from .bundle import build_bundle
+
+                self.logger.info(f'Bundling {len(ps)} python packages...')
+                with span('spark.bundle'):
+                    ps = [str(build_bundle([Path(p) for p in ps], self.bundle_dir, logger=self.logger))]
 
             if len(ps):
                 spark_cmd.extend(['--py-files', ','.join(ps)])
 
         return spark_cmd
 
+    def python_env(self, driver_python: str) -> Dict[str, str]:
+        """
+        Python interpreters used by Spark. On packed environment mode workers
+        use the launcher inside the archive, and local driver loads
+        packages from an extracted copy of it.
+        """
+        if self.packed_env_archive is None:
+            return {'PYSPARK_PYTHON': sys.executable,
+                    'PYSPARK_DRIVER_PYTHON': driver_python}
+
+        from .packenv import PACKED_ENV_ALIAS, extract_packed_env
+
+        env = {'PYSPARK_PYTHON': f'./{PACKED_ENV_ALIAS}/bin/python'}
+        if self.deploy_mode == 'cluster':
+            env['PYSPARK_DRIVER_PYTHON'] = env['PYSPARK_PYTHON']
+        else:
+            env['PYSPARK_DRIVER_PYTHON'] = driver_python
+            env['PYTHONPATH'] = os.pathsep.join(filter(None, [
+                str(extract_packed_env(self.packed_env_archive) / 'lib' / 'sparpy-boot'),
+                os.environ.get('PYTHONPATH')
+            ]))
+        return env
+
 
 class SparkSubmitCommand(BaseSparkCommand):
 
+    def __init__(self,
+                 config: ConfigParser = None,
+                 *args,
+                 status_file: str = None,
+                 event_callbacks: Iterable[Callable] = None,
+                 exec_mode: bool = None,
+                 plugin_command: str = None,
+                 **kwargs):
+        super(SparkSubmitCommand, self).__init__(config, *args, **kwargs)
+
+        self.plugin_command = plugin_command
+
+        try:
+            cmd_config = config['spark']
+        except (KeyError, TypeError):
+            cmd_config = ConfigParser(default_sections=('spark',))
+            cmd_config = cmd_config['spark']
+
+        self.status_file = status_file or cmd_config.get('status-file')
+        self.event_callbacks = list(event_callbacks or [])
+
+        from .staging import get_staging_dir
+
+        self.exec_mode = cmd_config.getboolean('exec-mode', fallback=False)
+        self.staging_dir = get_staging_dir(config)
+
+        if exec_mode is not None:
+            self.exec_mode = exec_mode
+
+    def stage(self, reqs_path: Path) -> Path:
+        """
+        Moves downloaded packages to a staged directory which does not need to
+        be removed after job finishes, and adds it to requirements paths.
+        """
+        from shutil import rmtree
+
+        from .staging import Staging
+
+        staged_path = Staging(self.staging_dir, logger=self.logger).stage(reqs_path)
+        rmtree(str(reqs_path), ignore_errors=True)
+
+        self.reqs_paths.append(staged_path)
+        return staged_path
+
     def build_command(self, *, job_args: Iterable[str], **kwargs):
         kwargs.setdefault('executable', self.spark_executable)
         spark_cmd = super(SparkSubmitCommand, self).build_command(**kwargs)
@@ -150,25 +279,83 @@ class SparkSubmitCommand(BaseSparkCommand):
 
         return spark_cmd
 
+    def build_env(self) -> Dict[str, str]:
+        env = os.environ.copy()
+        env.update(self.python_env(sys.executable))
+        env.update(self.env or {})
+
+        return env
+
     def run(self, job_args: Iterable[str]):
-        self.logger.info('Executing Spark job...')
-        spark_command = self.build_command(job_args=job_args)
+        import time
 
-        env = os.environ.copy()
+        metrics = get_metrics()
+        started = time.time()
 
-        env['PYSPARK_PYTHON'] = sys.executable
-        env['PYSPARK_DRIVER_PYTHON'] = sys.executable
+        self.logger.info('Executing Spark job...')
+        spark_command = self.build_command(job_args=job_args)
 
-        env.update(self.env or {})
+        env = self.build_env()
 
         self.logger.info(' '.join(spark_command))
 
-        process = ProcessManager(spark_command, pass_through=True, env=env)
-        process.start_process()
-        process.wait()
+        if self.exec_mode:
+            metrics.record('spark.start', time.time() - started, timestamp=started)
+            self.exec(spark_command, env)
+
+        # Spark output is only piped when it must be parsed, time to application id is
+        # measured on those runs, so enabling metrics does not change how spark-submit is run
+        if self.status_file or self.event_callbacks:
+            from .supervisor import APPLICATION_ID_EVENT, ProcessSupervisor
+
+            supervisor = ProcessSupervisor(spark_command,
+                                           env=env,
+                                           callbacks=self.event_callbacks,
+                                           status_file=self.status_file,
+                                           logger=self.logger)
+
+            def on_event(event):
+                if event.type == APPLICATION_ID_EVENT:
+                    metrics.record('spark.application_id', event.timestamp - supervisor.started,
+                                   timestamp=supervisor.started)
+
+            supervisor.add_callback(on_event)
+            returncode = supervisor.run()
+            process_started = supervisor.started
+        else:
+            process = ProcessManager(spark_command, pass_through=True, env=env)
+            process.start_process()
+            process_started = time.time()
+            process.wait()
+            returncode = process.returncode
+
+        metrics.record('spark.start', process_started - started, timestamp=started)
+        metrics.record('spark.job', time.time() - process_started, timestamp=process_started, returncode=returncode)
+
+        if returncode != 0:
+            raise RuntimeError(f'Spark job failed with error: {returncode}')
+
+    def exec(self, spark_command: List[str], env: Dict[str, str]):
+        """
+        Replaces current process with spark-submit. It never returns.
+        """
+        if self.status_file or self.event_callbacks:
+            self.logger.warning('Status file and event callbacks are ignored on exec mode')
+
+        from .cache import flush_cache_stats
+
+        get_metrics().flush()
+        flush_cache_stats()
+
+        for handler in self.logger.handlers:
+            handler.flush()
+        sys.stdout.flush()
+        sys.stderr.flush()
 
-        if process.returncode != 0:
-            raise RuntimeError(f'Spark job failed with error: {process.returncode}')
+        try:
+            os.execvpe(spark_command[0], spark_command, env)
+        except OSError as ex:
+            raise RuntimeError(f'Unable to execute {spark_command[0]}: {ex}')
 
 
 class SparkInteractiveCommand(BaseSparkCommand):
@@ -205,10 +392,7 @@ class SparkInteractiveCommand(BaseSparkCommand):
         spark_command = self.build_command()
 
         env = os.environ.copy()
-
-        env['PYSPARK_PYTHON'] = sys.executable
-        env['PYSPARK_DRIVER_PYTHON'] = self.python_interactive_driver
-
+        env.update(self.python_env(self.python_interactive_driver))
         env.update(self.env)
 
         self.logger.info(' '.join(spark_command))
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import time
+from logging import Logger, getLogger
+from pathlib import Path
+from shutil import rmtree
+from typing import List, Optional
+
+from .cache import file_digest, get_cache_dir
+from .locking import DEFAULT_LOCK_TIMEOUT, FileLock, link_or_copy
+
+LEASES_DIRNAME = '.leases'
+DIGESTS_DIRNAME = '.digests'
+LOCKS_DIRNAME = '.locks'
+TMP_PREFIX = '.tmp-'
+DEFAULT_GRACE_PERIOD = 3600
+STAGE_ATTEMPTS = 3
+
+
+def get_staging_dir(config=None) -> Path:
+    try:
+        return config['spark'].getpath('staging-dir', fallback=get_cache_dir(config) / 'staging')
+    except (KeyError, TypeError):
+        return get_cache_dir(config) / 'staging'
+
+
+def process_start_time(pid: int) -> Optional[str]:
+    """
+    Process start time in clock ticks since boot, in order to detect reused
+    process identifiers. It is only available where `/proc` exists.
+    """
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Command name could contain spaces, fields are counted after it
+    return stat.rsplit(')', 1)[-1].split()[19]
+
+
+def is_process_alive(pid: int, start_time: str = None) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    if start_time is not None:
+        current = process_start_time(pid)
+        if current is not None and current != start_time:
+            return False
+    return True
+
+
+def directory_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    for p in sorted(p for p in Path(path).rglob('*') if p.is_file()):
+        h.update(f'{p.relative_to(path).as_posix()}\0{file_digest(p)}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+
+def directory_fingerprint(path: Path) -> str:
+    """
+    Hash of names, sizes and modification times of files of a directory
+    tree. Packages restored from cache are linked, so it does not change
+    while their content does not change.
+    """
+    h = hashlib.sha256()
+    for p in sorted(p for p in Path(path).rglob('*') if p.is_file()):
+        st = p.stat()
+        h.update(f'{p.relative_to(path).as_posix()}\0{st.st_size}\0{st.st_mtime_ns}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+
+class Staging:
+    """
+    Content addressed directories of python packages which outlive the sparpy
+    process. Every process using a staged directory holds a lease file named
+    after its process id, which is kept when the process is replaced by
+    spark-submit using `exec`. Directories without live leases are removed
+    by `clean`. Staging and removing a directory are serialized by a lock
+    per digest, so a directory is never removed while it is being reused.
+    """
+
+    def __init__(self, staging_dir: Path, lock_timeout: int = DEFAULT_LOCK_TIMEOUT, logger: Logger = None):
+        self.staging_dir = Path(staging_dir)
+        self.lock_timeout = lock_timeout
+        self.logger = logger or getLogger(__name__)
+
+    def lock(self, digest: str, timeout: float = None) -> FileLock:
+        return FileLock(self.staging_dir / LOCKS_DIRNAME / f'staging-{digest}.lock',
+                        timeout=self.lock_timeout if timeout is None else timeout,
+                        logger=self.logger)
+
+    def _acquire_lease(self, path: Path, pid: int = None) -> Path:
+        pid = pid or os.getpid()
+        leases_dir = path / LEASES_DIRNAME
+        leases_dir.mkdir(exist_ok=True)
+
+        lease = leases_dir / str(pid)
+        with lease.open('w') as f:
+            json.dump({'pid': pid, 'start_time': process_start_time(pid), 'created': time.time()}, f)
+        return lease
+
+    @property
+    def digests_dir(self) -> Path:
+        return self.staging_dir / DIGESTS_DIRNAME
+
+    def digest(self, src: Path) -> str:
+        """
+        Content digest of `src` directory. Digests are recorded by names,
+        sizes and modification times of files, so unchanged packages are
+        not hashed again on every submit.
+        """
+        record = self.digests_dir / directory_fingerprint(src)
+        try:
+            digest = record.read_text().strip()
+        except OSError:
+            digest = None
+
+        if digest and len(digest) == 64:
+            os.utime(str(record))
+            return digest
+
+        digest = directory_digest(src)
+        tmp_record = record.with_name(f'.{record.name}.{os.getpid()}.tmp')
+        try:
+            record.parent.mkdir(parents=True, exist_ok=True)
+            tmp_record.write_text(digest)
+            os.replace(str(tmp_record), str(record))
+        except OSError as ex:
+            self.logger.debug(f'Unable to record digest of {src}: {ex}')
+        return digest
+
+    def stage(self, src: Path, pid: int = None) -> Path:
+        """
+        Links packages on `src` directory on a staged directory named after
+        their content and acquires a lease on it.
+        """
+        src = Path(src)
+        target = self.staging_dir / self.digest(src)
+
+        with self.lock(target.name):
+            return self._stage(src, target, pid)
+
+    def _stage(self, src: Path, target: Path, pid: int = None) -> Path:
+        for _ in range(STAGE_ATTEMPTS):
+            if target.is_dir():
+                try:
+                    self._acquire_lease(target, pid)
+                    os.utime(str(target))
+                except FileNotFoundError:
+                    # Removed by janitor while it was reused
+                    self.logger.debug(f'Staged packages removed while reusing them: {target}')
+                else:
+                    self.logger.debug(f'Reusing staged packages: {target}')
+                    return target
+
+            self.staging_dir.mkdir(parents=True, exist_ok=True)
+            tmp_dir = self.staging_dir / f'{TMP_PREFIX}{target.name}-{os.getpid()}'
+            rmtree(str(tmp_dir), ignore_errors=True)
+
+            for p in src.rglob('*'):
+                if p.is_file():
+                    dst = tmp_dir / p.relative_to(src)
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    link_or_copy(p, dst)
+            tmp_dir.mkdir(exist_ok=True)
+            self._acquire_lease(tmp_dir, pid)
+
+            try:
+                os.rename(str(tmp_dir), str(target))
+            except OSError:
+                # Staged concurrently by another process, it is reused
+                rmtree(str(tmp_dir), ignore_errors=True)
+                continue
+
+            self.logger.debug(f'Packages staged: {target}')
+            return target
+
+        raise RuntimeError(f'Unable to stage packages on {target}')
+
+    def leases(self, path: Path) -> List[Path]:
+        try:
+            return list((path / LEASES_DIRNAME).iterdir())
+        except OSError:
+            return []
+
+    def _is_lease_alive(self, lease: Path) -> bool:
+        try:
+            with lease.open('r') as f:
+                data = json.load(f)
+            return is_process_alive(int(data['pid']), data.get('start_time'))
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def clean(self, grace_period: float = DEFAULT_GRACE_PERIOD, dry_run: bool = False) -> List[Path]:
+        """
+        Removes leases of dead processes and staged directories without leases
+        which were not used during `grace_period` seconds.
+        """
+        removed = []
+        if not self.staging_dir.is_dir():
+            return removed
+
+        now = time.time()
+        for path in self.staging_dir.iterdir():
+            if path.name == DIGESTS_DIRNAME:
+                self._clean_digests(grace_period, dry_run=dry_run)
+                continue
+            if path.name == LOCKS_DIRNAME or not path.is_dir():
+                continue
+
+            digest = path.name
+            if digest.startswith(TMP_PREFIX):
+                digest = digest[len(TMP_PREFIX):].rsplit('-', 1)[0]
+
+            # Directories being staged or reused are skipped
+            with self.lock(digest, timeout=0) as lock:
+                if lock.acquired and self._clean_path(path, now, grace_period, dry_run=dry_run):
+                    removed.append(path)
+
+        return removed
+
+    def _clean_path(self, path: Path, now: float, grace_period: float, dry_run: bool = False) -> bool:
+        alive = False
+        for lease in self.leases(path):
+            if self._is_lease_alive(lease):
+                alive = True
+            elif not dry_run:
+                self.logger.debug(f'Removing dead lease: {lease}')
+                lease.unlink()
+
+        try:
+            last_used = max(path.stat().st_mtime, (path / LEASES_DIRNAME).stat().st_mtime)
+        except OSError:
+            last_used = path.stat().st_mtime
+
+        if alive or now - last_used < grace_period:
+            return False
+
+        if not dry_run:
+            self.logger.info(f'Removing staged packages: {path}')
+            rmtree(str(path), ignore_errors=True)
+        return True
+
+    def _clean_digests(self, grace_period: float, dry_run: bool = False):
+        """
+        Removes recorded digests of staged directories which do not exist,
+        when they were not used during `grace_period` seconds.
+        """
+        now = time.time()
+        for record in self.digests_dir.iterdir():
+            try:
+                if now - record.stat().st_mtime < grace_period:
+                    continue
+                digest = record.read_text().strip()
+                if digest and (self.staging_dir / digest).is_dir():
+                    continue
+                if not dry_run:
+                    record.unlink()
+            except (OSError, ValueError):
+                continue
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+import time
+from logging import Logger, getLogger
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+APPLICATION_ID_REGEX = re.compile(r'\b(application_\d+_\d+|spark-[0-9a-f]{32})\b')
+STATE_REGEX = re.compile(r'Application (?:report|status) for (\S+) \((?:state|phase): (\w+)\)')
+TRACKING_URL_REGEX = re.compile(r'tracking URL: (\S+)')
+
+APPLICATION_ID_EVENT = 'application_id'
+STATE_EVENT = 'state'
+TRACKING_URL_EVENT = 'tracking_url'
+EXIT_EVENT = 'exit'
+
+STREAM_LIMIT = 4 * 1024 * 1024
+
+
+class SparkEvent(NamedTuple):
+    type: str
+    timestamp: float
+    application_id: Optional[str] = None
+    state: Optional[str] = None
+    tracking_url: Optional[str] = None
+    returncode: Optional[int] = None
+
+
+EventCallback = Callable[[SparkEvent], None]
+
+
+class SparkOutputParser:
+    """
+    Extracts application id, state transitions and tracking URL from
+    spark-submit output lines.
+    """
+
+    def __init__(self):
+        self.application_id: Optional[str] = None
+        self.state: Optional[str] = None
+        self.tracking_url: Optional[str] = None
+
+    def _event(self, event_type: str, **kwargs) -> SparkEvent:
+        return SparkEvent(type=event_type,
+                          timestamp=time.time(),
+                          application_id=self.application_id,
+                          state=self.state,
+                          tracking_url=self.tracking_url,
+                          **kwargs)
+
+    def feed(self, line: str) -> List[SparkEvent]:
+        events = []
+
+        if self.application_id is None:
+            match = APPLICATION_ID_REGEX.search(line)
+            if match:
+                self.application_id = match.group(1)
+                events.append(self._event(APPLICATION_ID_EVENT))
+
+        match = STATE_REGEX.search(line)
+        if match and match.group(2).upper() != self.state:
+            self.state = match.group(2).upper()
+            events.append(self._event(STATE_EVENT))
+
+        match = TRACKING_URL_REGEX.search(line)
+        if match and match.group(1) not in ('N/A', self.tracking_url):
+            self.tracking_url = match.group(1)
+            events.append(self._event(TRACKING_URL_EVENT))
+
+        return events
+
+
+class ProcessSupervisor:
+    """
+    Runs a spark-submit process on an asyncio loop, relaying its output line
+    by line and emitting structured events to callbacks and, optionally, to a
+    JSON status file.
+    """
+
+    def __init__(self,
+                 params: List[str],
+                 env: Dict = None,
+                 callbacks: Iterable[EventCallback] = None,
+                 status_file: os.PathLike = None,
+                 logger: Logger = None):
+        self._params = params
+        self._env = env
+        self._callbacks = list(callbacks or [])
+        self._status_file = Path(status_file) if status_file else None
+        self._parser = SparkOutputParser()
+        self._process = None
+        self._started = None
+
+        self.logger = logger or getLogger(__name__)
+        self.returncode: Optional[int] = None
+
+    def add_callback(self, callback: EventCallback):
+        self._callbacks.append(callback)
+
+    @property
+    def started(self) -> Optional[float]:
+        return self._started
+
+    @property
+    def application_id(self) -> Optional[str]:
+        return self._parser.application_id
+
+    @property
+    def state(self) -> Optional[str]:
+        return self._parser.state
+
+    @property
+    def tracking_url(self) -> Optional[str]:
+        return self._parser.tracking_url
+
+    def _write_status(self, event: SparkEvent):
+        if self._status_file is None:
+            return
+
+        status = {'pid': self._process.pid if self._process else None,
+                  'started': self._started,
+                  'updated': event.timestamp,
+                  'last_event': event.type,
+                  'application_id': event.application_id,
+                  'state': event.state,
+                  'tracking_url': event.tracking_url,
+                  'returncode': event.returncode}
+
+        tmp_file = self._status_file.with_name(f'.{self._status_file.name}.tmp')
+        try:
+            with tmp_file.open('w') as f:
+                json.dump(status, f, indent=2)
+            os.replace(str(tmp_file), str(self._status_file))
+        except OSError as ex:
+            self.logger.warning(f'Unable to write status file {self._status_file}: {ex}')
+
+    def _emit(self, event: SparkEvent):
+        self._write_status(event)
+
+        for callback in self._callbacks:
+            try:
+                callback(event)
+            except Exception:
+                self.logger.exception(f'Error on event callback {callback}')
+
+    @staticmethod
+    async def _read_line(stream: asyncio.StreamReader) -> bytes:
+        """
+        Reads a line, or a chunk of it when it is longer than stream limit.
+        """
+        try:
+            return await stream.readuntil(b'\n')
+        except asyncio.IncompleteReadError as ex:
+            # Last line without line break
+            return ex.partial
+        except asyncio.LimitOverrunError as ex:
+            # Data is kept on stream buffer, so line is relayed in chunks
+            return await stream.read(max(ex.consumed, 1))
+
+    async def _relay(self, stream: asyncio.StreamReader, dst):
+        dst = getattr(dst, 'buffer', dst)
+        while True:
+            line = await self._read_line(stream)
+            if not line:
+                break
+
+            dst.write(line)
+            dst.flush()
+
+            for event in self._parser.feed(line.decode('utf-8', errors='replace')):
+                self._emit(event)
+
+    async def _run(self) -> int:
+        loop = asyncio.get_event_loop()
+
+        self._started = time.time()
+        self._process = await asyncio.create_subprocess_exec(*self._params,
+                                                             stdout=asyncio.subprocess.PIPE,
+                                                             stderr=asyncio.subprocess.PIPE,
+                                                             env=self._env,
+                                                             limit=STREAM_LIMIT)
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._process.send_signal, sig)
+
+        try:
+            await asyncio.gather(self._relay(self._process.stdout, sys.stdout),
+                                 self._relay(self._process.stderr, sys.stderr))
+            returncode = await self._process.wait()
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+
+        return returncode
+
+    def run(self) -> int:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self.returncode = loop.run_until_complete(self._run())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+        self._emit(SparkEvent(type=EXIT_EVENT,
+                              timestamp=time.time(),
+                              application_id=self.application_id,
+                              state=self.state,
+                              tracking_url=self.tracking_url,
+                              returncode=self.returncode))
+
+        return self.returncode
@@ -0,0 +1,159 @@
+import os
+import sys
+from logging import Logger, getLogger
+from pathlib import Path
+from shutil import rmtree
+from typing import Dict, Iterable, List, Optional
+
+from .cache import file_digest, record_cache_lookup, touch
+from .locking import DEFAULT_LOCK_TIMEOUT, FileLock, link_or_copy, publish_file
+from .packages import SDIST_EXTENSIONS, is_wheel_filename
+from .processor import ProcessManager
+
+DEFAULT_BUILD_WORKERS = 4
+
+
+def build_tag() -> str:
+    """
+    Interpreter and platform built wheels are valid for.
+    """
+    import sysconfig
+
+    platform = sysconfig.get_platform().replace('-', '_').replace('.', '_')
+    return f'{sys.implementation.cache_tag}-{platform}'
+
+
+def iter_sdists(path: Path) -> Iterable[Path]:
+    for p in sorted(Path(path).iterdir()):
+        if p.is_file() and p.name.endswith(SDIST_EXTENSIONS) and not is_wheel_filename(p.name):
+            yield p
+
+
+class WheelBuilder:
+    """
+    Builds wheels from source distributions using `pip wheel`, up to
+    `workers` pip processes at a time. Built wheels are cached by source
+    distribution hash and build tag, so every source distribution is built
+    once, and only one process builds it at a time.
+    """
+
+    def __init__(self,
+                 pip_options: List[str] = None,
+                 cache_dir: Path = None,
+                 workers: int = DEFAULT_BUILD_WORKERS,
+                 env: Dict[str, str] = None,
+                 lock_timeout: float = DEFAULT_LOCK_TIMEOUT,
+                 temp_dir_prefix: str = 'sparpy_',
+                 logger: Logger = None):
+        self.pip_options = list(pip_options or [])
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.workers = max(1, workers)
+        self.env = env
+        self.lock_timeout = lock_timeout
+        self.temp_dir_prefix = temp_dir_prefix
+        self.logger = logger or getLogger(__name__)
+
+    @property
+    def wheels_dir(self) -> Optional[Path]:
+        return self.cache_dir / 'wheels' if self.cache_dir else None
+
+    @property
+    def locks_dir(self) -> Optional[Path]:
+        return self.cache_dir / 'locks' if self.cache_dir else None
+
+    def build_command(self, sdist: Path, output_dir: Path) -> List[str]:
+        return [sys.executable, '-m', 'pip', 'wheel', '--no-deps', '--wheel-dir', str(output_dir),
+                *self.pip_options, str(sdist)]
+
+    def _run(self, sdist: Path, output_dir: Path, debug: bool = False) -> Path:
+        from tempfile import mkdtemp
+
+        tmp_dir = Path(mkdtemp(prefix=self.temp_dir_prefix))
+        try:
+            pip_exec_params = self.build_command(sdist, tmp_dir)
+            self.logger.debug(' '.join(pip_exec_params))
+
+            process = ProcessManager(pip_exec_params, pass_through=debug, env=self.env, handle_signals=False)
+            process.start_process()
+            process.wait()
+
+            wheels = list(tmp_dir.glob('*.whl'))
+            if process.returncode != 0 or len(wheels) != 1:
+                raise RuntimeError(f'Unable to build wheel from {sdist.name}')
+
+            output_dir.mkdir(parents=True, exist_ok=True)
+            publish_file(wheels[0], output_dir / wheels[0].name)
+            return output_dir / wheels[0].name
+        finally:
+            rmtree(str(tmp_dir), ignore_errors=True)
+
+    def build(self, sdist: Path, output_dir: Path, debug: bool = False) -> Path:
+        """
+        Builds a wheel from `sdist` on `output_dir`, or links cached one.
+        """
+        sdist = Path(sdist)
+        if self.wheels_dir is None:
+            return self._run(sdist, output_dir, debug=debug)
+
+        key = f'{file_digest(sdist)}-{build_tag()}'
+        entry_dir = self.wheels_dir / key
+
+        def cached():
+            return next(iter(entry_dir.glob('*.whl')), None) if entry_dir.is_dir() else None
+
+        wheel = cached()
+        hit = wheel is not None
+        if wheel is None:
+            with FileLock(self.locks_dir / f'wheel-{key}.lock', timeout=self.lock_timeout, logger=self.logger):
+                wheel = cached()
+                if wheel is None:
+                    self.logger.info(f'Building wheel from {sdist.name}...')
+                    wheel = self._run(sdist, entry_dir, debug=debug)
+                else:
+                    hit = True
+                    self.logger.debug(f'Wheel of {sdist.name} built by another process')
+        else:
+            self.logger.debug(f'Using cached wheel of {sdist.name}')
+
+        touch(entry_dir)
+        record_cache_lookup(self.cache_dir, 'wheels', hit)
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if not (output_dir / wheel.name).exists():
+            link_or_copy(wheel, output_dir / wheel.name)
+        return output_dir / wheel.name
+
+    def build_all(self, path: Path, debug: bool = False) -> Dict[str, Path]:
+        """
+        Replaces source distributions on `path` directory by wheels built
+        from them. Source distributions which could not be built are kept on
+        `path`, but they are not added to `--py-files`, which only takes
+        wheels, eggs and zips. Returns built wheels by source distribution
+        filename.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        path = Path(path)
+        sdists = list(iter_sdists(path))
+        if not sdists:
+            return {}
+
+        def build(sdist):
+            try:
+                return self.build(sdist, path, debug=debug)
+            except (OSError, RuntimeError) as ex:
+                self.logger.warning(f'Unable to build a wheel from {sdist.name}, source distribution is kept '
+                                    f'on {path} but it is not added to --py-files: {ex}')
+                return None
+
+        # Builds run on pip processes, threads only wait for them
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(sdists))) as executor:
+            wheels = list(executor.map(build, sdists))
+
+        result = {}
+        for sdist, wheel in zip(sdists, wheels):
+            if wheel is not None:
+                os.unlink(str(sdist))
+                result[sdist.name] = wheel
+        return result
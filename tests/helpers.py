@@ -0,0 +1,143 @@
+import hashlib
+import threading
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from typing import Dict, Iterable
+from zipfile import ZipFile
+
+
+def make_wheel(directory: Path,
+               name: str,
+               version: str = '1.0',
+               requires: Iterable[str] = (),
+               files: Dict[str, str] = None,
+               requires_python: str = None) -> Path:
+    """
+    Writes a minimal pure python wheel.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    dist_info = f'{name}-{version}.dist-info'
+    metadata = ['Metadata-Version: 2.1', f'Name: {name}', f'Version: {version}']
+    if requires_python:
+        metadata.append(f'Requires-Python: {requires_python}')
+    metadata.extend(f'Requires-Dist: {r}' for r in requires)
+
+    wheel = directory / f'{name}-{version}-py3-none-any.whl'
+    with ZipFile(str(wheel), 'w') as zf:
+        for filename, content in (files or {f'{name}/__init__.py': f'VERSION = {version!r}\n'}).items():
+            zf.writestr(filename, content)
+        zf.writestr(f'{dist_info}/METADATA', '\n'.join(metadata) + '\n')
+        zf.writestr(f'{dist_info}/WHEEL', 'Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: py3-none-any\n')
+        zf.writestr(f'{dist_info}/RECORD', '')
+    return wheel
+
+
+def make_sdist(directory: Path, name: str, version: str = '1.0', requires: Iterable[str] = ()) -> Path:
+    """
+    Writes a minimal source distribution. It uses an in-tree build backend
+    without build requirements, so pip is able to read its metadata offline.
+    """
+    import io
+    import tarfile
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    metadata = '\n'.join(['Metadata-Version: 2.1', f'Name: {name}', f'Version: {version}'] +
+                         [f'Requires-Dist: {r}' for r in requires]) + '\n'
+    backend = ('import os\n\n\n'
+               'def prepare_metadata_for_build_wheel(metadata_directory, config_settings=None):\n'
+               f'    dist_info = {name + "-" + version + ".dist-info"!r}\n'
+               '    os.makedirs(os.path.join(metadata_directory, dist_info))\n'
+               '    with open(os.path.join(metadata_directory, dist_info, "METADATA"), "w") as f:\n'
+               f'        f.write({metadata!r})\n'
+               '    return dist_info\n')
+    pyproject = '[build-system]\nrequires = []\nbuild-backend = "backend"\nbackend-path = ["."]\n'
+
+    sdist = directory / f'{name}-{version}.tar.gz'
+    with tarfile.open(str(sdist), 'w:gz') as tf:
+        for filename, content in (('PKG-INFO', metadata), ('pyproject.toml', pyproject), ('backend.py', backend)):
+            data = content.encode('utf-8')
+            info = tarfile.TarInfo(f'{name}-{version}/{filename}')
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return sdist
+
+
+def sha256(path: Path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def build_simple_index(directory: Path, packages: Iterable[Path]):
+    """
+    Writes a PEP 503 index on `directory`/simple with packages stored on
+    `directory`/files.
+    """
+    from html import escape
+
+    from sparpy.mirror import read_requires_python
+    from sparpy.packages import canonicalize_name, parse_package_filename
+
+    directory = Path(directory)
+    files_dir = directory / 'files'
+    files_dir.mkdir(parents=True, exist_ok=True)
+
+    projects = {}
+    for package in packages:
+        package = Path(package)
+        target = files_dir / package.name
+        if package.resolve() != target.resolve():
+            target.write_bytes(package.read_bytes())
+        projects.setdefault(canonicalize_name(parse_package_filename(package.name)[0]), []).append(target)
+
+    for project, files in projects.items():
+        project_dir = directory / 'simple' / project
+        project_dir.mkdir(parents=True, exist_ok=True)
+        links = ''
+        for f in files:
+            requires_python = read_requires_python(f)
+            attrs = f' data-requires-python="{escape(requires_python)}"' if requires_python else ''
+            links += f'<a href="../../files/{f.name}#sha256={sha256(f)}"{attrs}>{f.name}</a>\n'
+        (project_dir / 'index.html').write_text(f'<html><body>\n{links}</body></html>\n')
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServer:
+    """
+    Serves a directory over HTTP on a random local port.
+    """
+
+    def __init__(self, directory: Path):
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), partial(_QuietHandler, directory=str(directory)))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def unused_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,150 @@
+import json
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.batch import (RUN_SCRIPT, BatchRunner, build_batch_status,
+                          load_batch_manifest)
+
+
+class LoadBatchManifestTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+    def load(self, data):
+        path = self.root / 'batch.json'
+        path.write_text(json.dumps(data))
+        return load_batch_manifest(path)
+
+    def test_defaults_are_merged(self):
+        jobs = self.load({'defaults': {'plugins': ['pkga==1.0'],
+                                       'conf': {'spark.executor.memory': '4g'},
+                                       'env': {'SHARED': 'default', 'OTHER': 1},
+                                       'master': 'yarn'},
+                          'jobs': [{'name': 'variant-1',
+                                    'command': 'my_command',
+                                    'args': ['--param', 1],
+                                    'plugins': 'pkgb',
+                                    'env': {'SHARED': 'job'}},
+                                   {'script': '/path/to/job.py',
+                                    'conf': ['spark.executor.cores=2'],
+                                    'master': 'local[2]',
+                                    'deploy-mode': 'client'}]})
+
+        self.assertEqual(len(jobs), 2)
+
+        self.assertEqual(jobs[0].name, 'variant-1')
+        self.assertEqual(jobs[0].job_args, [RUN_SCRIPT, 'my_command', '--param', '1'])
+        self.assertEqual(jobs[0].command, 'my_command')
+        self.assertEqual(jobs[0].plugins, ['pkga==1.0', 'pkgb'])
+        self.assertEqual(jobs[0].conf, ['spark.executor.memory=4g'])
+        self.assertEqual(jobs[0].env, {'SHARED': 'job', 'OTHER': '1'})
+        self.assertEqual(jobs[0].master, 'yarn')
+
+        self.assertEqual(jobs[1].name, 'job-1')
+        self.assertEqual(jobs[1].job_args, ['/path/to/job.py'])
+        self.assertIsNone(jobs[1].command)
+        self.assertEqual(jobs[1].plugins, ['pkga==1.0'])
+        self.assertEqual(jobs[1].conf, ['spark.executor.memory=4g', 'spark.executor.cores=2'])
+        self.assertEqual(jobs[1].env, {'SHARED': 'default', 'OTHER': '1'})
+        self.assertEqual((jobs[1].master, jobs[1].deploy_mode), ('local[2]', 'client'))
+
+    def test_list_of_jobs(self):
+        jobs = self.load([{'script': 'a.py'}, {'script': 'b.py'}])
+
+        self.assertEqual([j.name for j in jobs], ['job-0', 'job-1'])
+
+    def test_invalid_manifests(self):
+        for data in ({'jobs': {'name': 'a'}},
+                     {'jobs': [{'name': 'a'}]},
+                     {'jobs': [{'name': 'a', 'script': 'a.py'}, {'name': 'a', 'command': 'a'}]}):
+            with self.subTest(data=data), self.assertRaises(RuntimeError):
+                self.load(data)
+
+        (self.root / 'invalid.json').write_text('{')
+        with self.assertRaises(RuntimeError):
+            load_batch_manifest(self.root / 'invalid.json')
+
+        with self.assertRaises(RuntimeError):
+            load_batch_manifest(self.root / 'missing.json')
+
+
+class BatchRunnerTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        devnull = open(os.devnull)
+        self.addCleanup(devnull.close)
+        stdin = patch('sys.stdin', devnull)
+        stdin.start()
+        self.addCleanup(stdin.stop)
+
+        self.events_file = self.root / 'events.log'
+        self.script = self.root / 'spark-submit.py'
+        self.script.write_text(dedent(f'''
+            import os, sys, time
+
+            name, seconds, returncode = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+            with open({str(self.events_file)!r}, 'a') as f:
+                f.write(f'start {{name}}\\n')
+            print(f'{{name}} output {{os.environ.get("JOB_VAR")}}')
+            time.sleep(seconds)
+            with open({str(self.events_file)!r}, 'a') as f:
+                f.write(f'end {{name}}\\n')
+            sys.exit(returncode)
+        '''))
+
+    def command(self, name: str, seconds: float = 0.0, returncode: int = 0):
+        return (name,
+                [sys.executable, str(self.script), name, str(seconds), str(returncode)],
+                {**os.environ, 'JOB_VAR': f'{name}-var'})
+
+    def max_running(self) -> int:
+        running = peak = 0
+        for line in self.events_file.read_text().splitlines():
+            running += 1 if line.startswith('start ') else -1
+            peak = max(peak, running)
+        return peak
+
+    def test_results_keep_commands_order(self):
+        finished = []
+        runner = BatchRunner(max_concurrency=2, log_dir=self.root / 'logs')
+
+        results = runner.run([self.command('slow', seconds=0.5),
+                              self.command('failed', returncode=3),
+                              self.command('fast')],
+                             on_result=lambda r: finished.append(r.name))
+
+        self.assertEqual([r.name for r in results], ['slow', 'failed', 'fast'])
+        self.assertEqual([r.returncode for r in results], [0, 3, 0])
+        self.assertEqual(finished[-1], 'slow')
+        self.assertEqual(Path(results[0].log_file).read_text(), 'slow output slow-var\n')
+
+        status = build_batch_status(results, total=4)
+        self.assertEqual((status['total'], status['finished'], status['succeeded'], status['failed']),
+                         (4, 3, 2, 1))
+
+    def test_concurrency_is_bounded(self):
+        runner = BatchRunner(max_concurrency=2, log_dir=self.root / 'logs')
+
+        results = runner.run([self.command(f'job-{i}', seconds=0.2) for i in range(5)])
+
+        self.assertTrue(all(r.succeeded for r in results))
+        self.assertEqual(self.max_running(), 2)
+
+    def test_job_not_started(self):
+        runner = BatchRunner(log_dir=self.root / 'logs')
+
+        results = runner.run([('missing', [str(self.root / 'missing-spark-submit')], dict(os.environ))])
+
+        self.assertEqual(results[0].returncode, -1)
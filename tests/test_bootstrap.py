@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sparpy.bootstrap import (MANIFEST_MODULE, build_plugin_manifest,
+                              find_plugin_entry_point,
+                              run_plugin_from_manifest, split_runner_options)
+
+from .helpers import make_wheel
+
+PLUGIN_MODULE = '''
+CALLS = []
+
+
+def main(args):
+    CALLS.append(list(args))
+    return 3
+'''
+
+
+class PluginManifestTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        self.wheel = make_wheel(self.root / 'packages', 'bootstrap_plugin', '1.0', files={
+            'bootstrap_plugin/__init__.py': PLUGIN_MODULE,
+            'bootstrap_plugin-1.0.dist-info/entry_points.txt':
+                '[sparpy.cli_plugins]\nhello = bootstrap_plugin:main\n'
+        })
+        self.manifest = build_plugin_manifest([self.wheel], 'hello', self.root / 'manifests')
+
+        sys.path[:0] = [str(self.manifest), str(self.wheel)]
+        self.addCleanup(self.unload)
+
+    def unload(self):
+        sys.path.remove(str(self.manifest))
+        sys.path.remove(str(self.wheel))
+        for module in (MANIFEST_MODULE, 'bootstrap_plugin'):
+            sys.modules.pop(module, None)
+
+    def run_plugin(self, argv):
+        with self.assertRaises(SystemExit) as cm:
+            run_plugin_from_manifest(argv)
+
+        from bootstrap_plugin import CALLS
+
+        return cm.exception.code, CALLS
+
+    def test_find_plugin_entry_point(self):
+        self.assertEqual(find_plugin_entry_point([self.wheel], 'hello'),
+                         {'command': 'hello', 'value': 'bootstrap_plugin:main', 'archive': self.wheel.name})
+        self.assertIsNone(find_plugin_entry_point([self.wheel], 'other'))
+
+    def test_manifest_is_deterministic(self):
+        other = build_plugin_manifest([self.wheel], 'hello', self.root / 'other')
+
+        self.assertEqual(other.name, self.manifest.name)
+        self.assertEqual(other.read_bytes(), self.manifest.read_bytes())
+        self.assertIsNone(build_plugin_manifest([self.wheel], 'other', self.root / 'other'))
+
+    def test_command_is_resolved_through_manifest(self):
+        returncode, calls = self.run_plugin(['hello', '--param', '1'])
+
+        self.assertEqual(returncode, 3)
+        self.assertEqual(calls, [['--param', '1']])
+
+    def test_profiled_command_is_resolved_through_manifest(self):
+        profile_dir = self.root / 'profiles'
+
+        returncode, calls = self.run_plugin(['--profile', 'cprofile', f'--profile-dir={profile_dir}', 'hello', 'a'])
+
+        self.assertEqual(returncode, 3)
+        self.assertEqual(calls, [['a']])
+        self.assertEqual([p.suffix for p in profile_dir.glob('sparpy-hello-*')], ['.pstats'])
+
+    def test_plugins_runner_is_used_otherwise(self):
+        for argv in (['other'], [], ['--unknown', 'hello'], ['--profile'], ['--profile', 'invalid', 'hello']):
+            with self.subTest(argv=argv):
+                self.assertIsNone(run_plugin_from_manifest(argv))
+
+    def test_split_runner_options(self):
+        self.assertEqual(split_runner_options(['--profile=sampling', '--profile-dir', 'd', 'cmd', '--profile', 'x']),
+                         ({'profile': 'sampling', 'profile_dir': 'd'}, ['cmd', '--profile', 'x']))
+        self.assertIsNone(split_runner_options(['--help']))
@@ -0,0 +1,68 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from zipfile import ZipFile
+
+from sparpy.bundle import BUNDLE_PREFIX, ZIP_EPOCH, build_bundle
+
+from .helpers import make_wheel
+
+
+class BuildBundleTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        packages = self.root / 'packages'
+        self.archives = [
+            make_wheel(packages, 'pkgb', '2.0', files={'pkgb/__init__.py': 'NAME = "b"\n',
+                                                       'shared/__init__.py': 'OWNER = "b"\n'}),
+            make_wheel(packages, 'pkga', '1.0', files={'pkga/__init__.py': 'NAME = "a"\n',
+                                                       'shared/__init__.py': 'OWNER = "a"\n'}),
+        ]
+
+        self.egg = packages / 'pkgc-3.0-py3.egg'
+        with ZipFile(str(self.egg), 'w') as zf:
+            zf.writestr('pkgc/__init__.py', 'NAME = "c"\n')
+            zf.writestr('EGG-INFO/PKG-INFO', 'Metadata-Version: 1.1\nName: pkgc\nVersion: 3.0\n')
+
+    def test_bundle_is_deterministic(self):
+        bundle = build_bundle(self.archives, self.root / 'first')
+        other = build_bundle(list(reversed(self.archives)), self.root / 'second')
+
+        self.assertTrue(bundle.name.startswith(BUNDLE_PREFIX))
+        self.assertEqual(other.name, bundle.name)
+        self.assertEqual(other.read_bytes(), bundle.read_bytes())
+
+        with ZipFile(str(bundle)) as zf:
+            names = zf.namelist()
+            self.assertEqual(names, sorted(names))
+            self.assertEqual({i.date_time for i in zf.infolist()}, {ZIP_EPOCH})
+
+    def test_bundle_name_depends_on_contents(self):
+        bundle = build_bundle(self.archives, self.root / 'first')
+        other = build_bundle(self.archives[:1], self.root / 'first')
+
+        self.assertNotEqual(other.name, bundle.name)
+
+    def test_existing_bundle_is_reused(self):
+        bundle = build_bundle(self.archives, self.root / 'bundles')
+        bundle.write_bytes(b'reused')
+
+        self.assertEqual(build_bundle(self.archives, self.root / 'bundles').read_bytes(), b'reused')
+
+    def test_bundle_content(self):
+        bundle = build_bundle([*self.archives, self.egg], self.root / 'bundles')
+
+        with ZipFile(str(bundle)) as zf:
+            names = zf.namelist()
+            # First archive by name wins
+            self.assertEqual(zf.read('shared/__init__.py'), b'OWNER = "a"\n')
+
+        self.assertIn('pkga-1.0.dist-info/METADATA', names)
+        self.assertIn('pkgb-2.0.dist-info/METADATA', names)
+        self.assertIn('pkgc-3.0.egg-info/PKG-INFO', names)
+        self.assertNotIn('EGG-INFO/PKG-INFO', names)
+        self.assertEqual(len([n for n in names if n == 'shared/__init__.py']), 1)
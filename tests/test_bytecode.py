@@ -0,0 +1,73 @@
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from zipfile import ZipFile
+
+from sparpy.bytecode import compile_archive
+
+
+class CompileArchiveTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        self.archive = self.root / 'bytepkg.zip'
+        with ZipFile(str(self.archive), 'w') as zf:
+            zf.writestr('bytepkg/__init__.py', 'from .values import VALUE\n')
+            zf.writestr('bytepkg/values.py', 'VALUE = 42\n')
+            zf.writestr('bytepkg/broken.py', 'def broken(:\n')
+            zf.writestr('bytepkg/data.txt', 'data\n')
+
+    def import_from_archive(self) -> str:
+        result = subprocess.run([sys.executable, '-c',
+                                 'import sys; '
+                                 f'sys.path.insert(0, {str(self.archive)!r}); '
+                                 'import bytepkg, bytepkg.values; '
+                                 'print(bytepkg.VALUE, type(bytepkg.__loader__).__name__)'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return result.stdout.decode().strip()
+
+    def test_compiled_modules_import_without_sources(self):
+        compile_archive(self.archive, drop_sources=True)
+
+        with ZipFile(str(self.archive)) as zf:
+            names = sorted(zf.namelist())
+
+        self.assertEqual(names, ['bytepkg/__init__.pyc',
+                                 'bytepkg/broken.py',
+                                 'bytepkg/data.txt',
+                                 'bytepkg/values.pyc'])
+        self.assertEqual(self.import_from_archive(), '42 zipimporter')
+
+    def test_sources_are_kept(self):
+        compile_archive(self.archive)
+
+        with ZipFile(str(self.archive)) as zf:
+            names = set(zf.namelist())
+
+        self.assertTrue({'bytepkg/values.py', 'bytepkg/values.pyc'} <= names)
+        self.assertEqual(self.import_from_archive(), '42 zipimporter')
+
+    def test_compiled_archives_are_not_compiled_again(self):
+        compile_archive(self.archive, drop_sources=True)
+        content = self.archive.read_bytes()
+
+        compile_archive(self.archive, drop_sources=True)
+        self.assertEqual(self.archive.read_bytes(), content)
+
+    def test_cache(self):
+        cache_dir = self.root / 'cache' / 'bytecode'
+        other = self.root / 'other' / 'bytepkg.zip'
+        other.parent.mkdir()
+        other.write_bytes(self.archive.read_bytes())
+
+        compile_archive(self.archive, drop_sources=True, cache_dir=cache_dir)
+        self.assertEqual(len(list(cache_dir.iterdir())), 1)
+
+        compile_archive(other, drop_sources=True, cache_dir=cache_dir)
+        self.assertEqual(other.read_bytes(), self.archive.read_bytes())
+        self.assertEqual(len(list(cache_dir.iterdir())), 1)
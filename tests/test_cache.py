@@ -0,0 +1,186 @@
+import json
+import os
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.cache import (ResolutionCache, flush_cache_stats, load_cache_stats,
+                          record_cache_lookup)
+from sparpy.plugins import DownloadPlugins
+
+
+class ResolutionCacheTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        self.files = []
+        for name in ('pkg-1.0-py3-none-any.whl', 'other-2.0-py3-none-any.whl'):
+            path = self.root / 'downloads' / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(name.encode('utf-8'))
+            self.files.append(path)
+
+    def cache(self, **kwargs) -> ResolutionCache:
+        return ResolutionCache(cache_dir=self.root / 'cache', **kwargs)
+
+    def test_key_does_not_depend_on_inputs_order(self):
+        self.assertEqual(ResolutionCache.build_key({'plugins': ['a'], 'pre': False}),
+                         ResolutionCache.build_key({'pre': False, 'plugins': ['a']}))
+        self.assertNotEqual(ResolutionCache.build_key({'plugins': ['a'], 'pre': False}),
+                            ResolutionCache.build_key({'plugins': ['a'], 'pre': True}))
+
+    def test_is_cacheable(self):
+        self.assertTrue(self.cache().is_cacheable(pinned=True))
+        self.assertFalse(self.cache().is_cacheable(pinned=False))
+        self.assertTrue(self.cache(ttl=60).is_cacheable(pinned=False))
+        self.assertFalse(self.cache(ttl=60, enabled=False).is_cacheable(pinned=True))
+
+    def test_store_and_get(self):
+        cache = self.cache(ttl=60)
+        entry_dir = cache.store('key', self.files, inputs={'plugins': ['pkg']})
+
+        with (entry_dir / ResolutionCache.MANIFEST_FILENAME).open('r') as f:
+            self.assertEqual(json.load(f)['inputs'], {'plugins': ['pkg']})
+
+        files = cache.get('key')
+        self.assertEqual(sorted(f.name for f in files), sorted(f.name for f in self.files))
+
+        restored = ResolutionCache.restore(files, self.root / 'restored')
+        self.assertEqual(sorted(f.read_bytes() for f in restored), sorted(f.read_bytes() for f in self.files))
+
+    def expire(self, cache: ResolutionCache, key: str, age: float):
+        manifest_file = cache.resolutions_dir / key / ResolutionCache.MANIFEST_FILENAME
+        with manifest_file.open('r') as f:
+            manifest = json.load(f)
+        manifest['created'] = time.time() - age
+        with manifest_file.open('w') as f:
+            json.dump(manifest, f)
+
+    def test_ttl(self):
+        cache = self.cache(ttl=60)
+        cache.store('key', self.files)
+
+        self.expire(cache, 'key', 30)
+        self.assertIsNotNone(cache.get('key'))
+
+        self.expire(cache, 'key', 120)
+        self.assertIsNone(cache.get('key'))
+
+    def test_pinned_entries_never_expire(self):
+        cache = self.cache(ttl=0)
+        cache.store('key', self.files, pinned=True)
+        self.expire(cache, 'key', 365 * 24 * 3600)
+
+        self.assertIsNotNone(cache.get('key', pinned=True))
+        self.assertIsNone(cache.get('key'))
+
+    def test_entries_not_stored_as_pinned_expire(self):
+        cache = self.cache(ttl=60)
+        cache.store('key', self.files)
+        self.expire(cache, 'key', 120)
+
+        self.assertIsNone(cache.get('key', pinned=True))
+
+    def test_fresh_since(self):
+        cache = self.cache(ttl=60)
+        cache.store('key', self.files)
+
+        self.assertIsNone(cache.get('key', fresh_since=time.time() + 1))
+        self.assertIsNotNone(cache.get('key', fresh_since=time.time() - 10))
+
+    def test_incomplete_entry(self):
+        cache = self.cache(ttl=60)
+        entry_dir = cache.store('key', self.files)
+        (entry_dir / self.files[0].name).unlink()
+
+        self.assertIsNone(cache.get('key'))
+
+    def test_missing_entry(self):
+        self.assertIsNone(self.cache(ttl=60).get('missing'))
+
+    def test_stored_entry_replaces_previous_one(self):
+        cache = self.cache(ttl=60)
+        cache.store('key', self.files)
+        cache.store('key', self.files[:1])
+
+        self.assertEqual([f.name for f in cache.get('key')], [self.files[0].name])
+        self.assertEqual([p.name for p in cache.resolutions_dir.iterdir()], ['key'])
+
+
+class CacheInputsTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+    def plugins(self, **kwargs) -> DownloadPlugins:
+        return DownloadPlugins(download_dir=str(self.root / 'downloads'), no_self=True, **kwargs)
+
+    def key(self, **kwargs) -> str:
+        with patch.dict(os.environ, {}, clear=True):
+            return ResolutionCache.build_key(self.plugins(**kwargs).build_cache_inputs())
+
+    def test_plugins_order_does_not_change_key(self):
+        self.assertEqual(self.key(plugins=['a==1.0', 'b==2.0']), self.key(plugins=['b==2.0', 'a==1.0']))
+        self.assertNotEqual(self.key(plugins=['a==1.0']), self.key(plugins=['a==1.1']))
+
+    def test_requirements_file_content_changes_key(self):
+        requirements = self.root / 'requirements.txt'
+        requirements.write_text('a==1.0\n')
+        key = self.key(requirements_files=[str(requirements)])
+
+        requirements.write_text('a==1.1\n')
+        self.assertNotEqual(self.key(requirements_files=[str(requirements)]), key)
+
+    def test_pip_environment_changes_key(self):
+        key = self.key(plugins=['a==1.0'])
+        with patch.dict(os.environ, {'PIP_INDEX_URL': 'https://my-index/simple/'}):
+            self.assertNotEqual(ResolutionCache.build_key(self.plugins(plugins=['a==1.0']).build_cache_inputs()),
+                                key)
+
+    def test_is_pinned(self):
+        self.assertTrue(self.plugins(plugins=['a==1.0', 'b[extra]===2.0']).is_pinned())
+        self.assertFalse(self.plugins(plugins=['a>=1.0']).is_pinned())
+        self.assertFalse(self.plugins(plugins=['a']).is_pinned())
+
+        requirements = self.root / 'requirements.txt'
+        requirements.write_text('# Comment\n--index-url https://my-index/simple/\na==1.0  # pinned\n')
+        self.assertTrue(self.plugins(requirements_files=[str(requirements)]).is_pinned())
+
+        requirements.write_text('-r other.txt\n')
+        self.assertFalse(self.plugins(requirements_files=[str(requirements)]).is_pinned())
+
+    def test_is_fully_pinned(self):
+        files = [Path('a-1.0-py3-none-any.whl'), Path('dep_b-2.0.tar.gz')]
+        plugins = self.plugins(plugins=['a==1.0'])
+        self.assertTrue(plugins.is_pinned())
+        self.assertFalse(plugins.is_fully_pinned(files))
+
+        constraints = self.root / 'constraints.txt'
+        constraints.write_text('Dep.B==2.0\nother>=1.0\n')
+        plugins = self.plugins(plugins=['a==1.0'], constraints=[str(constraints)])
+        self.assertTrue(plugins.is_fully_pinned(files))
+        self.assertFalse(plugins.is_fully_pinned([*files, Path('other-1.1-py3-none-any.whl')]))
+
+        plugins = self.plugins(plugins=['a>=1.0'], constraints=[str(constraints)])
+        self.assertFalse(plugins.is_fully_pinned(files))
+
+
+class CacheStatsTests(TestCase):
+
+    def test_lookups_are_merged(self):
+        with TemporaryDirectory() as tmp:
+            record_cache_lookup(Path(tmp), 'resolutions', True, size=100)
+            record_cache_lookup(Path(tmp), 'resolutions', False)
+            flush_cache_stats()
+            record_cache_lookup(Path(tmp), 'resolutions', True, size=50)
+            flush_cache_stats()
+
+            self.assertEqual(load_cache_stats(Path(tmp)),
+                             {'resolutions': {'hits': 2, 'misses': 1, 'bytes_saved': 150}})
@@ -0,0 +1,55 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.daemon import SparpyDaemon
+
+
+class RunCommandTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.config_file = Path(self.tmp.name) / 'sparpy.ini'
+        self.config_file.write_text('[spark]\nexec-mode=true\n')
+        self.daemon = SparpyDaemon(socket_path=Path(self.tmp.name) / 'daemon.sock', config=str(self.config_file))
+
+    def run_submit(self, argv):
+        from sparpy.spark import SparkSubmitCommand
+
+        commands = []
+
+        def run(command, job_args):
+            commands.append(command)
+            return 0
+
+        with patch('sparpy.cli.sparpy_download', lambda **kwargs: None), \
+                patch.object(SparkSubmitCommand, 'run', autospec=True, side_effect=run), \
+                patch.dict('os.environ', {}, clear=True):
+            returncode = self.daemon.run_command('sparpy-submit', argv)
+
+        return returncode, commands
+
+    def test_exec_mode_is_disabled_on_workers(self):
+        returncode, commands = self.run_submit(['job.py'])
+
+        self.assertEqual(returncode, 0)
+        self.assertEqual(len(commands), 1)
+        self.assertFalse(commands[0].exec_mode)
+
+    def test_exec_option_is_rejected(self):
+        returncode, commands = self.run_submit(['--exec', 'job.py'])
+
+        self.assertEqual(returncode, 2)
+        self.assertEqual(commands, [])
+
+    def test_exec_argument_of_job_is_allowed(self):
+        returncode, commands = self.run_submit(['--', 'job.py', '--exec'])
+
+        self.assertEqual(returncode, 0)
+        self.assertEqual(len(commands), 1)
+        self.assertFalse(commands[0].exec_mode)
+
+    def test_unknown_command(self):
+        self.assertEqual(self.daemon.run_command('isparpy', []), 2)
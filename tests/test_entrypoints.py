@@ -0,0 +1,80 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.entrypoints import EntryPointIndex, container_local_paths
+
+from .helpers import make_wheel
+
+
+class EntryPointIndexTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        wheel = make_wheel(self.root / 'site', 'plugin', '1.0')
+        # Wheels are valid zip path entries with their dist-info
+        from zipfile import ZipFile
+
+        with ZipFile(str(wheel), 'a') as zf:
+            zf.writestr('plugin-1.0.dist-info/entry_points.txt',
+                        '[sparpy.cli_plugins]\nmy-command = plugin:main\n')
+        self.paths = [str(wheel)]
+
+    def test_index_is_persisted(self):
+        index = EntryPointIndex('sparpy.cli_plugins', paths=self.paths, cache_dir=self.root / 'cache')
+        self.assertFalse(index.load())
+        self.assertEqual(index.names(), ['my-command'])
+        self.assertTrue(index.cache_file.exists())
+
+        index = EntryPointIndex('sparpy.cli_plugins', paths=self.paths, cache_dir=self.root / 'cache')
+        self.assertTrue(index.load())
+        self.assertEqual(index.get('my-command').value, 'plugin:main')
+
+    def test_configured_cache_dir(self):
+        from sparpy.config import load_config
+        from sparpy.plugins import DynamicGroup
+
+        config_file = self.root / 'sparpy.conf'
+        config_file.write_text(f'[cache]\ndir = {self.root / "configured"}\n')
+
+        index = EntryPointIndex('sparpy.cli_plugins', paths=self.paths, config=load_config(config_file))
+        self.assertEqual(index.cache_dir, self.root / 'configured' / 'entry-points')
+
+        with patch.dict('os.environ', {'SPARPY_CONFIG': str(config_file)}):
+            self.assertEqual(DynamicGroup().entry_points.cache_dir, self.root / 'configured' / 'entry-points')
+
+    def test_index_is_rebuilt_when_path_changes(self):
+        index = EntryPointIndex('sparpy.cli_plugins', paths=self.paths, cache_dir=self.root / 'cache')
+        cache_file = index.cache_file
+        index.load()
+
+        os.utime(self.paths[0], (0, 0))
+        self.assertNotEqual(EntryPointIndex('sparpy.cli_plugins', paths=self.paths,
+                                            cache_dir=self.root / 'cache').cache_file,
+                            cache_file)
+
+    def test_container_local_paths(self):
+        work_dir = self.root / 'container'
+        work_dir.mkdir()
+        paths = ['', 'lib.zip', str(work_dir / 'deps.zip'), str(self.root / 'site')]
+
+        with patch.dict(os.environ, {'CONTAINER_ID': 'container_1_0001_01_000001'}), \
+                patch('os.getcwd', return_value=str(work_dir)):
+            self.assertEqual(container_local_paths(paths), paths[:3])
+
+        with patch.dict(os.environ, clear=True):
+            self.assertEqual(container_local_paths(paths), [])
+
+    def test_container_index_is_not_persisted(self):
+        cache_dir = self.root / 'cache'
+        with patch.dict(os.environ, {'CONTAINER_ID': 'container_1_0001_01_000001'}), \
+                patch('os.getcwd', return_value=str(self.root / 'site')):
+            index = EntryPointIndex('sparpy.cli_plugins', paths=self.paths, cache_dir=cache_dir)
+            self.assertEqual(index.names(), ['my-command'])
+
+        self.assertFalse(cache_dir.exists())
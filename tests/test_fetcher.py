@@ -0,0 +1,188 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.fetcher import (ConnectionPool, Link, NativeDownloader,
+                            NativeDownloadError, parse_simple_page,
+                            read_wheel_requirements)
+
+from .helpers import (LocalServer, build_simple_index, make_sdist, make_wheel,
+                      unused_port)
+
+
+class NativeDownloaderTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        packages = self.root / 'packages'
+        build_simple_index(self.root / 'index', [
+            make_wheel(packages, 'pkgx', '1.0', requires=['heavy>=1.0', 'shared']),
+            make_wheel(packages, 'heavy', '1.0', requires=['shared']),
+            make_wheel(packages, 'heavy', '2.0', requires=['heavydep', 'shared']),
+            make_wheel(packages, 'heavydep', '1.0'),
+            make_wheel(packages, 'shared', '1.0'),
+            make_wheel(packages, 'shared', '1.1', requires_python='<3'),
+            make_sdist(packages, 'sdonly', '1.0'),
+        ])
+
+        self.server = LocalServer(self.root / 'index')
+        self.server.__enter__()
+        self.addCleanup(self.server.__exit__)
+
+        self.dest = self.root / 'dest'
+        self.dest.mkdir()
+
+    def downloader(self, **kwargs) -> NativeDownloader:
+        downloader = NativeDownloader(index_urls=[f'{self.server.url}/simple/'], **kwargs)
+        self.addCleanup(downloader.close)
+        return downloader
+
+    def test_resolves_dependencies(self):
+        sdists = self.downloader().download(['pkgx'], self.dest)
+
+        self.assertEqual(sdists, [])
+        self.assertEqual(sorted(p.name for p in self.dest.iterdir()),
+                         ['heavy-2.0-py3-none-any.whl',
+                          'heavydep-1.0-py3-none-any.whl',
+                          'pkgx-1.0-py3-none-any.whl',
+                          'shared-1.0-py3-none-any.whl'])
+
+    def test_constraints(self):
+        self.downloader().download(['pkgx'], self.dest, constraints=['heavy<2'])
+
+        self.assertEqual(sorted(p.name for p in self.dest.iterdir()),
+                         ['heavy-1.0-py3-none-any.whl',
+                          'pkgx-1.0-py3-none-any.whl',
+                          'shared-1.0-py3-none-any.whl'])
+
+    def test_excluded_dependencies_are_not_traversed(self):
+        downloader = self.downloader()
+        downloader.download(['pkgx'], self.dest, exclude=['heavy'])
+
+        self.assertEqual(sorted(p.name for p in self.dest.iterdir()),
+                         ['pkgx-1.0-py3-none-any.whl',
+                          'shared-1.0-py3-none-any.whl'])
+        self.assertIn('heavy', downloader.excluded)
+
+    def test_sdist_only_requirement_is_returned(self):
+        sdists = self.downloader().download(['sdonly', 'shared'], self.dest)
+
+        self.assertEqual(sdists, ['sdonly'])
+        self.assertEqual([p.name for p in self.dest.iterdir()], ['shared-1.0-py3-none-any.whl'])
+
+    def test_artifacts_cache(self):
+        artifacts_dir = self.root / 'artifacts'
+        self.downloader(artifacts_dir=artifacts_dir).download(['shared'], self.dest)
+
+        other = self.root / 'other'
+        other.mkdir()
+        with patch.object(ConnectionPool, 'download', side_effect=AssertionError('downloaded again')):
+            self.downloader(artifacts_dir=artifacts_dir).download(['shared'], other)
+
+        self.assertEqual([p.name for p in other.iterdir()], ['shared-1.0-py3-none-any.whl'])
+
+    def test_unknown_package(self):
+        with self.assertRaises(NativeDownloadError):
+            self.downloader().download(['missing'], self.dest)
+
+    def test_unreachable_index(self):
+        downloader = NativeDownloader(index_urls=[f'http://127.0.0.1:{unused_port()}/simple/'])
+        self.addCleanup(downloader.close)
+
+        with self.assertRaises(NativeDownloadError):
+            downloader.download(['shared'], self.dest)
+
+    def test_hash_mismatch(self):
+        pool = ConnectionPool()
+        self.addCleanup(pool.close)
+
+        with self.assertRaises(NativeDownloadError):
+            pool.download(f'{self.server.url}/files/shared-1.0-py3-none-any.whl',
+                          self.dest / 'shared-1.0-py3-none-any.whl',
+                          sha256='0' * 64)
+        self.assertEqual(list(self.dest.iterdir()), [])
+
+    def test_invalid_json_page(self):
+        for body in (b'{', b'{"files": [{"url": "a.whl"}]}', b'[]'):
+            with self.subTest(body=body), self.assertRaises(NativeDownloadError):
+                parse_simple_page('application/vnd.pypi.simple.v1+json', body, f'{self.server.url}/simple/a/')
+
+    def test_corrupt_wheel(self):
+        wheel = self.root / 'corrupt-1.0-py3-none-any.whl'
+        wheel.write_bytes(b'corrupted')
+
+        with self.assertRaises(NativeDownloadError):
+            read_wheel_requirements(wheel)
+
+    def test_failed_local_copy_is_cleaned(self):
+        src = make_wheel(self.root / 'local', 'local', '1.0')
+        downloader = self.downloader()
+
+        with patch('os.replace', side_effect=OSError('No space left on device')), \
+                self.assertRaises(NativeDownloadError):
+            downloader.fetch(Link(filename=src.name, url=src.as_uri()), self.dest)
+        self.assertEqual(list(self.dest.iterdir()), [])
+
+    def test_read_wheel_requirements(self):
+        self.assertEqual(read_wheel_requirements(self.root / 'index' / 'files' / 'pkgx-1.0-py3-none-any.whl'),
+                         ['heavy>=1.0', 'shared'])
+
+
+class DownloadFallbackTests(TestCase):
+
+    def test_native_downloads_are_removed_before_pip_fallback(self):
+        from sparpy.plugins import DownloadPlugins
+
+        with TemporaryDirectory() as tmp:
+            plugins = DownloadPlugins(plugins=['pkgx'], download_dir=tmp, download_engine='native', build_wheels=False)
+
+            def download_native(debug=False):
+                make_wheel(Path(plugins.reqs_path), 'shared', '1.0')
+                raise NativeDownloadError('Index is not available')
+
+            def download_pip(debug=False):
+                self.assertEqual(list(Path(plugins.reqs_path).iterdir()), [])
+                make_wheel(Path(plugins.reqs_path), 'pkgx', '1.0')
+
+            with patch.object(plugins, 'download_native', side_effect=download_native), \
+                    patch.object(plugins, 'download_pip', side_effect=download_pip) as pip:
+                plugins.download_resolved()
+
+            pip.assert_called_once_with(debug=False)
+            self.assertEqual([p.name for p in Path(plugins.reqs_path).iterdir()], ['pkgx-1.0-py3-none-any.whl'])
+
+    def test_pip_engine_is_used_without_packaging(self):
+        from sparpy.plugins import PIP_ENGINE, DownloadPlugins
+
+        with TemporaryDirectory() as tmp, patch('importlib.util.find_spec', return_value=None):
+            plugins = DownloadPlugins(plugins=['pkgx'], download_dir=tmp, download_engine='native')
+
+        self.assertEqual(plugins.download_engine, PIP_ENGINE)
+
+    def test_sdist_dependencies_are_resolved_by_pip(self):
+        from sparpy.plugins import DownloadPlugins
+
+        with TemporaryDirectory() as tmp:
+            packages = Path(tmp) / 'packages'
+            make_wheel(packages, 'pkgy', '1.0', requires=['sdreq', 'shared<2'])
+            make_sdist(packages, 'sdreq', '1.0', requires=['wheelonly', 'shared'])
+            make_wheel(packages, 'wheelonly', '1.0')
+            make_wheel(packages, 'shared', '1.0')
+            make_wheel(packages, 'shared', '2.0')
+
+            plugins = DownloadPlugins(plugins=['pkgy'], download_dir=str(Path(tmp) / 'dest'), no_self=True,
+                                      no_index=True, find_links=[str(packages)], download_engine='native',
+                                      build_wheels=False)
+            with open(os.devnull) as devnull, patch('sys.stdin', devnull):
+                plugins.download_resolved()
+
+            self.assertEqual(sorted(p.name for p in Path(plugins.reqs_path).iterdir()),
+                             ['pkgy-1.0-py3-none-any.whl',
+                              'sdreq-1.0.tar.gz',
+                              'shared-1.0-py3-none-any.whl',
+                              'wheelonly-1.0-py3-none-any.whl'])
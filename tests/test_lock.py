@@ -0,0 +1,128 @@
+import json
+import shutil
+import signal
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.lock import LockedArtifact, Lockfile
+
+from .helpers import make_wheel, sha256
+
+
+class LockfileTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        self.wheelhouse = self.root / 'wheelhouse'
+        self.wheels = [make_wheel(self.wheelhouse, 'pkgb', '2.0'), make_wheel(self.wheelhouse, 'pkga', '1.0')]
+
+    def test_from_directory(self):
+        lockfile = Lockfile.from_directory(self.wheelhouse, inputs={'plugins': ['pkga']})
+
+        self.assertEqual([a.filename for a in lockfile.artifacts],
+                         ['pkga-1.0-py3-none-any.whl', 'pkgb-2.0-py3-none-any.whl'])
+        artifact = lockfile.artifacts[0]
+        self.assertEqual((artifact.name, artifact.version), ('pkga', '1.0'))
+        self.assertEqual(artifact.sha256, sha256(self.wheels[1]))
+        self.assertEqual(artifact.size, self.wheels[1].stat().st_size)
+        self.assertEqual(artifact.as_requirement(), f'pkga==1.0 --hash=sha256:{artifact.sha256}')
+
+    def test_round_trip(self):
+        lockfile = Lockfile.from_directory(self.wheelhouse, inputs={'plugins': ['pkga']})
+        lockfile.save(self.root / 'sparpy.lock')
+
+        loaded = Lockfile.load(self.root / 'sparpy.lock')
+        self.assertEqual(loaded.artifacts, lockfile.artifacts)
+        self.assertEqual(loaded.inputs, {'plugins': ['pkga']})
+        self.assertEqual(loaded.digest(), lockfile.digest())
+        self.assertEqual(loaded.to_dict(), lockfile.to_dict())
+
+    def test_saved_file_is_stable(self):
+        Lockfile.from_directory(self.wheelhouse).save(self.root / 'a.lock')
+        Lockfile(reversed(Lockfile.load(self.root / 'a.lock').artifacts)).save(self.root / 'b.lock')
+
+        self.assertEqual((self.root / 'a.lock').read_bytes(), (self.root / 'b.lock').read_bytes())
+
+    def test_digest_depends_on_artifacts(self):
+        lockfile = Lockfile.from_directory(self.wheelhouse)
+        other = Lockfile(lockfile.artifacts[:1])
+
+        self.assertNotEqual(lockfile.digest(), other.digest())
+        self.assertEqual(lockfile.digest(), Lockfile(lockfile.artifacts, inputs={'other': True}).digest())
+
+    def test_verify(self):
+        artifact = LockedArtifact.from_file(self.wheels[0])
+        self.assertTrue(artifact.verify(self.wheels[0]))
+
+        self.wheels[0].write_bytes(b'corrupted')
+        self.assertFalse(artifact.verify(self.wheels[0]))
+        self.assertFalse(artifact.verify(self.root / 'missing.whl'))
+
+    def test_invalid_lockfiles(self):
+        (self.root / 'invalid.lock').write_text('{')
+        with self.assertRaises(RuntimeError):
+            Lockfile.load(self.root / 'invalid.lock')
+
+        (self.root / 'version.lock').write_text(json.dumps({'version': 99, 'artifacts': []}))
+        with self.assertRaises(RuntimeError):
+            Lockfile.load(self.root / 'version.lock')
+
+        with self.assertRaises(RuntimeError):
+            Lockfile.load(self.root / 'missing.lock')
+
+
+class DownloadLockedTests(TestCase):
+
+    def test_signals_are_forwarded_to_every_pip_process(self):
+        from sparpy.plugins import DownloadPlugins
+
+        with TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            wheelhouse = root / 'wheelhouse'
+            make_wheel(wheelhouse, 'pkga', '1.0')
+            make_wheel(wheelhouse, 'pkgb', '2.0')
+            Lockfile.from_directory(wheelhouse).save(root / 'sparpy.lock')
+            (root / 'dest').mkdir()
+
+            plugins = DownloadPlugins(lockfile=str(root / 'sparpy.lock'), download_dir=str(root / 'dest'),
+                                      download_engine='pip', build_wheels=False)
+            plugins.download_workers = 2
+
+            processes = []
+            test = self
+
+            class FakeProcessManager:
+
+                def __init__(self, params, handle_signals=True, **kwargs):
+                    test.assertFalse(handle_signals)
+                    self.requirements_file = Path(params[params.index('-r') + 1])
+                    self.signals = []
+                    self.returncode = None
+                    processes.append(self)
+
+                def start_process(self):
+                    pass
+
+                def send_signal(self, sig, _=None):
+                    self.signals.append(sig)
+
+                def wait(self):
+                    if self is processes[0]:
+                        signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+                    for line in self.requirements_file.read_text().splitlines():
+                        name, version = line.split(' ')[0].split('==')
+                        shutil.copy(str(wheelhouse / f'{name}-{version}-py3-none-any.whl'), plugins.reqs_path)
+                    self.returncode = 0
+
+            original_handler = signal.getsignal(signal.SIGTERM)
+            with patch('sparpy.plugins.ProcessManager', FakeProcessManager):
+                plugins.download_locked()
+
+            self.assertEqual(len(processes), 2)
+            self.assertEqual([p.signals for p in processes], [[signal.SIGTERM], [signal.SIGTERM]])
+            self.assertIs(signal.getsignal(signal.SIGTERM), original_handler)
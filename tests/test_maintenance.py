@@ -0,0 +1,179 @@
+import os
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.config import ConfigParser
+from sparpy.maintenance import CacheMaintenance, format_size, parse_size
+
+
+class SizeTests(TestCase):
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('100'), 100)
+        self.assertEqual(parse_size('1K'), 1024)
+        self.assertEqual(parse_size('1.5MiB'), 1536 * 1024)
+        self.assertEqual(parse_size(' 10g '), 10 * 1024 ** 3)
+        self.assertEqual(parse_size(42), 42)
+
+        with self.assertRaises(RuntimeError):
+            parse_size('ten')
+
+    def test_format_size(self):
+        self.assertEqual(format_size(100), '100 B')
+        self.assertEqual(format_size(1536), '1.5 KiB')
+        self.assertEqual(format_size(10 * 1024 ** 3), '10.0 GiB')
+
+
+class CacheMaintenanceTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.cache_dir = self.root / 'cache'
+
+        # Orphaned download directories are looked up on temporary directory
+        patcher = patch('tempfile.gettempdir', return_value=str(self.root))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def maintenance(self, **cache_options) -> CacheMaintenance:
+        config = ConfigParser(default_sections=('cache', 'spark', 'plugins'))
+        config['cache']['dir'] = str(self.cache_dir)
+        for k, v in cache_options.items():
+            config['cache'][k] = str(v)
+        return CacheMaintenance(config)
+
+    def entry(self, area: str, name: str, size: int, age: float) -> Path:
+        path = self.cache_dir / area / name
+        path.mkdir(parents=True)
+        (path / 'file').write_bytes(b'x' * size)
+        used = time.time() - age
+        os.utime(str(path), (used, used))
+        return path
+
+    def test_stats(self):
+        self.entry('resolutions', 'a', 100, 10)
+        self.entry('bytecode', 'b', 50, 10)
+
+        stats = self.maintenance().stats()
+
+        self.assertEqual(stats['size'], 150)
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['areas']['resolutions']['size'], 100)
+        self.assertEqual([e['size'] for e in stats['largest']], [100, 50])
+
+    def test_gc_by_size_evicts_least_recently_used(self):
+        oldest = self.entry('resolutions', 'oldest', 100, 3000)
+        old = self.entry('artifacts', 'old', 100, 2000)
+        recent = self.entry('bytecode', 'recent', 100, 1000)
+
+        result = self.maintenance().gc(max_size=200, grace_period=60)
+
+        self.assertEqual([e.path for e in result.removed], [oldest])
+        self.assertEqual(result.freed, 100)
+        self.assertFalse(oldest.exists())
+        self.assertTrue(old.exists())
+        self.assertTrue(recent.exists())
+
+    def test_gc_by_age(self):
+        expired = self.entry('resolutions', 'expired', 10, 3000)
+        fresh = self.entry('resolutions', 'fresh', 10, 100)
+
+        result = self.maintenance().gc(max_age=1000, grace_period=60)
+
+        self.assertEqual([e.path for e in result.removed], [expired])
+        self.assertTrue(fresh.exists())
+
+    def test_gc_dry_run(self):
+        entry = self.entry('resolutions', 'a', 100, 3000)
+
+        result = self.maintenance().gc(max_size=1, grace_period=60, dry_run=True)
+
+        self.assertEqual([e.path for e in result.removed], [entry])
+        self.assertTrue(entry.exists())
+
+    def test_entries_used_during_grace_period_are_kept(self):
+        entry = self.entry('resolutions', 'a', 100, 10)
+
+        result = self.maintenance().gc(max_size=1, grace_period=60)
+
+        self.assertEqual(result.removed, [])
+        self.assertTrue(entry.exists())
+
+    def test_hard_linked_files_are_counted_once(self):
+        a = self.entry('resolutions', 'a', 100, 3000)
+        b = self.entry('artifacts', 'b', 0, 2000)
+        (b / 'file').unlink()
+        os.link(str(a / 'file'), str(b / 'file'))
+        os.utime(str(b), (time.time() - 2000, time.time() - 2000))
+
+        maintenance = self.maintenance()
+        self.assertEqual(maintenance.stats()['size'], 100)
+
+        # Removing only one of the entries frees nothing
+        result = maintenance.gc(max_size=50, grace_period=60)
+        self.assertEqual(len(result.removed), 2)
+        self.assertEqual(result.freed, 100)
+
+    def test_locked_entries_are_skipped(self):
+        entry = self.entry('resolutions', 'a', 100, 3000)
+
+        from sparpy.locking import FileLock
+
+        with FileLock(self.cache_dir / 'locks' / 'resolution-a.lock'):
+            result = self.maintenance().gc(max_size=1, grace_period=60)
+
+        self.assertEqual(result.removed, [])
+        self.assertTrue(entry.exists())
+
+    def test_unfinished_temporaries_of_dead_processes_are_removed(self):
+        dead = self.cache_dir / 'resolutions' / f'.key.{2 ** 22 + 1}.tmp'
+        alive = self.cache_dir / 'resolutions' / f'.key.{os.getpid()}.tmp'
+        for path in (dead, alive):
+            path.mkdir(parents=True)
+            os.utime(str(path), (time.time() - 3000, time.time() - 3000))
+
+        result = self.maintenance().gc(grace_period=60)
+
+        self.assertEqual(result.temporaries, [dead])
+        self.assertFalse(dead.exists())
+        self.assertTrue(alive.exists())
+
+    def test_maybe_gc(self):
+        entry = self.entry('resolutions', 'a', 100, 7200)
+
+        self.assertIsNone(self.maintenance().maybe_gc())
+
+        maintenance = self.maintenance(**{'max-size': '10', 'gc-interval': 3600})
+        with patch.object(maintenance, 'grace_period', 60):
+            self.assertEqual([e.path for e in maintenance.maybe_gc().removed], [entry])
+            # It already ran during gc interval
+            self.assertIsNone(maintenance.maybe_gc())
+
+    def test_verify(self):
+        entry = self.entry('resolutions', 'a', 10, 10)
+        (entry / 'manifest.json').write_text('{"files": [{"name": "file", "size": 20}]}')
+
+        maintenance = self.maintenance()
+        corrupted = maintenance.verify()
+        self.assertEqual([(e.path, problem) for e, problem in corrupted], [(entry, 'size of file is 10 instead of 20')])
+
+        maintenance.verify(fix=True)
+        self.assertFalse(entry.exists())
+
+    def test_orphaned_download_directories_are_removed(self):
+        dead = self.root / f'sparpy_{2 ** 22 + 1}-abc'
+        alive = self.root / f'sparpy_{os.getpid()}-abc'
+        for path in (dead, alive):
+            path.mkdir()
+            os.utime(str(path), (time.time() - 3000, time.time() - 3000))
+
+        result = self.maintenance().gc(grace_period=60)
+
+        self.assertEqual(result.temp_dirs, [dead])
+        self.assertFalse(dead.exists())
+        self.assertTrue(alive.exists())
@@ -0,0 +1,110 @@
+import json
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.mirror import Mirror, read_requires_python
+
+from .helpers import LocalServer, make_wheel, sha256
+
+
+class MirrorTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        self.wheelhouse = self.root / 'wheelhouse'
+        self.pkga = make_wheel(self.wheelhouse, 'Pkg_A', '1.0', requires_python='>=3.6')
+        self.pkgb = make_wheel(self.wheelhouse, 'pkgb', '2.0')
+        self.mirror = Mirror(self.root / 'mirror')
+
+    def test_read_requires_python(self):
+        self.assertEqual(read_requires_python(self.pkga), '>=3.6')
+        self.assertIsNone(read_requires_python(self.pkgb))
+
+    def test_index(self):
+        self.assertTrue(self.mirror.add(self.pkga))
+        self.assertTrue(self.mirror.add(self.pkgb))
+        self.mirror.write_index()
+
+        root_page = (self.mirror.simple_dir / 'index.html').read_text()
+        self.assertIn('<a href="pkg-a/">pkg-a</a>', root_page)
+        self.assertIn('<a href="pkgb/">pkgb</a>', root_page)
+
+        page = (self.mirror.simple_dir / 'pkg-a' / 'index.html').read_text()
+        self.assertIn(f'href="../../files/{self.pkga.name}#sha256={sha256(self.pkga)}"', page)
+        self.assertIn('data-requires-python="&gt;=3.6"', page)
+        self.assertNotIn('data-requires-python', (self.mirror.simple_dir / 'pkgb' / 'index.html').read_text())
+
+    def test_add_is_incremental(self):
+        self.assertTrue(self.mirror.add(self.pkga))
+        self.assertFalse(self.mirror.add(self.pkga))
+
+        changed = make_wheel(self.root / 'changed', 'Pkg_A', '1.0', files={'pkg_a/__init__.py': 'CHANGED = 1\n'})
+        with self.assertLogs('sparpy.mirror', level='WARNING'):
+            self.assertTrue(self.mirror.add(changed))
+        self.assertEqual(self.mirror.files[self.pkga.name].sha256, sha256(changed))
+
+    def test_manifest_avoids_hashing_again(self):
+        self.mirror.add(self.pkga)
+        self.mirror.save()
+
+        with (self.mirror.manifest_file).open('r') as f:
+            self.assertEqual([f['filename'] for f in json.load(f)['files']], [self.pkga.name])
+
+        mirror = Mirror(self.mirror.directory)
+        with patch('sparpy.mirror.file_digest', side_effect=AssertionError('hashed again')):
+            self.assertEqual(list(mirror.refresh()), [self.pkga.name])
+
+        # Changed files are hashed again
+        os.utime(str(mirror.files_dir / self.pkga.name), (0, 0))
+        self.assertEqual(mirror.refresh()[self.pkga.name].sha256, sha256(self.pkga))
+
+    def test_prune(self):
+        self.mirror.add(self.pkga)
+        self.mirror.add(self.pkgb)
+        self.mirror.write_index()
+
+        self.assertEqual(self.mirror.prune([self.pkga.name], dry_run=True), [self.mirror.files_dir / self.pkgb.name])
+        self.assertTrue((self.mirror.files_dir / self.pkgb.name).exists())
+
+        self.assertEqual(self.mirror.prune([self.pkga.name]), [self.mirror.files_dir / self.pkgb.name])
+        self.mirror.write_index()
+
+        self.assertFalse((self.mirror.files_dir / self.pkgb.name).exists())
+        self.assertFalse((self.mirror.simple_dir / 'pkgb').exists())
+        self.assertNotIn('pkgb', (self.mirror.simple_dir / 'index.html').read_text())
+
+    def test_seed(self):
+        self.mirror.add(self.pkga)
+        target = self.root / 'target'
+        target.mkdir()
+
+        seeded = self.mirror.seed({self.pkga.name: sha256(self.pkga), self.pkgb.name: sha256(self.pkgb)}, target)
+        self.assertEqual(seeded, [target / self.pkga.name])
+
+        # Files with other hash are not seeded
+        (target / self.pkga.name).unlink()
+        self.assertEqual(self.mirror.seed({self.pkga.name: '0' * 64}, target), [])
+
+    def test_index_is_resolvable(self):
+        from sparpy.fetcher import NativeDownloader
+
+        self.mirror.add(self.pkga)
+        self.mirror.add(make_wheel(self.wheelhouse, 'pkgc', '1.0', requires=['pkg-a']))
+        self.mirror.write_index()
+
+        dest = self.root / 'dest'
+        dest.mkdir()
+        with LocalServer(self.mirror.directory) as server:
+            downloader = NativeDownloader(index_urls=[f'{server.url}/simple/'])
+            try:
+                downloader.download(['pkgc'], dest)
+            finally:
+                downloader.close()
+
+        self.assertEqual(sorted(p.name for p in dest.iterdir()), [self.pkga.name, 'pkgc-1.0-py3-none-any.whl'])
@@ -0,0 +1,95 @@
+import io
+import os
+import subprocess
+import sys
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.packenv import (build_packed_env, default_interpreter,
+                            extract_packed_env)
+
+from .helpers import make_wheel
+
+
+class PackedEnvTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        wheelhouse = self.root / 'wheelhouse'
+        self.archives = [
+            make_wheel(wheelhouse, 'pkga', '1.0', files={'pkga/__init__.py': 'from pkgb import VALUE\n',
+                                                         'pkga-1.0.data/purelib/pkga_extra.py': 'EXTRA = 1\n',
+                                                         'pkga-1.0.data/scripts/pkga-run': '#!python\n'}),
+            make_wheel(wheelhouse, 'pkgb', '2.0', files={'pkgb/__init__.py': 'VALUE = 42\n'}),
+        ]
+
+    def members(self, packed_env: Path):
+        with tarfile.open(str(packed_env), 'r:gz') as tf:
+            return {m.name: m for m in tf.getmembers()}
+
+    def test_layout(self):
+        packed_env = build_packed_env(self.archives, self.root / 'envs')
+        members = self.members(packed_env)
+
+        self.assertIn('bin/python', members)
+        self.assertEqual(members['bin/python'].mode, 0o755)
+        self.assertIn('lib/sparpy-boot/sitecustomize.py', members)
+        self.assertIn('lib/site-packages/pkga/__init__.py', members)
+        self.assertIn('lib/site-packages/pkga_extra.py', members)
+        self.assertIn('lib/site-packages/pkgb-2.0.dist-info/METADATA', members)
+        self.assertFalse([n for n in members if 'scripts' in n])
+
+    def test_launcher_runs_configured_interpreter(self):
+        packed_env = build_packed_env(self.archives, self.root / 'envs', interpreter='/opt/python/bin/python3.7')
+
+        with tarfile.open(str(packed_env), 'r:gz') as tf:
+            launcher = tf.extractfile('bin/python').read().decode('utf-8')
+        self.assertIn('/opt/python/bin/python3.7', launcher)
+        self.assertNotEqual(build_packed_env(self.archives, self.root / 'envs'), packed_env)
+
+    def test_deterministic(self):
+        packed_env = build_packed_env(self.archives, self.root / 'envs')
+        content = packed_env.read_bytes()
+        packed_env.unlink()
+
+        self.assertEqual(build_packed_env(list(reversed(self.archives)), self.root / 'envs'), packed_env)
+        self.assertEqual(packed_env.read_bytes(), content)
+        self.assertTrue(packed_env.name.endswith('.tar.gz'))
+        self.assertEqual(default_interpreter(), f'python{sys.version_info[0]}.{sys.version_info[1]}')
+
+    def test_extracted_env_loads_packages(self):
+        packed_env = build_packed_env(self.archives, self.root / 'envs')
+        env_dir = extract_packed_env(packed_env, self.root / 'extracted')
+
+        self.assertEqual(extract_packed_env(packed_env, self.root / 'extracted'), env_dir)
+
+        output = subprocess.run([str(env_dir / 'bin' / 'python'), '-c', 'import pkga; print(pkga.VALUE)'],
+                                stdout=subprocess.PIPE,
+                                env={**os.environ, 'SPARPY_ENV_INTERPRETER': sys.executable},
+                                check=True).stdout
+        self.assertEqual(output.strip(), b'42')
+
+    def test_unsafe_members_are_refused(self):
+        packed_env = self.root / 'sparpy-env-unsafe.tar.gz'
+        with tarfile.open(str(packed_env), 'w:gz') as tf:
+            info = tarfile.TarInfo('../outside.py')
+            info.size = 4
+            tf.addfile(info, io.BytesIO(b'pass'))
+
+        with self.assertRaises(RuntimeError):
+            extract_packed_env(packed_env, self.root / 'extracted')
+
+        # Python versions without extraction filters
+        with patch.dict(tarfile.__dict__):
+            tarfile.__dict__.pop('data_filter', None)
+            with self.assertRaises(RuntimeError):
+                extract_packed_env(packed_env, self.root / 'extracted')
+
+        self.assertFalse((self.root / 'outside.py').exists())
+        self.assertEqual(list(self.root.glob('extracted/*')), [])
@@ -0,0 +1,79 @@
+import io
+import os
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.processor import ProcessManager, copy_stream
+
+OUTPUT_SCRIPT = '''
+import sys
+size, returncode = int(sys.argv[1]), int(sys.argv[2])
+sys.stdout.buffer.write(b'o' * size)
+sys.stderr.buffer.write(b'e' * (size // 2))
+sys.exit(returncode)
+'''
+
+
+class ProcessManagerTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        devnull = open(os.devnull)
+        self.addCleanup(devnull.close)
+        stdin = patch('sys.stdin', devnull)
+        stdin.start()
+        self.addCleanup(stdin.stop)
+
+    def command(self, size: int, returncode: int = 0):
+        return [sys.executable, '-c', OUTPUT_SCRIPT, str(size), str(returncode)]
+
+    def run_process(self, process: ProcessManager):
+        stdout = io.TextIOWrapper(io.BytesIO())
+        stderr = io.TextIOWrapper(io.BytesIO())
+        with patch('sys.stdout', stdout), patch('sys.stderr', stderr):
+            process.start_process()
+            process.wait()
+        return stdout.buffer.getvalue(), stderr.buffer.getvalue()
+
+    def test_output_is_spooled_and_replayed_on_failure(self):
+        process = ProcessManager(self.command(200000, returncode=3), max_memory_output=1024, handle_signals=False)
+
+        stdout, stderr = self.run_process(process)
+
+        self.assertEqual(process.returncode, 3)
+        self.assertEqual(stdout, b'o' * 200000)
+        self.assertEqual(stderr, b'e' * 100000)
+
+    def test_output_is_discarded_on_success(self):
+        process = ProcessManager(self.command(200000), max_memory_output=1024, handle_signals=False)
+
+        stdout, stderr = self.run_process(process)
+
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual((stdout, stderr), (b'', b''))
+
+    def test_pass_through_output(self):
+        with (self.root / 'out.log').open('wb') as out, (self.root / 'err.log').open('wb') as err:
+            process = ProcessManager(self.command(1000, returncode=1),
+                                     pass_through=True,
+                                     handle_signals=False,
+                                     stdout=out,
+                                     stderr=err)
+            process.start_process()
+            process.wait()
+
+        self.assertEqual(process.returncode, 1)
+        self.assertEqual((self.root / 'out.log').read_bytes(), b'o' * 1000)
+        self.assertEqual((self.root / 'err.log').read_bytes(), b'e' * 500)
+
+    def test_copy_stream(self):
+        dst = io.BytesIO()
+        copy_stream(io.BufferedReader(io.BytesIO(b'x' * 100000)), dst, chunk_size=1000)
+
+        self.assertEqual(dst.getvalue(), b'x' * 100000)
@@ -0,0 +1,66 @@
+import os
+import pstats
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.profiling import (CPROFILE_PROFILER, SAMPLING_PROFILER,
+                              build_profiler, default_profile_dir,
+                              profile_callable)
+
+
+def profiled_function(seconds: float = 0.1):
+    time.sleep(seconds)
+    return 7
+
+
+class ProfileCallableTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+    def profile_file(self, extension: str) -> Path:
+        return self.root / f'sparpy-my-command-{os.getpid()}.{extension}'
+
+    def test_cprofile(self):
+        fn = profile_callable(profiled_function, CPROFILE_PROFILER, name='my-command', output_dir=self.root)
+
+        self.assertEqual(fn(0.01), 7)
+
+        stats = pstats.Stats(str(self.profile_file('pstats')))
+        self.assertIn('profiled_function', {name for _, _, name in stats.stats})
+
+    def test_sampling(self):
+        fn = profile_callable(profiled_function, SAMPLING_PROFILER, name='my-command', output_dir=self.root)
+
+        self.assertEqual(fn(0.2), 7)
+
+        lines = self.profile_file('collapsed').read_text().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertTrue(any('profiled_function' in line for line in lines))
+
+    def test_profile_is_written_on_failure(self):
+        def failing():
+            raise SystemExit(2)
+
+        fn = profile_callable(failing, CPROFILE_PROFILER, name='my-command', output_dir=self.root)
+
+        with self.assertRaises(SystemExit):
+            fn()
+        self.assertTrue(self.profile_file('pstats').is_file())
+
+    def test_default_profile_dir(self):
+        with patch.dict('os.environ', {'LOG_DIRS': f'{self.root},/other'}):
+            self.assertEqual(default_profile_dir(), self.root)
+
+        with patch.dict('os.environ', {'LOG_DIRS': ''}):
+            self.assertEqual(default_profile_dir(), Path.cwd())
+
+    def test_invalid_profiler(self):
+        with self.assertRaises(RuntimeError):
+            build_profiler('invalid')
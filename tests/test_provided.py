@@ -0,0 +1,68 @@
+import json
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import Mock
+
+from sparpy.provided import ProvidedManifest, ProvidedPackage
+
+
+class ProvidedManifestTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+    def test_capture_and_load(self):
+        manifest = ProvidedManifest.capture(sys.executable)
+        manifest.save(self.root / 'provided.json')
+        loaded = ProvidedManifest.load(self.root / 'provided.json')
+
+        self.assertEqual(loaded.to_dict(), manifest.to_dict())
+        self.assertEqual(loaded.environment['executable'], sys.executable)
+
+        package = loaded.get('Click')
+        self.assertIsNotNone(package)
+        self.assertTrue(loaded.satisfies('click', f'=={package.version}'))
+        self.assertFalse(loaded.satisfies('click', f'!={package.version}'))
+
+        logger = Mock()
+        loaded.check_environment(logger)
+        logger.warning.assert_not_called()
+
+    def test_satisfies(self):
+        manifest = ProvidedManifest([ProvidedPackage('Pure_Lib', '1.2', ['py2.py3-none-any']),
+                                     ProvidedPackage('from-source', '2.0'),
+                                     ProvidedPackage('native', '3.0', ['cp27-cp27m-win32'])])
+
+        self.assertTrue(manifest.satisfies('pure-lib', '>=1,<2'))
+        self.assertTrue(manifest.satisfies('pure.lib'))
+        self.assertFalse(manifest.satisfies('pure-lib', '>=2'))
+        self.assertFalse(manifest.satisfies('pure-lib', '>=1', extras=['extra']))
+        self.assertTrue(manifest.satisfies('from-source', '==2.0'))
+        self.assertFalse(manifest.satisfies('native', '==3.0'))
+        self.assertFalse(manifest.satisfies('missing'))
+
+    def test_check_environment(self):
+        manifest = ProvidedManifest([], environment={'python': '2.7.18',
+                                                     'implementation': 'Jython',
+                                                     'platform': 'other-platform'})
+
+        with self.assertLogs(level='WARNING') as logs:
+            manifest.check_environment()
+
+        self.assertEqual(len(logs.output), 3)
+        self.assertIn('python 2.7.18', logs.output[0])
+        self.assertIn('implementation Jython', logs.output[1])
+        self.assertIn('platform other-platform', logs.output[2])
+
+    def test_invalid_manifests(self):
+        (self.root / 'invalid.json').write_text('{')
+        with self.assertRaises(RuntimeError):
+            ProvidedManifest.load(self.root / 'invalid.json')
+
+        (self.root / 'version.json').write_text(json.dumps({'version': 99, 'packages': []}))
+        with self.assertRaises(RuntimeError):
+            ProvidedManifest.load(self.root / 'version.json')
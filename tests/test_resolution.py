@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sparpy.resolution import (EXCLUDED, ONLY_REQUIRED_BY_PRUNED, PROVIDED,
+                               load_install_report, prune_excluded)
+
+
+def report_item(name, version, requires=(), requested=False, extras=()):
+    return {'metadata': {'name': name, 'version': version, 'requires_dist': list(requires)},
+            'download_info': {'url': f'https://example.com/{name}-{version}-py3-none-any.whl',
+                              'archive_info': {'hashes': {'sha256': f'{name}-hash'}}},
+            'requested': requested,
+            'requested_extras': list(extras)}
+
+
+class StubProvided:
+
+    def __init__(self, packages):
+        self.packages = packages
+
+    def get(self, name):
+        version = self.packages.get(name)
+        return type('Provided', (), {'version': version}) if version else None
+
+    def satisfies(self, name, specifier, extras=()):
+        return name in self.packages and specifier.contains(self.packages[name], prereleases=True)
+
+
+class PruneExcludedTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+        report = Path(self.tmp.name) / 'report.json'
+        report.write_text(json.dumps({'install': [
+            report_item('App', '1.0', requires=['heavy[gpu]', 'shared>=1',
+                                                'speedup; extra == "fast"',
+                                                'winonly; sys_platform == "never"'],
+                        requested=True, extras=['fast']),
+            report_item('heavy', '2.0', requires=['heavydep', 'shared', 'cuda; extra == "gpu"']),
+            report_item('heavydep', '1.0'),
+            report_item('cuda', '1.0'),
+            report_item('shared', '1.2'),
+            report_item('speedup', '1.0'),
+            report_item('winonly', '1.0'),
+        ]}))
+        self.packages = load_install_report(report)
+
+    def names(self, packages):
+        return sorted(p.name for p in packages)
+
+    def test_load_install_report(self):
+        app = self.packages[0]
+
+        self.assertEqual((app.name, app.version, app.requested, app.extras), ('App', '1.0', True, ['fast']))
+        self.assertEqual(app.sha256, 'App-hash')
+        self.assertEqual(app.as_requirement(), 'App==1.0 --hash=sha256:App-hash')
+
+    def test_nothing_excluded(self):
+        kept, pruned = prune_excluded(self.packages, [])
+
+        self.assertEqual(self.names(kept), ['App', 'cuda', 'heavy', 'heavydep', 'shared', 'speedup'])
+        self.assertEqual(pruned, {'winonly': ONLY_REQUIRED_BY_PRUNED})
+
+    def test_excluded_package_and_its_dependencies(self):
+        kept, pruned = prune_excluded(self.packages, ['Heavy'])
+
+        # `shared` is also required by `heavy`, but it is kept because `App` requires it
+        self.assertEqual(self.names(kept), ['App', 'shared', 'speedup'])
+        self.assertEqual(pruned, {'heavy': EXCLUDED,
+                                  'heavydep': ONLY_REQUIRED_BY_PRUNED,
+                                  'cuda': ONLY_REQUIRED_BY_PRUNED,
+                                  'winonly': ONLY_REQUIRED_BY_PRUNED})
+
+    def test_requested_extras_are_followed(self):
+        packages = [p._replace(extras=[]) if p.requested else p for p in self.packages]
+
+        kept, pruned = prune_excluded(packages, [])
+
+        self.assertNotIn('speedup', self.names(kept))
+        self.assertEqual(pruned['speedup'], ONLY_REQUIRED_BY_PRUNED)
+
+    def test_provided_packages(self):
+        kept, pruned = prune_excluded(self.packages, [], provided=StubProvided({'heavy': '2.0', 'shared': '1.0'}))
+
+        self.assertEqual(self.names(kept), ['App', 'speedup'])
+        self.assertEqual(pruned, {'heavy': f'{PROVIDED} (2.0)',
+                                  'heavydep': ONLY_REQUIRED_BY_PRUNED,
+                                  'cuda': ONLY_REQUIRED_BY_PRUNED,
+                                  'shared': f'{PROVIDED} (1.0)',
+                                  'winonly': ONLY_REQUIRED_BY_PRUNED})
+
+    def test_provided_version_must_satisfy_requirement(self):
+        kept, pruned = prune_excluded(self.packages, [], provided=StubProvided({'shared': '0.9'}))
+
+        self.assertIn('shared', self.names(kept))
+        self.assertNotIn('shared', pruned)
+
+    def test_requested_packages_use_root_requirements(self):
+        provided = StubProvided({'app': '0.9'})
+
+        kept, _ = prune_excluded(self.packages, [], provided=provided)
+        self.assertIn('App', self.names(kept))
+
+        kept, pruned = prune_excluded(self.packages, [], provided=provided, requirements=['app<1'])
+        self.assertEqual(kept, [])
+        self.assertEqual(pruned['App'], f'{PROVIDED} (0.9)')
@@ -0,0 +1,86 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from sparpy.scanner import (FIRST_PRECEDENCE, HIGHEST_PRECEDENCE, ReqsScanner,
+                            parse_distribution)
+
+
+class ParseDistributionTests(TestCase):
+
+    def test_distributions(self):
+        self.assertEqual(parse_distribution('my_lib-1.0.2-py3-none-any.whl'), ('my_lib', '1.0.2'))
+        self.assertEqual(parse_distribution('my_lib-1.0.2-py3-none-any.zip'), ('my_lib', '1.0.2'))
+        self.assertEqual(parse_distribution('my_lib-2.0rc1-py3.7.egg'), ('my_lib', '2.0rc1'))
+        self.assertEqual(parse_distribution('my-lib-1!2.0.post1.dev3+local.1.zip'),
+                         ('my-lib', '1!2.0.post1.dev3+local.1'))
+
+    def test_plain_files(self):
+        self.assertIsNone(parse_distribution('my-lib.zip'))
+        self.assertIsNone(parse_distribution('my-utils.zip'))
+        self.assertIsNone(parse_distribution('modules.zip'))
+        self.assertIsNone(parse_distribution('notes.txt'))
+
+
+class ReqsScannerTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+    def create(self, *names):
+        for name in names:
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'')
+        return [str(self.root.resolve() / n) for n in names]
+
+    def names(self, files):
+        return sorted(os.path.relpath(f, str(self.root.resolve())) for f in files)
+
+    def test_scan(self):
+        self.create('a/pkg-1.0-py3-none-any.whl', 'a/b/lib.zip', 'c/other-1.0-py3.7.egg', 'c/readme.txt')
+
+        self.assertEqual(self.names(ReqsScanner().scan(self.root)),
+                         ['a/b/lib.zip', 'a/pkg-1.0-py3-none-any.whl', 'c/other-1.0-py3.7.egg'])
+
+    def test_no_deduplication_by_default(self):
+        files = self.create('a/pkg-1.0-py3-none-any.whl', 'b/pkg-2.0-py3-none-any.whl')
+
+        self.assertEqual(ReqsScanner().deduplicate(files), files)
+
+    def test_highest_precedence(self):
+        files = self.create('a/pkg-1.0-py3-none-any.whl', 'b/Pkg-10.0-py3-none-any.whl', 'c/pkg-2.0-py3-none-any.whl')
+
+        self.assertEqual(self.names(ReqsScanner(precedence=HIGHEST_PRECEDENCE).deduplicate(files)),
+                         ['b/Pkg-10.0-py3-none-any.whl'])
+
+    def test_first_precedence(self):
+        files = self.create('b/pkg-2.0-py3-none-any.whl', 'a/pkg-1.0-py3-none-any.whl')
+
+        self.assertEqual(self.names(ReqsScanner(precedence=FIRST_PRECEDENCE).deduplicate(files)),
+                         ['b/pkg-2.0-py3-none-any.whl'])
+
+    def test_plain_zip_files_are_not_deduplicated(self):
+        files = self.create('my-lib.zip', 'my-utils.zip', 'my-1.0-py3-none-any.whl')
+
+        self.assertEqual(self.names(ReqsScanner(precedence=HIGHEST_PRECEDENCE).deduplicate(files)),
+                         ['my-1.0-py3-none-any.whl', 'my-lib.zip', 'my-utils.zip'])
+
+    def test_invalid_precedence(self):
+        with self.assertRaises(RuntimeError):
+            ReqsScanner(precedence='lowest')
+
+    def test_cached_manifest(self):
+        self.create('a/pkg-1.0-py3-none-any.whl')
+        scanner = ReqsScanner(cache_dir=self.root / 'cache')
+
+        self.assertEqual(self.names(scanner.collect([self.root / 'a'], cached_paths=[self.root / 'a'])),
+                         ['a/pkg-1.0-py3-none-any.whl'])
+        self.assertEqual(len(list((self.root / 'cache').glob('*.json'))), 1)
+
+        self.create('a/other-1.0-py3-none-any.whl')
+        self.assertEqual(self.names(scanner.collect([self.root / 'a'], cached_paths=[self.root / 'a'])),
+                         ['a/other-1.0-py3-none-any.whl', 'a/pkg-1.0-py3-none-any.whl'])
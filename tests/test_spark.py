@@ -0,0 +1,51 @@
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.metrics import JsonLinesSink, Metrics
+from sparpy.spark import SparkSubmitCommand
+
+
+class SparkSubmitRunTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        self.spark_submit = self.root / 'spark-submit'
+        self.spark_submit.write_text(f'#!{sys.executable}\n'
+                                     'import sys\n'
+                                     'sys.stderr.write("Submitted application application_1600000000000_0001\\n")\n')
+        self.spark_submit.chmod(0o755)
+
+        self.metrics = Metrics()
+        self.metrics.configured = True
+        self.metrics.sinks = [JsonLinesSink(self.root / 'metrics.jsonl')]
+
+    def run_command(self, **kwargs):
+        command = SparkSubmitCommand(spark_executable=str(self.spark_submit), exec_mode=False, **kwargs)
+
+        with patch('sparpy.spark.get_metrics', return_value=self.metrics), \
+                patch('sparpy.spark.ProcessManager') as process_manager:
+            process_manager.return_value.returncode = 0
+            command.run(job_args=['job.py'])
+
+        return process_manager, [s.name for s in self.metrics._spans]
+
+    def test_metrics_do_not_pipe_spark_output(self):
+        with patch('sparpy.supervisor.ProcessSupervisor.run', side_effect=AssertionError('supervised')):
+            process_manager, spans = self.run_command()
+
+        self.assertEqual(process_manager.call_args[1]['pass_through'], True)
+        self.assertEqual(spans, ['spark.start', 'spark.job'])
+
+    def test_application_id_is_measured_when_supervised(self):
+        events = []
+        process_manager, spans = self.run_command(event_callbacks=[events.append])
+
+        process_manager.assert_not_called()
+        self.assertEqual(spans, ['spark.application_id', 'spark.start', 'spark.job'])
+        self.assertEqual(events[0].application_id, 'application_1600000000000_0001')
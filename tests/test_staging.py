@@ -0,0 +1,124 @@
+import os
+import time
+from pathlib import Path
+from shutil import rmtree
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.staging import LEASES_DIRNAME, Staging, directory_digest
+
+from .helpers import make_wheel
+
+
+class StagingTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        self.src = self.root / 'downloads'
+        make_wheel(self.src, 'pkga', '1.0')
+        make_wheel(self.src, 'pkgb', '2.0')
+        self.staging = Staging(self.root / 'staging')
+
+    def test_stage(self):
+        target = self.staging.stage(self.src)
+
+        self.assertEqual(target.name, directory_digest(self.src))
+        self.assertEqual(sorted(p.name for p in target.glob('*.whl')),
+                         ['pkga-1.0-py3-none-any.whl', 'pkgb-2.0-py3-none-any.whl'])
+        self.assertEqual([p.name for p in self.staging.leases(target)], [str(os.getpid())])
+
+    def test_reuse(self):
+        target = self.staging.stage(self.src)
+
+        with patch('sparpy.staging.link_or_copy', side_effect=AssertionError('staged again')):
+            self.assertEqual(self.staging.stage(self.src, pid=1), target)
+        self.assertEqual(sorted(p.name for p in self.staging.leases(target)), sorted(['1', str(os.getpid())]))
+
+    def test_digest_is_recorded(self):
+        digest = self.staging.digest(self.src)
+
+        with patch('sparpy.staging.directory_digest', side_effect=AssertionError('hashed again')):
+            self.assertEqual(self.staging.digest(self.src), digest)
+
+        # Changed files are hashed again
+        (self.src / 'pkga-1.0-py3-none-any.whl').write_bytes(b'changed')
+        self.assertNotEqual(self.staging.digest(self.src), digest)
+
+    def test_restaged_when_removed_while_reused(self):
+        target = self.staging.stage(self.src)
+        acquire_lease = self.staging._acquire_lease
+
+        def removed_by_janitor(path, pid=None):
+            if path == target and path.is_dir():
+                rmtree(str(path))
+            return acquire_lease(path, pid)
+
+        with patch.object(self.staging, '_acquire_lease', side_effect=removed_by_janitor):
+            self.assertEqual(self.staging.stage(self.src), target)
+
+        self.assertEqual(len(list(target.glob('*.whl'))), 2)
+        self.assertEqual([p.name for p in self.staging.leases(target)], [str(os.getpid())])
+        self.assertFalse([p for p in self.staging.staging_dir.iterdir() if p.name.startswith('.tmp-')])
+
+    def test_clean(self):
+        target = self.staging.stage(self.src, pid=2 ** 22 + 1)
+
+        self.assertEqual(self.staging.clean(grace_period=3600), [])
+
+        old = time.time() - 7200
+        os.utime(str(target), (old, old))
+        os.utime(str(target / LEASES_DIRNAME), (old, old))
+        for record in self.staging.digests_dir.iterdir():
+            os.utime(str(record), (old, old))
+
+        self.assertEqual(self.staging.clean(grace_period=3600, dry_run=True), [target])
+        self.assertTrue(target.exists())
+
+        self.assertEqual(self.staging.clean(grace_period=3600), [target])
+        self.assertFalse(target.exists())
+
+        # Recorded digest is removed once its staged directory does not exist
+        self.staging.clean(grace_period=3600)
+        self.assertEqual(list(self.staging.digests_dir.iterdir()), [])
+
+    def test_live_leases_are_kept(self):
+        target = self.staging.stage(self.src)
+
+        old = time.time() - 7200
+        os.utime(str(target), (old, old))
+        os.utime(str(target / LEASES_DIRNAME), (old, old))
+
+        self.assertEqual(self.staging.clean(grace_period=3600), [])
+        self.assertTrue(target.exists())
+
+    def test_directories_being_staged_are_not_cleaned(self):
+        target = self.staging.stage(self.src, pid=2 ** 22 + 1)
+        old = time.time() - 7200
+        os.utime(str(target), (old, old))
+        os.utime(str(target / LEASES_DIRNAME), (old, old))
+
+        with self.staging.lock(target.name):
+            self.assertEqual(self.staging.clean(grace_period=3600), [])
+        self.assertTrue(target.exists())
+
+        janitor = Staging(self.staging.staging_dir)
+        acquire_lease = self.staging._acquire_lease
+        cleaned = []
+
+        def clean_while_reused(path, pid=None):
+            cleaned.extend(janitor.clean(grace_period=0))
+            return acquire_lease(path, pid)
+
+        with patch.object(self.staging, '_acquire_lease', side_effect=clean_while_reused), \
+                patch('sparpy.staging.link_or_copy', side_effect=AssertionError('staged again')):
+            self.assertEqual(self.staging.stage(self.src), target)
+
+        self.assertEqual(cleaned, [])
+        self.assertEqual(len(list(target.glob('*.whl'))), 2)
+
+        self.assertEqual(janitor.clean(grace_period=3600), [])
+        self.assertTrue((self.staging.staging_dir / '.locks').is_dir())
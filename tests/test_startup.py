@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+from benchmarks.startup_time import (LAZY_MODULES, ROOT_DIR,
+                                     iter_console_scripts, measure)
+
+# Modules which must never be imported on start up
+HEAVY_MODULES = LAZY_MODULES + ('pip', 'setuptools', 'distutils', 'importlib.metadata', 'email', 'http', 'ssl')
+
+
+class StartupTests(TestCase):
+
+    def imported_modules(self, code: str):
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join([str(ROOT_DIR), *filter(None, [env.get('PYTHONPATH')])])
+
+        script = f'{code}; import json, sys; print(json.dumps(list(sys.modules)))'
+        output = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, env=env, check=True).stdout
+        return json.loads(output.decode('utf-8').splitlines()[-1])
+
+    def assertNotImported(self, modules, heavy_modules=HEAVY_MODULES):
+        imported = sorted(m for m in modules if any(m == h or m.startswith(f'{h}.') for h in heavy_modules))
+        self.assertEqual(imported, [], 'Heavy modules imported on start up')
+
+    def test_cli_import(self):
+        self.assertNotImported(self.imported_modules('import sparpy.cli'))
+
+    def test_console_scripts_help(self):
+        for name, module, func in iter_console_scripts():
+            with self.subTest(script=name):
+                result = measure(name, module, func)
+
+                self.assertEqual(result['returncode'], 0)
+                self.assertEqual(result['lazy_modules_imported'], [])
@@ -0,0 +1,160 @@
+import io
+import json
+import os
+import signal
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.supervisor import (APPLICATION_ID_EVENT, EXIT_EVENT, STATE_EVENT,
+                               TRACKING_URL_EVENT, ProcessSupervisor,
+                               SparkOutputParser)
+
+YARN_OUTPUT = '''\
+INFO Client: Submitting application application_1600000000000_0042 to ResourceManager
+INFO Client: Application report for application_1600000000000_0042 (state: ACCEPTED)
+INFO Client:
+\t tracking URL: N/A
+INFO Client: Application report for application_1600000000000_0042 (state: RUNNING)
+INFO Client:
+\t tracking URL: http://rm:8088/proxy/application_1600000000000_0042/
+INFO Client: Application report for application_1600000000000_0042 (state: RUNNING)
+INFO Client: Application report for application_1600000000000_0042 (state: FINISHED)
+'''
+
+
+class SparkOutputParserTests(TestCase):
+
+    def test_yarn_output(self):
+        parser = SparkOutputParser()
+        events = [e for line in YARN_OUTPUT.splitlines() for e in parser.feed(line)]
+
+        self.assertEqual([(e.type, e.state) for e in events],
+                         [(APPLICATION_ID_EVENT, None),
+                          (STATE_EVENT, 'ACCEPTED'),
+                          (STATE_EVENT, 'RUNNING'),
+                          (TRACKING_URL_EVENT, 'RUNNING'),
+                          (STATE_EVENT, 'FINISHED')])
+        self.assertEqual(parser.application_id, 'application_1600000000000_0042')
+        self.assertEqual(parser.tracking_url, 'http://rm:8088/proxy/application_1600000000000_0042/')
+
+    def test_kubernetes_output(self):
+        parser = SparkOutputParser()
+        parser.feed('Application status for spark-0123456789abcdef0123456789abcdef (phase: Pending)')
+
+        self.assertEqual(parser.application_id, 'spark-0123456789abcdef0123456789abcdef')
+        self.assertEqual(parser.state, 'PENDING')
+
+
+class ProcessSupervisorTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+    def fake_spark_submit(self, script: str) -> list:
+        """
+        Returns command of a fake spark-submit running `script`.
+        """
+        path = self.root / 'spark-submit.py'
+        path.write_text(dedent(script))
+        return [sys.executable, str(path)]
+
+    def run_supervisor(self, supervisor: ProcessSupervisor):
+        stdout = io.TextIOWrapper(io.BytesIO())
+        stderr = io.TextIOWrapper(io.BytesIO())
+        with patch('sys.stdout', stdout), patch('sys.stderr', stderr):
+            returncode = supervisor.run()
+        return returncode, stdout.buffer.getvalue(), stderr.buffer.getvalue()
+
+    def test_output_is_relayed_and_parsed(self):
+        events = []
+        status_file = self.root / 'status.json'
+        supervisor = ProcessSupervisor(self.fake_spark_submit(f'''
+                                           import sys
+                                           sys.stdout.write('job output\\n')
+                                           sys.stderr.write({YARN_OUTPUT!r})
+                                       '''),
+                                       callbacks=[events.append],
+                                       status_file=status_file)
+
+        returncode, stdout, stderr = self.run_supervisor(supervisor)
+
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout, b'job output\n')
+        self.assertEqual(stderr.decode('utf-8'), YARN_OUTPUT)
+        self.assertEqual([e.type for e in events],
+                         [APPLICATION_ID_EVENT, STATE_EVENT, STATE_EVENT, TRACKING_URL_EVENT, STATE_EVENT, EXIT_EVENT])
+
+        with status_file.open('r') as f:
+            status = json.load(f)
+        self.assertEqual(status['application_id'], 'application_1600000000000_0042')
+        self.assertEqual(status['state'], 'FINISHED')
+        self.assertEqual(status['tracking_url'], 'http://rm:8088/proxy/application_1600000000000_0042/')
+        self.assertEqual(status['last_event'], EXIT_EVENT)
+        self.assertEqual(status['returncode'], 0)
+        self.assertIsNotNone(status['pid'])
+
+    def test_exit_code_is_propagated(self):
+        events = []
+        supervisor = ProcessSupervisor(self.fake_spark_submit('''
+                                           import sys
+                                           sys.stdout.write('no line break')
+                                           sys.exit(3)
+                                       '''),
+                                       callbacks=[events.append])
+
+        returncode, stdout, _ = self.run_supervisor(supervisor)
+
+        self.assertEqual(returncode, 3)
+        self.assertEqual(supervisor.returncode, 3)
+        self.assertEqual(stdout, b'no line break')
+        self.assertEqual([(e.type, e.returncode) for e in events], [(EXIT_EVENT, 3)])
+
+    def test_failing_callback_does_not_stop_supervision(self):
+        def callback(event):
+            raise ValueError('Callback error')
+
+        supervisor = ProcessSupervisor(self.fake_spark_submit('''
+                                           print('application_1600000000000_0001')
+                                       '''),
+                                       callbacks=[callback])
+
+        with self.assertLogs('sparpy.supervisor', level='ERROR'):
+            returncode, _, _ = self.run_supervisor(supervisor)
+        self.assertEqual(returncode, 0)
+
+    def test_lines_longer_than_stream_limit(self):
+        supervisor = ProcessSupervisor(self.fake_spark_submit('''
+                                           import sys
+                                           sys.stdout.write('x' * 5000 + '\\n')
+                                           sys.stdout.write('application_1600000000000_0007 ' + 'y' * 3000)
+                                       '''))
+
+        with patch('sparpy.supervisor.STREAM_LIMIT', 1024):
+            returncode, stdout, _ = self.run_supervisor(supervisor)
+
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout, b'x' * 5000 + b'\n' + b'application_1600000000000_0007 ' + b'y' * 3000)
+        self.assertEqual(supervisor.application_id, 'application_1600000000000_0007')
+
+    def test_signals_are_forwarded(self):
+        def callback(event):
+            if event.type == APPLICATION_ID_EVENT:
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        supervisor = ProcessSupervisor(self.fake_spark_submit('''
+                                           import signal, sys, time
+                                           signal.signal(signal.SIGTERM, lambda *_: sys.exit(42))
+                                           print('application_1600000000000_0003', flush=True)
+                                           time.sleep(30)
+                                       '''),
+                                       callbacks=[callback])
+
+        returncode, _, _ = self.run_supervisor(supervisor)
+
+        self.assertEqual(returncode, 42)
@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from sparpy.cache import file_digest
+from sparpy.wheels import WheelBuilder, build_tag, iter_sdists
+
+from .helpers import make_sdist, make_wheel
+
+
+class WheelBuilderTests(TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        self.builds = []
+
+    def fake_run(self, builder, sdist, output_dir, debug=False):
+        """
+        Builds a wheel named after source distribution without running pip.
+        """
+        self.builds.append(sdist.name)
+        if sdist.name.startswith('broken'):
+            raise RuntimeError(f'Unable to build wheel from {sdist.name}')
+        name, version = sdist.name[:-len('.tar.gz')].rsplit('-', 1)
+        return make_wheel(output_dir, name, version)
+
+    def builder(self, **kwargs) -> WheelBuilder:
+        return WheelBuilder(cache_dir=self.root / 'cache', **kwargs)
+
+    def build(self, builder: WheelBuilder, sdist: Path, output_dir: Path) -> Path:
+        with patch.object(WheelBuilder, '_run', autospec=True, side_effect=self.fake_run):
+            return builder.build(sdist, output_dir)
+
+    def test_build_tag(self):
+        self.assertTrue(build_tag().startswith(f'{sys.implementation.cache_tag}-'))
+        self.assertNotIn('-', build_tag()[len(sys.implementation.cache_tag) + 1:])
+
+    def test_build_command(self):
+        command = WheelBuilder(pip_options=['--no-index']).build_command(Path('pkg-1.0.tar.gz'), Path('out'))
+
+        self.assertEqual(command, [sys.executable, '-m', 'pip', 'wheel', '--no-deps', '--wheel-dir', 'out',
+                                   '--no-index', 'pkg-1.0.tar.gz'])
+
+    def test_iter_sdists(self):
+        make_sdist(self.root / 'downloads', 'pkga', '1.0')
+        make_wheel(self.root / 'downloads', 'pkgb', '1.0')
+        (self.root / 'downloads' / 'pkgc-1.0-py3-none-any.zip').write_bytes(b'')
+
+        self.assertEqual([p.name for p in iter_sdists(self.root / 'downloads')], ['pkga-1.0.tar.gz'])
+
+    def test_cache_key(self):
+        sdist = make_sdist(self.root / 'a', 'pkg', '1.0')
+        builder = self.builder()
+
+        wheel = self.build(builder, sdist, self.root / 'out-1')
+        self.assertEqual(wheel.name, 'pkg-1.0-py3-none-any.whl')
+        self.assertTrue((builder.wheels_dir / f'{file_digest(sdist)}-{build_tag()}' / wheel.name).is_file())
+
+        # Same content on other location is not built again
+        other = self.root / 'b' / sdist.name
+        other.parent.mkdir()
+        other.write_bytes(sdist.read_bytes())
+        self.assertEqual(self.build(builder, other, self.root / 'out-2').name, wheel.name)
+        self.assertEqual(self.builds, [sdist.name])
+
+        # Other content with same name is built again
+        with open(str(other), 'ab') as f:
+            f.write(b'\0')
+        self.build(builder, other, self.root / 'out-3')
+        self.assertEqual(self.builds, [sdist.name, sdist.name])
+
+    def test_build_tag_is_part_of_cache_key(self):
+        sdist = make_sdist(self.root, 'pkg', '1.0')
+        self.build(self.builder(), sdist, self.root / 'out-1')
+
+        with patch('sparpy.wheels.build_tag', return_value='cp00-other_platform'):
+            self.build(self.builder(), sdist, self.root / 'out-2')
+
+        self.assertEqual(self.builds, [sdist.name, sdist.name])
+
+    def test_without_cache(self):
+        sdist = make_sdist(self.root, 'pkg', '1.0')
+        builder = WheelBuilder()
+
+        self.build(builder, sdist, self.root / 'out-1')
+        self.build(builder, sdist, self.root / 'out-2')
+
+        self.assertEqual(self.builds, [sdist.name, sdist.name])
+
+    def test_build_all(self):
+        downloads = self.root / 'downloads'
+        make_sdist(downloads, 'pkga', '1.0')
+        make_sdist(downloads, 'broken', '1.0')
+        make_wheel(downloads, 'pkgb', '2.0')
+
+        with patch.object(WheelBuilder, '_run', autospec=True, side_effect=self.fake_run), \
+                self.assertLogs('sparpy.wheels', level='WARNING'):
+            built = self.builder(workers=2).build_all(downloads)
+
+        self.assertEqual(sorted(built), ['pkga-1.0.tar.gz'])
+        self.assertEqual(sorted(p.name for p in downloads.iterdir()),
+                         ['broken-1.0.tar.gz', 'pkga-1.0-py3-none-any.whl', 'pkgb-2.0-py3-none-any.whl'])